@@ -0,0 +1,174 @@
+# benchmarks/ann_recall.py
+"""
+Recall / latency of the IVF search mode against exact search.
+
+Usage:
+    python -m benchmarks.ann_recall --rows 1000000 --queries 500
+    python -m benchmarks.ann_recall --from-db --nprobe 4 8 16 32
+
+Synthetic corpora are clustered unit vectors; the first half of the
+queries are perturbed copies of stored rows (near-duplicates), the rest
+are fresh points. For each nprobe value the script reports recall@1
+(overall and for near-duplicates), recall@10, how often the duplicate
+decision at --threshold agrees with exact search, and per-query latency.
+Corpora below ANN_MIN_SIZE rows are refused unless --force-ann is given,
+since the service would answer them with an exact scan.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from database.database import SessionLocal
+from services.vector_index import ANN_MIN_SIZE, VectorIndex, normalize_rows
+
+
+def synthetic_corpus(rows: int, dim: int, topics: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((topics, dim)))
+    labels = rng.integers(0, topics, rows)
+
+    out = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 100000):
+        end = min(start + 100000, rows)
+        noise = rng.standard_normal((end - start, dim)).astype(np.float32) * 0.08
+        out[start:end] = normalize_rows(centers[labels[start:end]] + noise)
+    return out
+
+
+def synthetic_queries(corpus: np.ndarray, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    dim = corpus.shape[1]
+    near = corpus[rng.integers(0, corpus.shape[0], count // 2)]
+    near = near + rng.standard_normal(near.shape).astype(np.float32) * 0.02
+    fresh = rng.standard_normal((count - count // 2, dim)).astype(np.float32)
+    return normalize_rows(np.vstack([near, fresh]))
+
+
+def corpus_from_db() -> np.ndarray:
+    index = VectorIndex(mode="exact")
+    with SessionLocal() as db:
+        index.refresh(db)
+
+    store = index.store
+    if not len(index):
+        raise SystemExit("titles table is empty")
+    return store.rows(np.flatnonzero(store.present()))
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def run(corpus, queries, nprobes, threshold, nlist, ann_min_size=ANN_MIN_SIZE):
+    ids = np.arange(1, corpus.shape[0] + 1)
+
+    exact = VectorIndex(mode="exact")
+    exact.add(ids, corpus)
+
+    truth_top1, truth_top10, truth_dup, exact_times = [], [], [], []
+    for q in queries:
+        started = time.perf_counter()
+        best_id, score = exact.best(q)
+        exact_times.append(time.perf_counter() - started)
+
+        truth_top1.append(best_id)
+        truth_dup.append(score >= threshold)
+        truth_top10.append({i for i, _ in exact.search(q, 10)})
+
+    results = {
+        "rows": int(corpus.shape[0]),
+        "queries": int(queries.shape[0]),
+        "threshold": threshold,
+        "exact": {
+            "p50_ms": _percentile_ms(exact_times, 50),
+            "p99_ms": _percentile_ms(exact_times, 99),
+        },
+        "ivf": [],
+    }
+
+    ivf = VectorIndex(mode="ivf", ann_min_size=ann_min_size, nlist=nlist)
+    ivf.add(ids, corpus)
+    if not ivf.ann_eligible():
+        # best() would silently answer with an exact scan
+        raise SystemExit(
+            f"{len(ivf)} rows is below ANN_MIN_SIZE={ann_min_size}: the service would "
+            "not use IVF at this size (pass --force-ann to measure it anyway)"
+        )
+
+    results["ivf_build_s"] = round(ivf.build_ann(), 2)
+    results["ann_min_size"] = ann_min_size
+
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        hit1 = hit10 = agree = near_hit1 = 0
+        times = []
+        near = len(queries) // 2
+
+        for n, q in enumerate(queries):
+            started = time.perf_counter()
+            best_id, score = ivf.best(q, threshold=threshold)
+            times.append(time.perf_counter() - started)
+
+            hit1 += best_id == truth_top1[n]
+            if n < near:
+                near_hit1 += best_id == truth_top1[n]
+            agree += (score >= threshold) == truth_dup[n]
+            top10 = {i for i, _ in ivf.search(q, 10)}
+            hit10 += len(top10 & truth_top10[n]) / max(1, len(truth_top10[n]))
+
+        total = len(queries)
+        results["ivf"].append({
+            "nprobe": nprobe,
+            "nlist": ivf.ann_info()["nlist"],
+            "recall_at_1": round(hit1 / total, 4),
+            "near_duplicate_recall_at_1": round(near_hit1 / max(1, near), 4),
+            "recall_at_10": round(hit10 / total, 4),
+            "decision_agreement": round(agree / total, 4),
+            "p50_ms": _percentile_ms(times, 50),
+            "p99_ms": _percentile_ms(times, 99),
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--from-db", action="store_true")
+    parser.add_argument(
+        "--force-ann", action="store_true",
+        help="measure IVF even below ANN_MIN_SIZE rows (the service would scan exactly)",
+    )
+    parser.add_argument("--out", help="write JSON results to this path")
+    args = parser.parse_args()
+
+    if args.from_db:
+        corpus = corpus_from_db()
+    else:
+        corpus = synthetic_corpus(args.rows, args.dim, args.topics, args.seed)
+    queries = synthetic_queries(corpus, args.queries, args.seed)
+
+    results = run(
+        corpus, queries, args.nprobe, args.threshold, args.nlist,
+        ann_min_size=0 if args.force_ann else ANN_MIN_SIZE,
+    )
+    text = json.dumps(results, indent=2)
+    print(text)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/fake_embedder.py
+"""
+Deterministic hash-based stand-in for the MiniLM model.
+
+Every word is hashed into a few signed slots of a `dim`-sized vector
+(feature hashing), so titles sharing most of their words get a high
+cosine and unrelated titles land near 0 — enough structure for the
+duplicate rules to behave realistically, with no model download and no
+torch. Same text -> same vector, in any process.
+"""
+
+import zlib
+
+import numpy as np
+
+# signed slots written per word (more -> fewer accidental collisions)
+SLOTS_PER_WORD = 4
+
+
+class HashEmbedder:
+    """Implements the `encode()` subset of SentenceTransformer used here."""
+
+    def __init__(self, dim: int = 384, slots: int = SLOTS_PER_WORD):
+        self.dim = dim
+        self.slots = slots
+        self._words = {}
+
+    def _word(self, word: str):
+        cached = self._words.get(word)
+        if cached is None:
+            data = word.encode("utf-8")
+            hashes = [zlib.crc32(data, seed) for seed in range(1, self.slots + 1)]
+            cached = (
+                np.array([h % self.dim for h in hashes], dtype=np.int64),
+                np.array([1.0 if h >> 31 else -1.0 for h in hashes], dtype=np.float32),
+            )
+            if len(self._words) < 1_000_000:
+                self._words[word] = cached
+        return cached
+
+    def encode(self, texts, batch_size: int = 64, convert_to_numpy: bool = True, show_progress_bar: bool = False, **_):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        rows, cols, signs = [], [], []
+        for n, text in enumerate(texts):
+            for word in text.split():
+                idx, sign = self._word(word)
+                rows.append(np.full(self.slots, n, dtype=np.int64))
+                cols.append(idx)
+                signs.append(sign)
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(out, (np.concatenate(rows), np.concatenate(cols)), np.concatenate(signs))
+
+        # empty texts get a fixed non-zero vector like a real model would
+        out[~out.any(axis=1), 0] = 1.0
+
+        return out[0] if single else out
+
+
+def install(dim: int = 384) -> HashEmbedder:
+    """
+    Makes services.embedding_service use a HashEmbedder as its MiniLM
+    model (in-process encoding; the encoder pool is bypassed).
+    """
+    from services import embedding_pool, embedding_service
+
+    model = HashEmbedder(dim)
+    embedding_service._minilm_model = model
+    embedding_pool.EMBED_WORKERS = 0
+    return model
@@ -0,0 +1,147 @@
+# benchmarks/normalize_bench.py
+"""
+Throughput of title normalization: per-string vs batch.
+
+Usage:
+    python -m benchmarks.normalize_bench
+    python -m benchmarks.normalize_bench --rows 1000000 --non-ascii 0.05 --out norm.json
+
+Titles are synthetic: 3-12 mixed-case words with punctuation, numbers,
+repeated whitespace and a --non-ascii fraction of accented / Devanagari
+words (those take the per-string fallback inside normalize_batch).
+
+For each mode (clean_text with and without IGNORE_NUMBERS, and the Excel
+deduper's standalone-number stripping) the script times the previous
+uncompiled re.sub() implementation, normalize_text() per string and
+normalize_batch(), checks that all three agree on every string, and
+reports strings/s.
+"""
+
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+
+from utils.normalization import normalize_batch, normalize_text
+
+_WORDS = [
+    "analysis", "Data", "SYSTEM", "report", "annual", "Review", "of", "the",
+    "market", "Trends", "in", "urban", "planning", "model", "v2", "covid_19",
+    "2024", "Q3", "A", "study", "Title", "news", "India", "daily",
+]
+_NON_ASCII = ["café", "Müller", "naïve", "समाचार", "दैनिक", "Ünïcode", "１２３", "São"]
+_PUNCT = ["", "", "", ",", ".", ":", " -", "!", "?", "'s", " &", "(", ")", "/"]
+_SPACES = [" ", " ", " ", " ", "  ", "\t", " \n "]
+
+
+def synthetic_titles(rows: int, non_ascii: float, seed: int):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(3, 13, rows)
+    total = int(lengths.sum())
+
+    words = np.array(_WORDS, dtype=object)[rng.integers(0, len(_WORDS), total)]
+    numbers = rng.random(total) < 0.08
+    words[numbers] = rng.integers(0, 10000, int(numbers.sum())).astype(str)
+    # one non-ASCII word in a `non_ascii` fraction of the titles
+    starts = np.cumsum(lengths) - lengths
+    foreign = starts[rng.random(rows) < non_ascii]
+    foreign += rng.integers(0, 3, len(foreign))
+    words[foreign] = np.array(_NON_ASCII, dtype=object)[rng.integers(0, len(_NON_ASCII), len(foreign))]
+
+    punct = np.array(_PUNCT, dtype=object)[rng.integers(0, len(_PUNCT), total)]
+    spaces = np.array(_SPACES, dtype=object)[rng.integers(0, len(_SPACES), total)]
+    tokens = (words + punct + spaces).tolist()
+
+    titles, start = [], 0
+    for n in lengths.tolist():
+        titles.append("".join(tokens[start:start + n]))
+        start += n
+    return titles
+
+
+# ---------------------------------------------------------
+# The implementations normalize_batch replaced
+# ---------------------------------------------------------
+def legacy_clean_text(text: str, ignore_numbers: bool) -> str:
+    text = text.lower()
+    if ignore_numbers:
+        text = re.sub(r"\d+", "", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def legacy_excel(text: str, ignore_numbers: bool) -> str:
+    text = re.sub(r"\b\d+\b", "", legacy_clean_text(text, ignore_numbers)).strip()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+MODES = {
+    # name: (ignore_numbers, numeric_tokens, legacy)
+    "clean_text": (True, True, legacy_clean_text),
+    "clean_text_keep_numbers": (False, True, legacy_clean_text),
+    "excel_standalone_numbers": (False, False, legacy_excel),
+}
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def run(titles, modes):
+    results = {"rows": len(titles), "modes": {}}
+
+    for name in modes:
+        ignore_numbers, numeric_tokens, legacy = MODES[name]
+
+        expected, t_legacy = _timed(lambda: [legacy(t, ignore_numbers) for t in titles])
+        single, t_single = _timed(
+            lambda: [normalize_text(t, ignore_numbers, numeric_tokens) for t in titles]
+        )
+        batch, t_batch = _timed(lambda: normalize_batch(titles, ignore_numbers, numeric_tokens))
+
+        mismatches = sum(a != b for a, b in zip(expected, batch)) + sum(
+            a != b for a, b in zip(expected, single)
+        )
+        results["modes"][name] = {
+            "legacy_per_s": round(len(titles) / t_legacy),
+            "precompiled_per_s": round(len(titles) / t_single),
+            "batch_per_s": round(len(titles) / t_batch),
+            "batch_seconds": round(t_batch, 3),
+            "speedup_vs_legacy": round(t_legacy / t_batch, 1),
+            "mismatches": mismatches,
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--non-ascii", type=float, default=0.02, help="fraction of titles with non-ASCII words")
+    parser.add_argument("--mode", nargs="+", choices=sorted(MODES), default=list(MODES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write JSON results to this path")
+    args = parser.parse_args()
+
+    titles = synthetic_titles(args.rows, args.non_ascii, args.seed)
+    results = run(titles, args.mode)
+    results["non_ascii"] = round(sum(not t.isascii() for t in titles) / max(1, len(titles)), 4)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+    if any(m["mismatches"] for m in results["modes"].values()):
+        raise SystemExit("normalize_batch disagrees with the legacy implementation")
+
+
+if __name__ == "__main__":
+    main()
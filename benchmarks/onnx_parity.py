@@ -0,0 +1,112 @@
+# benchmarks/onnx_parity.py
+"""
+Parity of the ONNX MiniLM backends against the PyTorch model.
+
+Usage:
+    python -m benchmarks.onnx_parity                 # titles from the DB
+    python -m benchmarks.onnx_parity --file titles.txt --limit 5000
+
+For fp32 and int8 exports the script reports the max / mean cosine drift
+(1 - cos between PyTorch and ONNX vectors of the same text), the max
+change of any pairwise similarity, how many pairs flip the duplicate
+decision at --threshold, and per-batch encode latency of each runtime.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from database.database import SessionLocal
+from models.title import Title
+from services.embedding_service import (
+    EMBED_BATCH_SIZE,
+    MINILM_MODEL_NAME,
+    ONNX_MODEL_DIR,
+)
+from services.onnx_embedder import load_onnx_embedder
+from services.vector_index import normalize_rows
+from utils.text_cleaner import clean_texts
+
+
+def load_texts(path: str, limit: int):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        with SessionLocal() as db:
+            texts = [
+                t for (t,) in db.query(Title.title).order_by(Title.id.desc()).limit(limit)
+            ]
+    return list(dict.fromkeys(clean_texts(texts[:limit])))
+
+
+def timed_encode(model, texts):
+    started = time.perf_counter()
+    emb = model.encode(texts, batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True)
+    elapsed = time.perf_counter() - started
+    return normalize_rows(emb), elapsed
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray, threshold: float, pair_limit: int):
+    drift = 1.0 - np.sum(reference * candidate, axis=1)
+
+    # pairwise decisions on the first pair_limit texts
+    ref, cand = reference[:pair_limit], candidate[:pair_limit]
+    upper = np.triu_indices(len(ref), k=1)
+    ref_sims = (ref @ ref.T)[upper]
+    cand_sims = (cand @ cand.T)[upper]
+    flips = np.count_nonzero((ref_sims >= threshold) != (cand_sims >= threshold))
+
+    return {
+        "max_cosine_drift": float(drift.max()),
+        "mean_cosine_drift": float(drift.mean()),
+        "max_pair_delta": float(np.abs(ref_sims - cand_sims).max()) if len(ref_sims) else 0.0,
+        "pairs": int(len(ref_sims)),
+        "pairs_near_threshold": int(np.count_nonzero(np.abs(ref_sims - threshold) < 0.01)),
+        "decision_flips": int(flips),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--file", help="one title per line (default: titles table)")
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--pairs", type=int, default=2000, help="texts used for pairwise checks")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    texts = load_texts(args.file, args.limit)
+    if not texts:
+        raise SystemExit("No texts to compare")
+
+    from sentence_transformers import SentenceTransformer
+
+    torch_model = SentenceTransformer(MINILM_MODEL_NAME, device="cpu")
+    reference, torch_time = timed_encode(torch_model, texts)
+
+    report = {
+        "texts": len(texts),
+        "threshold": args.threshold,
+        "torch_ms_per_text": torch_time / len(texts) * 1000.0,
+    }
+
+    for name, quantized in (("onnx", False), ("onnx-int8", True)):
+        model = load_onnx_embedder(MINILM_MODEL_NAME, args.model_dir, quantized=quantized)
+        emb, elapsed = timed_encode(model, texts)
+        report[name] = {
+            **compare(reference, emb, args.threshold, args.pairs),
+            "ms_per_text": elapsed / len(texts) * 1000.0,
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# benchmarks/service_bench.py
+"""
+Throughput / latency / memory of the title services on synthetic corpora.
+
+Usage:
+    python -m benchmarks.service_bench                        # 10k, 100k, 1M rows
+    python -m benchmarks.service_bench --sizes 10000 --queries 500
+    python -m benchmarks.service_bench --baseline benchmarks/results/old.json
+
+Each corpus size runs in its own process against a fresh temporary
+SQLite database and an in-RAM vector store, with the MiniLM model
+replaced by the hash embedder from benchmarks/fake_embedder.py (offline,
+deterministic). A fraction --dup-rate of the rows are near-duplicates
+of earlier rows (re-cased / re-punctuated copies, one word dropped or
+added, a number appended).
+
+Operations, in order:
+    process_bulk_titles   the corpus, in --bulk-frame row DataFrames
+    check_duplicate       --queries lookups (half near-duplicates)
+    find_similar_titles   the same lookups
+    save_title            --queries single inserts
+    dedupe_excel          the corpus as one sheet (semantic mode up to
+                          --semantic-max-rows rows)
+
+For every operation the JSON result holds calls, throughput (rows/s),
+p50 / p99 latency per call and peak RSS while it ran. Results are
+written to --out (default benchmarks/results/<commit>-<time>.json);
+--baseline prints the change against an earlier result file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+RESULTS_DIR = BASE_DIR / "benchmarks" / "results"
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# exact scans are quadratic over a bulk load; above this the child uses
+# the IVF index unless --index-mode says otherwise
+AUTO_IVF_ROWS = 100_000
+
+
+# ---------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------
+_SYLLABLES = [
+    "ka", "lo", "mi", "ne", "ru", "ta", "vo", "xi", "ze", "po",
+    "an", "el", "is", "or", "um", "sha", "tri", "qua", "bel", "dor",
+]
+
+
+def _vocabulary(size: int, rng) -> list:
+    words = set()
+    while len(words) < size:
+        parts = rng.integers(0, len(_SYLLABLES), rng.integers(2, 5))
+        words.add("".join(_SYLLABLES[p] for p in parts))
+    return sorted(words)
+
+
+def _variant(title: str, rng) -> str:
+    """A near-duplicate of `title` (cosine >= ~0.9 under the hash embedder)."""
+    words = title.split()
+    kind = rng.integers(0, 4)
+    if kind == 0:
+        # same cluster key: case / punctuation only
+        return title.upper() if rng.random() < 0.5 else title.replace(" ", ", ", 1) + "."
+    if kind == 1:
+        del words[rng.integers(0, len(words))]
+    elif kind == 2:
+        words.insert(rng.integers(0, len(words) + 1), words[rng.integers(0, len(words))] + "s")
+    else:
+        words.append(str(rng.integers(2, 100)))
+    return " ".join(words)
+
+
+def synthetic_titles(rows: int, dup_rate: float, seed: int):
+    """
+    (titles, is_variant flags). Fresh titles draw 6-10 words from one of
+    rows // 200 topic vocabularies, so unrelated titles share few words.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = _vocabulary(max(2000, min(50_000, rows // 10)), rng)
+    topics = max(20, rows // 200)
+    topic_words = rng.integers(0, len(vocab), (topics, 40))
+
+    titles, variants = [], []
+    for n in range(rows):
+        if n and rng.random() < dup_rate:
+            titles.append(_variant(titles[rng.integers(0, n)], rng))
+            variants.append(True)
+            continue
+
+        words = topic_words[rng.integers(0, topics)]
+        picked = rng.choice(words, rng.integers(6, 11), replace=False)
+        titles.append(" ".join(vocab[w] for w in picked).capitalize())
+        variants.append(False)
+
+    return titles, variants
+
+
+def synthetic_queries(titles, count: int, seed: int):
+    """Half near-duplicates of corpus rows, half fresh titles."""
+    rng = np.random.default_rng(seed + 1)
+    near = [_variant(titles[i], rng) for i in rng.integers(0, len(titles), count // 2)]
+    fresh, _ = synthetic_titles(count - count // 2, 0.0, seed + 2)
+    return near + [f"{t} {n}" for n, t in enumerate(fresh)]
+
+
+# ---------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------
+def _reset_peak_rss() -> bool:
+    """Resets VmHWM (Linux); elsewhere the peak is process-wide."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3) if samples else 0.0
+
+
+def measure(name: str, calls, rows_per_call=1):
+    """
+    Runs every zero-argument callable in `calls`, timing each one.
+    `rows_per_call` is an int or a list aligned with `calls`.
+    """
+    scoped = _reset_peak_rss()
+    latencies = []
+    rows = 0
+
+    started = time.perf_counter()
+    for n, call in enumerate(calls):
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+        rows += rows_per_call[n] if isinstance(rows_per_call, list) else rows_per_call
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "calls": len(latencies),
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": _percentile_ms(latencies, 50),
+        "p99_ms": _percentile_ms(latencies, 99),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_scope": "operation" if scoped else "process",
+    }
+    print(f"  {name:<22} {json.dumps(result)}", file=sys.stderr, flush=True)
+    return result
+
+
+# ---------------------------------------------------------
+# One corpus size (child process)
+# ---------------------------------------------------------
+def run_size(args) -> dict:
+    import logging
+
+    logging.basicConfig(level=logging.WARNING)
+
+    # database.database first (models <-> services import order)
+    from database.database import SessionLocal
+    from services.startup_service import prepare_database
+
+    from benchmarks.fake_embedder import install
+
+    import pandas as pd
+
+    from schemas.title_schema import TitleCreate
+    from services.excel_deduper import dedupe_excel
+    from services.title_service import (
+        check_duplicate,
+        find_similar_titles,
+        process_bulk_titles,
+        save_title,
+    )
+
+    install(args.dim)
+    prepare_database()
+
+    rows = args.rows
+    t0 = time.perf_counter()
+    titles, variants = synthetic_titles(rows, args.dup_rate, args.seed)
+    queries = synthetic_queries(titles, args.queries, args.seed)
+    result = {
+        "rows": rows,
+        "index_mode": os.environ["VECTOR_INDEX_MODE"],
+        "corpus": {
+            "near_duplicates": int(sum(variants)),
+            "generate_s": round(time.perf_counter() - t0, 2),
+        },
+        "operations": {},
+    }
+    ops = result["operations"]
+
+    with SessionLocal() as db:
+        frames = [
+            pd.DataFrame({"title": titles[start:start + args.bulk_frame]})
+            for start in range(0, rows, args.bulk_frame)
+        ]
+        summaries = []
+        ops["process_bulk_titles"] = measure(
+            "process_bulk_titles",
+            [lambda df=df: summaries.append(process_bulk_titles(db, df)) for df in frames],
+            [len(df) for df in frames],
+        )
+        result["corpus"]["flagged_duplicates"] = sum(s["duplicates"] for s in summaries)
+        del frames
+
+        items = [TitleCreate(title=q) for q in queries]
+        ops["check_duplicate"] = measure(
+            "check_duplicate", [lambda item=item: check_duplicate(db, item) for item in items]
+        )
+        ops["find_similar_titles"] = measure(
+            "find_similar_titles", [lambda item=item: find_similar_titles(db, item) for item in items]
+        )
+        ops["save_title"] = measure(
+            "save_title",
+            [lambda item=item: save_title(db, TitleCreate(title=item.title + " new")) for item in items],
+        )
+
+    semantic = rows <= args.semantic_max_rows
+    df = pd.DataFrame({"title": titles})
+    ops["dedupe_excel"] = measure(
+        "dedupe_excel", [lambda: dedupe_excel(df, semantic=semantic)], rows
+    )
+    ops["dedupe_excel"]["semantic"] = semantic
+
+    return result
+
+
+# ---------------------------------------------------------
+# Driver
+# ---------------------------------------------------------
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _index_mode(args, rows: int) -> str:
+    if args.index_mode != "auto":
+        return args.index_mode
+    return "ivf" if rows > AUTO_IVF_ROWS else "exact"
+
+
+def _spawn(args, rows: int, workdir: str) -> dict:
+    out = os.path.join(workdir, f"result-{rows}.json")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'bench-{rows}.db')}",
+        VECTOR_STORE_DIR="",
+        VECTOR_INDEX_MODE=_index_mode(args, rows),
+        EMBEDDING_CACHE_PATH="",
+        EMBED_WORKERS="0",
+    )
+    cmd = [
+        sys.executable, "-m", "benchmarks.service_bench",
+        "--child-rows", str(rows), "--child-out", out,
+        "--dup-rate", str(args.dup_rate), "--queries", str(args.queries),
+        "--bulk-frame", str(args.bulk_frame), "--dim", str(args.dim),
+        "--semantic-max-rows", str(args.semantic_max_rows), "--seed", str(args.seed),
+    ]
+    print(f"{rows} rows ({env['VECTOR_INDEX_MODE']} index)", file=sys.stderr, flush=True)
+    subprocess.run(cmd, cwd=BASE_DIR, env=env, check=True)
+
+    with open(out) as f:
+        return json.load(f)
+
+
+def compare(current: dict, baseline: dict):
+    """Prints throughput / p99 / RSS ratios (current / baseline)."""
+    print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta'].get('created')})")
+    for rows, size in current["sizes"].items():
+        old_size = baseline["sizes"].get(rows)
+        if old_size is None:
+            continue
+        for op, new in size["operations"].items():
+            old = old_size["operations"].get(op)
+            if not old:
+                continue
+            ratios = [
+                f"{key} x{new[key] / old[key]:.2f}" if old[key] else f"{key} n/a"
+                for key in ("rows_per_s", "p99_ms", "peak_rss_mb")
+            ]
+            print(f"  {rows:>8} {op:<22} " + "  ".join(ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--dup-rate", type=float, default=0.2)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--bulk-frame", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-mode", choices=["auto", "exact", "ivf"], default="auto")
+    parser.add_argument("--semantic-max-rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="JSON result path")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--child-rows", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_rows:
+        args.rows = args.child_rows
+        result = run_size(args)
+        with open(args.child_out, "w") as f:
+            json.dump(result, f)
+        return
+
+    commit = _git_commit()
+    created = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    results = {
+        "meta": {
+            "commit": commit,
+            "created": created,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if not k.startswith("child")},
+        },
+        "sizes": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="service-bench-") as workdir:
+        for rows in args.sizes:
+            results["sizes"][str(rows)] = _spawn(args, rows, workdir)
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{commit}-{created}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    text = json.dumps(results, indent=2)
+    out.write_text(text)
+    print(text)
+    print(f"\nwritten to {out}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
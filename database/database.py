@@ -1,12 +1,77 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./titles.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./titles.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+# ==========================================================
+# SQLite tuning (ignored for other databases)
+# ==========================================================
+# How long a connection waits for the write lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+
+# WAL: readers never block the writer (and vice versa)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+
+# NORMAL is durable across application crashes in WAL mode; only an OS
+# crash / power loss can drop the last commits
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+# Page cache per connection (KiB) and memory-mapped I/O window (bytes)
+SQLITE_CACHE_KIB = int(os.getenv("SQLITE_CACHE_KIB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+
+# Pooled connections per process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KIB}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_BYTES}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+
+def make_engine(url: str = DATABASE_URL):
+    """
+    Engine with the pool / pragma settings above. In-memory SQLite keeps
+    SQLAlchemy's single-connection pool (each connection would be a
+    separate database otherwise).
+    """
+    if not _is_sqlite(url):
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+
+    memory = url in ("sqlite://", "sqlite:///:memory:")
+    engine = create_engine(
+        url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        },
+        **({} if memory else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}),
+    )
+    event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+engine = make_engine()
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -19,7 +84,20 @@ Base = declarative_base()
 # 🔽 IMPORTANT: force model registration
 # Without these imports, tables will NEVER be created
 from models.title import Title
-from models.bulk_upload_run import BulkUploadRun 
+from models.bulk_upload_run import BulkUploadRun
+from models.bulk_upload_shard import BulkUploadShard
+from models.cluster import Cluster
+from models.title_stats import TitleStats
+
+
+def ensure_indexes(bind):
+    """
+    create_all() skips indexes on tables that already exist;
+    this adds any declared index missing from an older database.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
 
 
 def get_db():
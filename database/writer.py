@@ -0,0 +1,287 @@
+# database/writer.py
+"""
+Single-writer commit queue (group commit).
+
+Every write to the titles tables is a job `fn(session)` submitted to the
+one writer thread of its engine. The writer drains whatever jobs are
+queued, runs them back to back in ONE transaction (each inside its own
+savepoint, so a failing job only rolls back itself) and commits once:
+N concurrent requests cost one fsync and one write-lock acquisition
+instead of N, and they never fight over SQLite's lock inside a process.
+
+Jobs do not commit. Work that must only happen once the rows are
+durable (in-memory index updates) is registered with after_commit();
+state a job shares with the later jobs of its batch (session.info, which
+is cleared after every batch) is undone with after_rollback().
+
+Every application write goes through write(): titles, clusters, stats
+rebuilds and bulk run / shard bookkeeping. Exempt by design: schema
+setup at startup (ensure_*() on engine.begin(), before anything is
+served) and offline maintenance commands (vector_store migrate
+--drop-blobs, the search index rebuild), which are run with the app
+stopped. The embedding cache is a separate SQLite file.
+"""
+
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from services.metrics import STAGE_SECONDS, WRITER_BATCH_JOBS
+
+logger = logging.getLogger(__name__)
+
+# Jobs committed together at most
+DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", "64"))
+
+# Extra wait for more jobs once the first one arrived (0 -> only jobs
+# that queued up while the previous batch was committing)
+DB_WRITER_MAX_WAIT_MS = float(os.getenv("DB_WRITER_MAX_WAIT_MS", "0"))
+
+# How often a caller waiting for its job checks that the writer is alive
+DB_WRITER_ALIVE_CHECK_SECONDS = float(os.getenv("DB_WRITER_ALIVE_CHECK_SECONDS", "1"))
+
+_STOP = object()
+
+
+def after_commit(db: Session, callback: Callable[[], None]):
+    """
+    Runs `callback` after the writer transaction that contains the
+    current job commits (dropped if the job or the commit fails).
+    """
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+def after_rollback(db: Session, callback: Callable[[], None]):
+    """
+    Runs `callback` when the current job's changes are rolled back (its
+    own savepoint or the whole batch); dropped once they commit.
+    """
+    db.info.setdefault("after_rollback", []).append(callback)
+
+
+def _run_hooks(hooks, kind: str):
+    for hook in hooks:
+        try:
+            hook()
+        except Exception:
+            logger.exception("%s callback failed", kind)
+
+
+class Writer:
+    def __init__(self, bind, max_batch: int = DB_WRITER_MAX_BATCH, max_wait_ms: float = DB_WRITER_MAX_WAIT_MS):
+        self.bind = bind
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._queue = queue.Queue()
+        self._sqlite = bind.dialect.name == "sqlite"
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._session = None
+
+        # counters for /admin/stats
+        self.batches = 0
+        self.jobs = 0
+        self.largest_batch = 0
+
+        self._thread.start()
+
+    # -----------------------------
+    # Client side
+    # -----------------------------
+    def submit(self, fn: Callable[[Session], object]):
+        """
+        Runs `fn(session)` in the next group commit and returns its
+        result once committed (or raises its / the commit's exception).
+        Called from a writer job it simply runs in the current batch.
+        """
+        if threading.current_thread() is self._thread:
+            return self._run_job(fn)
+
+        if not self._thread.is_alive():
+            raise RuntimeError("Database writer is stopped")
+
+        future = Future()
+        # the job runs in the caller's context (profiling, metrics labels)
+        self._queue.put((fn, future, time.perf_counter(), contextvars.copy_context()))
+
+        # jobs may run long (rebuilds); only a dead writer ends the wait
+        while True:
+            try:
+                return future.result(timeout=DB_WRITER_ALIVE_CHECK_SECONDS)
+            except TimeoutError:
+                if not self._thread.is_alive():
+                    raise RuntimeError("Database writer stopped before running the job")
+
+    def stop(self, timeout: float = 10.0):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def info(self) -> dict:
+        return {
+            "batches": self.batches,
+            "jobs": self.jobs,
+            "avg_batch": round(self.jobs / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
+
+    # -----------------------------
+    # Writer thread
+    # -----------------------------
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+
+        batch = [item]
+        stop = False
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.max_wait) if self.max_wait else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+
+        if stop:
+            self._queue.put(_STOP)
+        return batch
+
+    def _run_job(self, fn):
+        db = self._session
+        hooks = db.info.pop("after_commit", [])
+        undo = db.info.pop("after_rollback", [])
+        try:
+            with db.begin_nested():
+                result = fn(db)
+                db.flush()
+        except BaseException:
+            # the job's own callbacks go with its savepoint
+            rolled_back = db.info.pop("after_rollback", [])
+            db.info["after_commit"] = hooks
+            db.info["after_rollback"] = undo
+            _run_hooks(reversed(rolled_back), "after_rollback")
+            raise
+        db.info["after_commit"] = hooks + db.info.pop("after_commit", [])
+        db.info["after_rollback"] = undo + db.info.pop("after_rollback", [])
+        return result
+
+    def _commit(self, batch):
+        db = self._session
+        db.info.clear()
+        done = []
+
+        started = time.perf_counter()
+        for _, _, queued, _ in batch:
+            STAGE_SECONDS.observe(started - queued, "writer_wait")
+        WRITER_BATCH_JOBS.observe(len(batch))
+
+        try:
+            if self._sqlite:
+                # take the write lock up front: no lock upgrade (and no
+                # SQLITE_BUSY deadlock) halfway through the batch
+                db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+            for fn, future, _, context in batch:
+                try:
+                    done.append((future, context.run(self._run_job, fn)))
+                except Exception as e:
+                    future.set_exception(e)
+
+            with STAGE_SECONDS.time("commit"):
+                db.commit()
+        except Exception as e:
+            logger.exception("Group commit of %d jobs failed", len(batch))
+            db.rollback()
+            _run_hooks(reversed(db.info.get("after_rollback", [])), "after_rollback")
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            hooks = db.info.pop("after_commit", [])
+            db.info.clear()
+            db.expunge_all()
+
+        _run_hooks(hooks, "after_commit")
+
+        for future, result in done:
+            future.set_result(result)
+
+        self.batches += 1
+        self.jobs += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+    def _new_session(self):
+        return Session(bind=self.bind, expire_on_commit=False, autoflush=False)
+
+    def _run(self):
+        self._session = self._new_session()
+        try:
+            while True:
+                batch = []
+                try:
+                    batch = self._next_batch()
+                    if batch is None:
+                        return
+                    self._commit(batch)
+                except BaseException as e:
+                    # anything _commit() did not handle (a failing
+                    # rollback, a job raising BaseException): fail the
+                    # batch, start over on a fresh session, keep serving
+                    logger.exception("Database writer failed on a batch of %d jobs", len(batch))
+                    try:
+                        self._session.close()
+                    except Exception:
+                        logger.exception("Closing the writer session failed")
+                    self._session = self._new_session()
+                    for _, future, _, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+        finally:
+            self._session.close()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(bind) -> Writer:
+    """
+    The process-wide writer of an engine (started on first use).
+    """
+    with _writers_lock:
+        writer = _writers.get(bind)
+        if writer is None:
+            writer = _writers[bind] = Writer(bind)
+        return writer
+
+
+def write(db: Session, fn: Callable[[Session], object]):
+    """
+    Runs `fn` through the writer of `db`'s engine; `db` itself is only
+    used to find the engine.
+    """
+    return get_writer(db.get_bind()).submit(fn)
+
+
+def stop_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+
+
+atexit.register(stop_writers)
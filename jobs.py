@@ -1,26 +1,29 @@
 # jobs.py
-from redis import Redis
-from rq import Queue
+# RQ job entry points (run by worker.py); the logic lives in
+# services/bulk_service.py
 import os
-import pandas as pd
-from services.title_service import process_bulk_titles
-from database.database import get_db
-from sqlalchemy.orm import Session
+from database.database import SessionLocal
+from services import bulk_service
+from services.file_hash import hash_file
+from services.profiling_service import profile_job
 
-redis_conn = Redis(host='localhost', port=6379, db=0)
-q = Queue(connection=redis_conn)
 
-def process_file_bulk(temp_path: str):
-    db: Session = next(get_db())
-    try:
-        df = pd.read_excel(temp_path)
-        result = process_bulk_titles(db, df)
-        print(f"Bulk processing complete: {result}")
-        # Optional: delete temp file
-        os.remove(temp_path)
-        return result
-    except Exception as e:
-        print(f"Error in bulk processing: {e}")
-        return {"error": str(e)}
-    finally:
-        db.close()
\ No newline at end of file
+def plan_run(run_id: int):
+    with profile_job("plan_run", run_id=run_id), SessionLocal() as db:
+        bulk_service.plan_run(db, run_id)
+
+
+def process_shard(run_id: int, shard_no: int):
+    with profile_job("process_shard", run_id=run_id, shard_no=shard_no), SessionLocal() as db:
+        return bulk_service.process_shard(db, run_id, shard_no)
+
+
+def process_file_bulk(temp_path: str, filename: str = None):
+    """
+    Queues a sharded run for a file already on shared storage.
+    """
+    with SessionLocal() as db:
+        run, created = bulk_service.submit_file(
+            db, temp_path, filename or os.path.basename(temp_path), hash_file(temp_path)
+        )
+        return {"run_id": run.id, "status": run.status, "created": created}
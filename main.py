@@ -1,3 +1,10 @@
+import time
+
+_PROCESS_START = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -24,22 +31,42 @@ logging.basicConfig(
 logger = logging.getLogger("clearoid")
 
 # -------------------------------------------------
-# DB SETUP
+# DB MODELS
 # -------------------------------------------------
-from database.database import Base, engine
+# Tables are created in the lifespan hook, not at import time
+import database.database
 
 # IMPORTANT: import ALL models before create_all
 import models.title
 import models.bulk_upload_run
-
-Base.metadata.create_all(bind=engine)
+import models.bulk_upload_shard
+import models.cluster
+import models.title_stats
 
 # -------------------------------------------------
 # ROUTERS
 # -------------------------------------------------
 from routes.title_routes import router as title_router
 from routes.excel_routes import router as excel_router
+from routes.bulk_upload_routes import router as bulk_upload_router
 from routes.admin_routes import router as admin_router
+from services.embedding_service import EmbeddingQueueFull
+from services.startup_service import Readiness, prepare_database, warm_up
+from services.profiling_service import ProfilingMiddleware
+
+readiness = Readiness(started=_PROCESS_START)
+
+# -------------------------------------------------
+# LIFESPAN
+# -------------------------------------------------
+# Schema work must finish before serving; model load / warmup and the
+# index build then run concurrently in the background (see GET /ready).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    readiness.run("schema", prepare_database)
+    warmup = asyncio.create_task(warm_up(readiness))
+    yield
+    warmup.cancel()
 
 # -------------------------------------------------
 # FASTAPI APP
@@ -48,6 +75,7 @@ app = FastAPI(
     title="Clearoid",
     description="AI-Assisted Title Normalization & Duplicate Detection System",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # -------------------------------------------------
@@ -61,6 +89,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -------------------------------------------------
+# PROFILING (on demand / sampled, see /admin/profiles)
+# -------------------------------------------------
+app.add_middleware(ProfilingMiddleware)
+
 # -------------------------------------------------
 # GLOBAL ERROR HANDLER
 # -------------------------------------------------
@@ -72,6 +105,31 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"success": False, "detail": "Internal server error"},
     )
 
+@app.exception_handler(EmbeddingQueueFull)
+async def embedding_queue_full_handler(request: Request, exc: EmbeddingQueueFull):
+    logger.warning("%s", exc)
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "detail": "Embedding service busy, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+# -------------------------------------------------
+# HEALTH / READINESS
+# -------------------------------------------------
+@app.get("/health", tags=["Health"])
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/ready", tags=["Health"])
+async def ready():
+    snapshot = readiness.snapshot()
+    return JSONResponse(
+        status_code=200 if snapshot["ready"] else 503,
+        content=snapshot,
+    )
+
 # -------------------------------------------------
 # 🔧 LEGACY ROUTE SAFETY (FIXES 405 ERRORS)
 # -------------------------------------------------
@@ -94,6 +152,7 @@ async def legacy_check_duplicate_redirect():
 
 app.include_router(title_router)
 app.include_router(excel_router)
+app.include_router(bulk_upload_router)
 app.include_router(admin_router, prefix="/admin", tags=["Admin"])
 
 # -------------------------------------------------
@@ -104,3 +163,6 @@ app.mount(
     StaticFiles(directory="frontend", html=True),
     name="frontend",
 )
+
+readiness.import_seconds = round(time.perf_counter() - _PROCESS_START, 3)
+logger.info("App imported in %.2fs", readiness.import_seconds)
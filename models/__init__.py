@@ -1,2 +1,5 @@
 from .title import Title
-from .bulk_upload_run import BulkUploadRun 
+from .bulk_upload_run import BulkUploadRun
+from .bulk_upload_shard import BulkUploadShard
+from .cluster import Cluster
+from .title_stats import TitleStats
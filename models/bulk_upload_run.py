@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.orm import relationship
 from database.database import Base
 from datetime import datetime
 
@@ -10,8 +11,33 @@ class BulkUploadRun(Base):
     filename = Column(String, nullable=False)
     file_hash = Column(String, unique=True, nullable=False)
 
+    # queued -> planning -> running -> completed | failed
+    status = Column(String, default="queued", nullable=False, index=True)
+
+    # Uploaded file, then per-shard row files (see services/bulk_service.py)
+    file_path = Column(String, nullable=True)
+    shard_dir = Column(String, nullable=True)
+
+    # Progress: non-empty title rows, shard layout, shards finished
+    total_rows = Column(Integer, nullable=True)
+    shard_rows = Column(Integer, nullable=True)
+    shards_total = Column(Integer, default=0)
+    shards_done = Column(Integer, default=0)
+
     processed = Column(Integer, default=0)
     saved = Column(Integer, default=0)
     duplicates = Column(Integer, default=0)
 
+    error = Column(Text, nullable=True)
+
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Row-range shards with their checkpoints
+    shards = relationship(
+        "BulkUploadShard",
+        back_populates="run",
+        order_by="BulkUploadShard.shard_no",
+        cascade="all, delete-orphan",
+    )
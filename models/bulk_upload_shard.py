@@ -0,0 +1,40 @@
+# models/bulk_upload_shard.py
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from database.database import Base
+
+
+class BulkUploadShard(Base):
+    __tablename__ = "bulk_upload_shards"
+    __table_args__ = (
+        UniqueConstraint("run_id", "shard_no", name="uq_bulk_upload_shards_run_shard"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("bulk_upload_runs.id"), nullable=False, index=True)
+    shard_no = Column(Integer, nullable=False)
+
+    # Title rows [start_row, end_row) of the run
+    start_row = Column(Integer, nullable=False)
+    end_row = Column(Integer, nullable=False)
+
+    # Checkpoint: rows before next_row are committed (same transaction
+    # as the titles they produced)
+    next_row = Column(Integer, nullable=False)
+
+    # pending -> running -> done | failed
+    status = Column(String, default="pending", nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    worker = Column(String, nullable=True)
+
+    processed = Column(Integer, default=0, nullable=False)
+    saved = Column(Integer, default=0, nullable=False)
+    duplicates = Column(Integer, default=0, nullable=False)
+
+    error = Column(Text, nullable=True)
+
+    # Refreshed at every checkpoint; a running shard whose heartbeat is
+    # older than BULK_SHARD_STALE_SECONDS is reclaimed
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    run = relationship("BulkUploadRun", back_populates="shards")
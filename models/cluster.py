@@ -0,0 +1,24 @@
+# models/cluster.py
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime
+from datetime import datetime
+from database.database import Base
+
+class Cluster(Base):
+    __tablename__ = "clusters"
+
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Canonical normalized title shared by every member
+    normalized_title = Column(String, nullable=False, unique=True)
+
+    # Canonical primary (oldest member) -> titles.id
+    primary_id = Column(Integer, nullable=True)
+
+    # Number of titles in the cluster (indexed for top-N / >1 filters)
+    member_count = Column(Integer, default=0, nullable=False, index=True)
+
+    # Running mean of member unit embeddings (float32 bytes)
+    centroid = Column(LargeBinary, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,10 +1,14 @@
 # models/title.py
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from datetime import datetime
 from database.database import Base
 
 class Title(Base):
     __tablename__ = "titles"
+    __table_args__ = (
+        # keyset pagination for /api/history (created_at, id)
+        Index("ix_titles_created_at_id", "created_at", "id"),
+    )
 
     # Primary key
     id = Column(Integer, primary_key=True, index=True)
@@ -18,6 +22,9 @@ class Title(Base):
     # Embedding stored as JSON string (vector output)
     embedding = Column(Text, nullable=False)
 
+    # Owning cluster (see models/cluster.py)
+    cluster_id = Column(Integer, ForeignKey("clusters.id"), nullable=True, index=True)
+
     # Duplicate flag (0 = unique, 1 = duplicate)
     is_duplicate = Column(Integer, default=0, index=True)
 
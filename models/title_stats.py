@@ -0,0 +1,18 @@
+# models/title_stats.py
+from sqlalchemy import Column, Integer, DateTime
+from datetime import datetime
+from database.database import Base
+
+class TitleStats(Base):
+    __tablename__ = "title_stats"
+
+    # Single row (id = 1), maintained by services/stats_service.py
+    id = Column(Integer, primary_key=True)
+
+    total = Column(Integer, default=0, nullable=False)
+    duplicates = Column(Integer, default=0, nullable=False)
+
+    # Sum of len(title), for avg_title_length
+    title_length_sum = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
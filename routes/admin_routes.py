@@ -1,51 +1,48 @@
 # routes/admin_routes.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from database.database import get_db
+from database.writer import get_writer
 from models.title import Title
+from services.embedding_service import embedding_batcher_stats, embedding_cache_stats
+from services import metrics
+from services.admin_auth import require_admin
+from services.profiling_service import list_profiles, load_profile
+from services.stats_service import get_stats, rebuild_stats, top_clusters
+from services.vector_index import title_index
 
 router = APIRouter()
 
 
-@router.get("/stats")
-def stats(db: Session = Depends(get_db)):
-    total = db.query(func.count(Title.id)).scalar()
-
-    dup_count = (
-        db.query(func.count(Title.id))
-        .filter(Title.is_duplicate == 1)
-        .scalar()
-    )
+def _stats_payload(stats):
+    return {
+        "total": stats.total,
+        "duplicates": stats.duplicates,
+        "unique": stats.total - stats.duplicates,
+        "avg_title_length": (
+            stats.title_length_sum / stats.total if stats.total else 0.0
+        ),
+    }
 
-    unique = total - dup_count
 
-    avg_len = db.query(func.avg(func.length(Title.title))).scalar() or 0
+@router.get("/stats")
+def stats(db: Session = Depends(get_db)):
+    # counters are maintained on insert, see services/stats_service.py
+    counters = get_stats(db)
 
-    top_norm = (
-        db.query(
-            Title.normalized_title,
-            func.count(Title.id).label("cnt")
-        )
-        .group_by(Title.normalized_title)
-        .order_by(func.count(Title.id).desc())
-        .limit(10)
-        .all()
-    )
+    top_norm = top_clusters(db, limit=10)
 
     recent = (
-        db.query(Title)
-        .order_by(Title.created_at.desc())
+        db.query(Title.id, Title.title, Title.created_at)
+        .order_by(Title.id.desc())
         .limit(10)
         .all()
     )
 
     return {
-        "total": total,
-        "duplicates": dup_count,
-        "unique": unique,
-        "avg_title_length": float(avg_len),
+        **_stats_payload(counters),
         "top_normalized": [
             {"normalized": n, "count": c}
             for n, c in top_norm
@@ -58,4 +55,53 @@ def stats(db: Session = Depends(get_db)):
             }
             for r in recent
         ],
+        "embedding": {
+            "cache": embedding_cache_stats(),
+            "coalescer": embedding_batcher_stats(),
+            "vector_store": title_index.store.info(),
+        },
+        "writer": get_writer(db.get_bind()).info(),
     }
+
+
+@router.post("/stats/rebuild", dependencies=[Depends(require_admin)])
+def stats_rebuild(db: Session = Depends(get_db)):
+    """
+    Recomputes the counters from the titles table.
+    """
+    return _stats_payload(rebuild_stats(db))
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def metrics_endpoint(db: Session = Depends(get_db)):
+    # Prometheus text format; per-process values (see services/metrics.py).
+    # Scrapers send the admin key (http_headers: X-Admin-Key)
+    return PlainTextResponse(metrics.render(db.get_bind()), media_type=metrics.CONTENT_TYPE)
+
+
+# -------------------------------------------------
+# Profiles (admin key required, see services/profiling_service.py)
+# -------------------------------------------------
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+def profiles(limit: int = Query(50, ge=1, le=500), kind: str = None):
+    return {"profiles": list_profiles(limit=limit, kind=kind)}
+
+
+def _profile_or_404(profile_id: str):
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def profile_detail(profile_id: str, stacks: int = Query(20, ge=0, le=1000)):
+    profile = _profile_or_404(profile_id)
+    profile["folded"] = profile["folded"][:stacks]
+    return profile
+
+
+@router.get("/profiles/{profile_id}/folded", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def profile_folded(profile_id: str):
+    # collapsed stacks: flamegraph.pl, speedscope, inferno ...
+    return PlainTextResponse("\n".join(_profile_or_404(profile_id)["folded"]) + "\n")
@@ -1,6 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from database.database import SessionLocal
 from models.bulk_upload_run import BulkUploadRun
+from services.bulk_service import resume_run, run_progress
 
 router = APIRouter(prefix="/bulk-uploads", tags=["Bulk Uploads"])
 
@@ -25,7 +26,7 @@ def list_bulk_uploads():
 @router.get("/{run_id}")
 def get_bulk_upload(run_id: int):
     """
-    Get a single bulk upload run by ID.
+    Get a single bulk upload run by ID, with per-shard progress.
     Useful for audit/debug.
     """
     db = SessionLocal()
@@ -39,6 +40,22 @@ def get_bulk_upload(run_id: int):
         if not run:
             return {"error": "Bulk upload run not found"}
 
-        return run
+        return run_progress(run)
+    finally:
+        db.close()
+
+
+@router.post("/{run_id}/resume")
+def resume_bulk_upload(run_id: int):
+    """
+    Re-queues the unfinished part of a run (failed or stale shards
+    continue from their checkpoint).
+    """
+    db = SessionLocal()
+    try:
+        if not resume_run(db, run_id):
+            raise HTTPException(status_code=409, detail="Run not found or already completed")
+
+        return run_progress(db.get(BulkUploadRun, run_id))
     finally:
         db.close()
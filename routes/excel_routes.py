@@ -1,125 +1,134 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 import os
-import pandas as pd
-import numpy as np
-import hashlib
+import tempfile
 
 from database.database import SessionLocal
-from models.title import Title
-from models.bulk_upload_run import BulkUploadRun
-from services.excel_deduper import dedupe_excel
-from services.embedding_service import get_embedding
+from services.bulk_service import BULK_UPLOAD_DIR, find_run, submit_file
+from services.file_reader import SUPPORTED_EXTENSIONS
+from services.upload_service import StreamedUpload, UploadError, stream_upload
 
 router = APIRouter(prefix="/excel", tags=["Excel"])
 
-TEMP_DIR = "./temp"
-
-
-def hash_file(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+# Rows a semantic dedupe preview may hold (the whole sheet is embedded)
+DEDUPE_SEMANTIC_MAX_ROWS = int(os.getenv("DEDUPE_SEMANTIC_MAX_ROWS", "100000"))
+
+
+# Documented by hand: the body is parsed by stream_upload(), not FastAPI
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
 
 
-def process_file_bulk_bg(file_path: str, filename: str):
-    db = SessionLocal()
+@router.post("/bulk-upload", openapi_extra=_UPLOAD_BODY)
+async def bulk_upload(request: Request):
+    # one pass: body -> unique temp file + SHA-256, never held in memory
     try:
-        file_hash = hash_file(file_path)
-
-        existing_run = (
-            db.query(BulkUploadRun)
-            .filter(BulkUploadRun.file_hash == file_hash)
-            .first()
+        upload = await stream_upload(
+            request, BULK_UPLOAD_DIR, field="file", extensions=SUPPORTED_EXTENSIONS
         )
-
-        if existing_run:
-            print("Duplicate file upload skipped:", filename)
-            return
-
-        df = pd.read_excel(file_path)
-
-        unique_df, clusters = dedupe_excel(
-            df,
-            column="title",
-            ignore_numbers=True
+    except UploadError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{e}. Only Excel, CSV or Parquet files "
+                   "(.xlsx, .xls, .csv, .parquet) are allowed"
         )
 
-        existing_norms = {
-            r[0] for r in db.query(Title.normalized_title).all()
+    return await run_in_threadpool(_submit, upload)
+
+
+def _submit(upload: StreamedUpload):
+    with SessionLocal() as db:
+        # a file already ingested is answered before anything is stored
+        # or enqueued
+        existing = find_run(db, upload.sha256)
+        if existing is not None and existing.status == "completed":
+            os.remove(upload.path)
+            return {
+                "status": "duplicate",
+                "run_id": existing.id,
+                "filename": upload.filename,
+            }
+
+        # content-addressed: workers find the file by its run
+        ext = os.path.splitext(upload.path)[1]
+        file_path = os.path.join(BULK_UPLOAD_DIR, f"{upload.sha256}{ext}")
+        os.replace(upload.path, file_path)
+
+        # planning / shards run on worker.py processes (see services/bulk_service.py)
+        run, created = submit_file(db, file_path, upload.filename, upload.sha256)
+
+        # a concurrent upload of the same file may have finished it
+        if not created and run.status == "completed":
+            return {
+                "status": "duplicate",
+                "run_id": run.id,
+                "filename": upload.filename,
+            }
+
+        return {
+            "status": run.status,
+            "run_id": run.id,
+            "filename": upload.filename,
+            "bytes": upload.size,
         }
 
-        saved = 0
-
-        for _, row in unique_df.iterrows():
-            normalized = row["normalized"]
-
-            if normalized in existing_norms:
-                continue
-
-            vec = get_embedding(normalized)
-            vec_bytes = np.array(vec, dtype=np.float32).tobytes()
 
-            db.add(
-                Title(
-                    title=row["title"],
-                    normalized_title=normalized,
-                    embedding=vec_bytes,
-                    is_duplicate=0
-                )
-            )
-
-            existing_norms.add(normalized)
-            saved += 1
-
-        run = BulkUploadRun(
-            filename=filename,
-            file_hash=file_hash,
-            processed=len(df),
-            saved=saved,
-            duplicates=len(df) - saved,
+@router.post("/dedupe", openapi_extra=_UPLOAD_BODY)
+async def dedupe(request: Request, semantic: bool = False, threshold: float = 0.85):
+    """
+    Groups the titles of one sheet without storing anything: exact
+    normalized matches, plus embedding near-duplicates with `semantic`.
+    """
+    try:
+        upload = await stream_upload(
+            request, tempfile.gettempdir(), field="file", extensions=SUPPORTED_EXTENSIONS
         )
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        db.add(run)
-        db.commit()
+    try:
+        return await run_in_threadpool(_dedupe, upload, semantic, threshold)
+    finally:
+        os.remove(upload.path)
 
-        print({
-            "file": filename,
-            "processed": len(df),
-            "saved": saved,
-            "duplicates": len(df) - saved,
-            "clusters": {k: v for k, v in clusters.items() if len(v) > 1}
-        })
 
-    finally:
-        db.close()
+def _dedupe(upload: StreamedUpload, semantic: bool, threshold: float):
+    import pandas as pd
 
+    from services.excel_deduper import dedupe_excel
+    from services.file_reader import iter_title_chunks
 
-@router.post("/bulk-upload")
-async def bulk_upload(
-    file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
-):
-    if not file.filename.lower().endswith((".xlsx", ".xls")):
+    try:
+        frames = list(iter_title_chunks(upload.path, filename=upload.filename))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({"title": []})
+    df = df.dropna(subset=["title"])
+
+    if semantic and len(df) > DEDUPE_SEMANTIC_MAX_ROWS:
         raise HTTPException(
-            status_code=400,
-            detail="Only Excel files (.xlsx, .xls) are allowed"
+            status_code=413,
+            detail=f"Semantic dedupe is limited to {DEDUPE_SEMANTIC_MAX_ROWS} rows",
         )
 
-    os.makedirs(TEMP_DIR, exist_ok=True)
-    temp_path = os.path.join(TEMP_DIR, file.filename)
-
-    with open(temp_path, "wb") as f:
-        f.write(await file.read())
-
-    background_tasks.add_task(
-        process_file_bulk_bg,
-        temp_path,
-        file.filename
-    )
+    unique_df, clusters = dedupe_excel(df, column="title", semantic=semantic, threshold=threshold)
 
     return {
-        "status": "processing",
-        "filename": file.filename
+        "filename": upload.filename,
+        "rows": len(df),
+        "unique": len(unique_df),
+        "semantic": semantic,
+        "groups": {norm: titles for norm, titles in clusters.items() if len(titles) > 1},
     }
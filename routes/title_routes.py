@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from database.database import get_db
 from schemas.title_schema import TitleCreate, TitleOut
@@ -9,25 +10,37 @@ from services.title_service import (
     check_duplicate,
     find_similar_titles,
     count_duplicates,
+    embed_title,
 )
-from models.title import Title
+from services.history_service import (
+    decode_cursor,
+    history_page,
+    iter_history_ndjson,
+)
+from services.search_service import search_titles
+from models.cluster import Cluster
 
 router = APIRouter(prefix="/api", tags=["Titles"])
 
 
+# Embeddings are awaited from the request coalescer; the DB work then
+# runs in the threadpool as before.
 @router.post("/submit", response_model=TitleOut)
-def submit(item: TitleCreate, db: Session = Depends(get_db)):
-    return save_title(db, item)
+async def submit(item: TitleCreate, db: Session = Depends(get_db)):
+    vec = await embed_title(item)
+    return await run_in_threadpool(save_title, db, item, vec=vec)
 
 
 @router.post("/check-duplicate")
-def check_duplicate_route(item: TitleCreate, db: Session = Depends(get_db)):
-    return check_duplicate(db, item)
+async def check_duplicate_route(item: TitleCreate, db: Session = Depends(get_db)):
+    vec = await embed_title(item)
+    return await run_in_threadpool(check_duplicate, db, item, vec=vec)
 
 
 @router.post("/similar-titles")
-def similar_titles(item: TitleCreate, db: Session = Depends(get_db)):
-    return {"results": find_similar_titles(db, item)}
+async def similar_titles(item: TitleCreate, db: Session = Depends(get_db)):
+    vec = await embed_title(item)
+    return {"results": await run_in_threadpool(find_similar_titles, db, item, vec=vec)}
 
 
 @router.get("/duplicate-count")
@@ -39,11 +52,11 @@ def duplicate_count(db: Session = Depends(get_db)):
 def clusters(db: Session = Depends(get_db)):
     groups = (
         db.query(
-            Title.normalized_title.label("group"),
-            func.count(Title.id).label("count")
+            Cluster.normalized_title.label("group"),
+            Cluster.member_count.label("count")
         )
-        .group_by(Title.normalized_title)
-        .having(func.count(Title.id) > 1)
+        .filter(Cluster.member_count > 1)
+        .order_by(Cluster.member_count.desc())
         .all()
     )
 
@@ -54,31 +67,30 @@ def clusters(db: Session = Depends(get_db)):
 
 
 @router.get("/history")
-def history(db: Session = Depends(get_db)):
-    rows = (
-        db.query(Title)
-        .order_by(Title.created_at.desc())
-        .all()
-    )
+def history(
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    Keyset-paginated history (newest first). Pass `next_cursor` back as
+    `cursor` for the following page; `format=ndjson` streams every row
+    after the cursor instead.
+    """
+    try:
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if format == "ndjson":
+        return StreamingResponse(
+            iter_history_ndjson(cursor),
+            media_type="application/x-ndjson",
+        )
 
-    data = []
-    for r in rows:
-        data.append({
-            "id": r.id,
-            "title": r.title,
-            "normalized": r.normalized_title,
-            "status": "duplicate" if r.is_duplicate else "unique",
-            "cluster": r.normalized_title,
-            "created_at": r.created_at.isoformat()
-        })
-
-    return {
-        "total": len(data),
-        "unique": sum(1 for d in data if d["status"] == "unique"),
-        "duplicates": sum(1 for d in data if d["status"] == "duplicate"),
-        "clusters": len(set(d["cluster"] for d in data)),
-        "data": data
-    }
+    return history_page(db, cursor=cursor, limit=limit)
 
 
 @router.get("/titles")
@@ -89,19 +101,7 @@ def get_titles(
     duplicates: bool | None = None,
     db: Session = Depends(get_db),
 ):
-    query = db.query(Title)
-
-    if search:
-        query = query.filter(
-            (Title.title.ilike(f"%{search}%")) |
-            (Title.normalized_title.ilike(f"%{search}%"))
-        )
-
-    if duplicates is not None:
-        query = query.filter(Title.is_duplicate == (1 if duplicates else 0))
-
-    total = query.count()
-    rows = query.offset((page - 1) * limit).limit(limit).all()
+    total, rows = search_titles(db, search, duplicates, page, limit)
 
     return {
         "total": total,
@@ -0,0 +1,33 @@
+# services/admin_auth.py
+"""
+Shared-secret guard for admin-only surfaces (profiles, metrics,
+stats rebuild).
+Clients send the key in the X-Admin-Key header.
+"""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY") or os.getenv("API_KEY")
+
+ADMIN_KEY_HEADER = "x-admin-key"
+
+
+def is_admin_key(key: Optional[str]) -> bool:
+    if not ADMIN_API_KEY or not key:
+        return False
+    return hmac.compare_digest(key.encode(), ADMIN_API_KEY.encode())
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """
+    FastAPI dependency: 403 without a valid key, 503 when no key is
+    configured (the guarded routes are then unavailable, not open).
+    """
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=503, detail="ADMIN_API_KEY is not configured")
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=403, detail="Admin key required")
@@ -0,0 +1,151 @@
+# services/ann_index.py
+
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ASSIGN_BLOCK = 8192
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Nearest centroid (max dot product) per row, computed in blocks so
+    the score matrix never exceeds ASSIGN_BLOCK x nlist.
+    """
+    out = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK):
+        block = vectors[start:start + ASSIGN_BLOCK] @ centroids.T
+        out[start:start + ASSIGN_BLOCK] = np.argmax(block, axis=1)
+    return out
+
+
+def _spherical_kmeans(sample: np.ndarray, nlist: int, n_iter: int, rng) -> np.ndarray:
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = _assign(sample, centroids)
+
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(sample[order], starts, axis=0)
+
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        if empty.any():
+            # re-seed empty cells from random points
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            norms[empty] = np.linalg.norm(sums[empty], axis=1)
+
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms[:, None]).astype(np.float32)
+
+    return centroids
+
+
+# ---------------------------------------------------------
+# IVF (inverted file) index
+# ---------------------------------------------------------
+class IVFIndex:
+    """
+    Inverted-file ANN structure over the rows of a VectorIndex matrix.
+
+    Rows are clustered with spherical k-means; a query probes only the
+    `nprobe` closest cells. Rows appended after training (positions at or
+    beyond `trained_size`) are always scanned, so inserts are visible
+    immediately and a rebuild only needs to happen occasionally.
+
+    The index only proposes candidate positions; scoring is done by the
+    caller against the full-precision matrix.
+    """
+
+    def __init__(
+        self,
+        nlist: int = 0,
+        nprobe: int = 16,
+        train_sample: int = 100000,
+        n_iter: int = 8,
+        seed: int = 0,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_sample = train_sample
+        self.n_iter = n_iter
+        self.seed = seed
+
+        # (centroids, order, offsets, trained_size), swapped atomically
+        self._state = None
+
+    @property
+    def ready(self) -> bool:
+        return self._state is not None
+
+    @property
+    def trained_size(self) -> int:
+        return self._state[3] if self._state else 0
+
+    @property
+    def cells(self) -> int:
+        return self._state[0].shape[0] if self._state else 0
+
+    def build(self, matrix: np.ndarray):
+        """
+        Trains centroids on a sample and assigns every row to a cell.
+        `matrix` must be unit-normalized float32.
+        """
+        started = time.perf_counter()
+        n = matrix.shape[0]
+        rng = np.random.default_rng(self.seed)
+
+        nlist = self.nlist or max(1, int(2 * np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        # ~40 points per centroid is enough to place it
+        sample_size = min(self.train_sample, 40 * nlist)
+        if n > sample_size:
+            sample = matrix[rng.choice(n, sample_size, replace=False)]
+        else:
+            sample = matrix
+
+        centroids = _spherical_kmeans(sample, nlist, self.n_iter, rng)
+        labels = _assign(matrix, centroids)
+
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+
+        self._state = (centroids, order, offsets, n)
+
+        logger.info(
+            "IVF index built: %d rows, %d lists in %.2fs",
+            n, nlist, time.perf_counter() - started,
+        )
+
+    def candidates(self, query: np.ndarray, size: int, nprobe: int = 0) -> np.ndarray:
+        """
+        Matrix positions worth scoring for `query`: members of the closest
+        cells plus every row appended since training.
+        """
+        centroids, order, offsets, trained = self._state
+
+        nprobe = min(nprobe or self.nprobe, centroids.shape[0])
+        cell_scores = centroids @ query
+        if nprobe < centroids.shape[0]:
+            probes = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(centroids.shape[0])
+
+        parts = [order[offsets[c]:offsets[c + 1]] for c in probes]
+        if size > trained:
+            parts.append(np.arange(trained, size, dtype=np.int64))
+
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
@@ -0,0 +1,924 @@
+# services/bulk_service.py
+"""
+Sharded, resumable bulk ingestion on RQ.
+
+A run goes through three kinds of jobs, all on the BULK_QUEUE queue and
+processed by any number of `python worker.py` processes:
+
+    plan_run      reads the uploaded file once and writes its non-empty
+                  titles into row-range shard files of BULK_SHARD_ROWS
+                  rows (JSON lines), then enqueues one job per shard
+    process_shard ingests one shard with process_bulk_chunks(); the
+                  shard's checkpoint (next_row + counters) commits in the
+                  same transaction as the titles it covers
+    (finalize)    run by whichever shard finishes last: repairs primaries
+                  of clusters written concurrently, cleans up the files
+
+A crashed worker leaves its shard "running" with an old heartbeat (a
+crashed planner leaves its run "planning" with an old lease); it is
+reclaimed after BULK_SHARD_STALE_SECONDS by resume_run() (re-uploading
+the same file, POST /bulk-uploads/{id}/resume, or worker.py at startup)
+and continues from its checkpoint instead of restarting.
+Live workers renew their shard's heartbeat on a timer; checkpoints and
+completion only commit while the claim (worker, attempt, next_row) is
+still theirs, so a worker whose shard was taken over rolls back its
+last chunk and stops.
+
+Shards run in parallel, so a shard only sees titles that other shards
+have already committed; the duplicate rules are otherwise those of
+save_title(). The upload dir must be shared by every worker machine.
+
+The Redis connection is injectable (set_redis()), e.g. fakeredis in tests.
+"""
+
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, inspect, or_, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.writer import after_commit, write
+from models.bulk_upload_run import BulkUploadRun
+from models.bulk_upload_shard import BulkUploadShard
+from models.title import Title
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+BULK_QUEUE = os.getenv("BULK_QUEUE", "default")
+
+# Uploaded files and their shard files (shared storage across workers)
+BULK_UPLOAD_DIR = os.getenv("BULK_UPLOAD_DIR", "./temp")
+
+# Title rows per shard (one RQ job each)
+BULK_SHARD_ROWS = int(os.getenv("BULK_SHARD_ROWS", "50000"))
+
+# Rows per checkpoint inside a shard
+BULK_CHECKPOINT_ROWS = int(os.getenv("BULK_CHECKPOINT_ROWS", "1000"))
+
+# A running shard without a checkpoint for this long is considered dead
+BULK_SHARD_STALE_SECONDS = int(os.getenv("BULK_SHARD_STALE_SECONDS", "600"))
+
+# Failed shard attempts before the run is marked failed
+BULK_SHARD_MAX_ATTEMPTS = int(os.getenv("BULK_SHARD_MAX_ATTEMPTS", "3"))
+
+# RQ job timeout per shard / plan job (seconds)
+BULK_JOB_TIMEOUT = int(os.getenv("BULK_JOB_TIMEOUT", "3600"))
+
+ACTIVE_STATUSES = ("queued", "planning", "running")
+
+
+# ---------------------------------------------------------
+# Redis / queue (injectable)
+# ---------------------------------------------------------
+_redis = None
+
+
+def set_redis(connection):
+    """
+    Uses `connection` (e.g. fakeredis.FakeRedis()) for every queue.
+    """
+    global _redis
+    _redis = connection
+
+
+def get_redis():
+    global _redis
+
+    if _redis is None:
+        from redis import Redis
+
+        _redis = Redis.from_url(REDIS_URL)
+    return _redis
+
+
+def get_queue(connection=None):
+    from rq import Queue
+
+    return Queue(BULK_QUEUE, connection=connection or get_redis())
+
+
+def _enqueue(func: str, *args):
+    # job functions live in jobs.py (what worker.py imports)
+    return get_queue().enqueue(func, *args, job_timeout=BULK_JOB_TIMEOUT)
+
+
+# ---------------------------------------------------------
+# Schema
+# ---------------------------------------------------------
+_RUN_COLUMNS = {
+    # pre-existing runs finished synchronously
+    "status": "VARCHAR NOT NULL DEFAULT 'completed'",
+    "file_path": "VARCHAR",
+    "shard_dir": "VARCHAR",
+    "total_rows": "INTEGER",
+    "shard_rows": "INTEGER",
+    "shards_total": "INTEGER DEFAULT 0",
+    "shards_done": "INTEGER DEFAULT 0",
+    "error": "TEXT",
+    "updated_at": "DATETIME",
+    "finished_at": "DATETIME",
+}
+
+
+def ensure_bulk_schema(engine):
+    """
+    Adds the progress columns to bulk_upload_runs tables created before
+    runs were sharded.
+    """
+    columns = {c["name"] for c in inspect(engine).get_columns("bulk_upload_runs")}
+    missing = [(name, ddl) for name, ddl in _RUN_COLUMNS.items() if name not in columns]
+    if not missing:
+        return
+
+    with engine.begin() as conn:
+        for name, ddl in missing:
+            conn.execute(text(f"ALTER TABLE bulk_upload_runs ADD COLUMN {name} {ddl}"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_bulk_upload_runs_status ON bulk_upload_runs (status)"
+        ))
+
+
+# ---------------------------------------------------------
+# Progress
+# ---------------------------------------------------------
+def run_progress(run: BulkUploadRun) -> dict:
+    shards = [
+        {
+            "shard": s.shard_no,
+            "rows": [s.start_row, s.end_row],
+            "next_row": s.next_row,
+            "status": s.status,
+            "attempts": s.attempts,
+            "worker": s.worker,
+            "processed": s.processed,
+            "saved": s.saved,
+            "duplicates": s.duplicates,
+            "error": s.error,
+        }
+        for s in run.shards
+    ]
+    done_rows = sum(s.next_row - s.start_row for s in run.shards)
+
+    return {
+        "id": run.id,
+        "filename": run.filename,
+        "file_hash": run.file_hash,
+        "status": run.status,
+        "total_rows": run.total_rows,
+        "progress": (
+            round(done_rows / run.total_rows, 4) if run.total_rows else
+            (1.0 if run.status == "completed" else 0.0)
+        ),
+        "shards_total": run.shards_total,
+        "shards_done": run.shards_done,
+        "processed": run.processed,
+        "saved": run.saved,
+        "duplicates": run.duplicates,
+        "error": run.error,
+        "created_at": run.created_at,
+        "updated_at": run.updated_at,
+        "finished_at": run.finished_at,
+        "shards": shards,
+    }
+
+
+def _touch_run(db: Session, run_id: int, **values):
+    return db.execute(
+        update(BulkUploadRun)
+        .where(BulkUploadRun.id == run_id)
+        .values(updated_at=datetime.utcnow(), **values)
+    ).rowcount
+
+
+def _write(db: Session, fn):
+    """
+    Runs `fn(session)` through the database writer (see
+    database/writer.py); `db` then reads the committed state.
+    """
+    result = write(db, fn)
+    db.rollback()
+    return result
+
+
+# ---------------------------------------------------------
+# Submission
+# ---------------------------------------------------------
+def find_run(db: Session, file_hash: str):
+    return (
+        db.query(BulkUploadRun)
+        .filter(BulkUploadRun.file_hash == file_hash)
+        .first()
+    )
+
+
+def submit_file(db: Session, file_path: str, filename: str, file_hash: str):
+    """
+    Registers an uploaded file and queues its run.
+
+    Returns (run, created). A file already ingested is not queued again;
+    an unfinished or failed run of the same file is resumed instead.
+    """
+    run = find_run(db, file_hash)
+    if run is not None:
+        return _reuse_run(db, run, file_path), False
+
+    def create(session):
+        run = BulkUploadRun(
+            filename=filename,
+            file_hash=file_hash,
+            file_path=file_path,
+            status="queued",
+            updated_at=datetime.utcnow(),
+        )
+        session.add(run)
+        session.flush()
+        return run.id
+
+    try:
+        run_id = _write(db, create)
+    except IntegrityError:
+        # the same file uploaded concurrently: its run was created
+        # between find_run() and the insert
+        db.rollback()
+        run = find_run(db, file_hash)
+        if run is None:
+            raise
+        return _reuse_run(db, run, file_path), False
+
+    run = db.get(BulkUploadRun, run_id)
+    _dispatch(db, run.id, "jobs.plan_run", run.id)
+    return run, True
+
+
+def _reuse_run(db: Session, run: BulkUploadRun, file_path: str):
+    """
+    Answers an upload of a file that already has a run: drops the upload
+    when it is not needed and resumes an unfinished run.
+    """
+    if run.status == "completed":
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return run
+
+    if file_path != run.file_path:
+        if os.path.exists(run.file_path or ""):
+            os.remove(file_path)
+        else:
+            run_id = run.id
+            _write(db, lambda session: session.execute(
+                update(BulkUploadRun)
+                .where(BulkUploadRun.id == run_id)
+                .values(file_path=file_path)
+            ))
+    resume_run(db, run.id)
+    return db.get(BulkUploadRun, run.id)
+
+
+def _dispatch(db: Session, run_id: int, func: str, *args):
+    """
+    Enqueues a job; without a reachable Redis the run is processed by a
+    background thread of this process instead (still checkpointed, so
+    it stays resumable).
+    """
+    try:
+        _enqueue(func, *args)
+    except Exception as e:
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        if not isinstance(e, RedisConnectionError):
+            raise
+        _start_inline(run_id, e)
+
+
+_inline_runs = set()
+_inline_lock = threading.Lock()
+
+
+def _start_inline(run_id: int, reason):
+    with _inline_lock:
+        if run_id in _inline_runs:
+            return
+        _inline_runs.add(run_id)
+
+    logger.warning("Redis unavailable (%s); processing run %d in-process", reason, run_id)
+
+    def target():
+        from services.profiling_service import profile_job
+
+        try:
+            with profile_job("bulk_run", run_id=run_id):
+                run_inline(run_id)
+        except Exception:
+            logger.exception("Bulk run %d failed", run_id)
+        finally:
+            with _inline_lock:
+                _inline_runs.discard(run_id)
+
+    threading.Thread(target=target, name=f"bulk-run-{run_id}", daemon=True).start()
+
+
+def run_inline(run_id: int):
+    """
+    Plans (if needed) and processes every open shard of a run in the
+    calling thread, one after the other.
+    """
+    with SessionLocal() as db:
+        run = db.get(BulkUploadRun, run_id)
+        if run is None:
+            return
+        if run.status in ("queued", "planning"):
+            plan_run(db, run_id, enqueue=False)
+        shard_nos = [
+            s.shard_no for s in db.query(BulkUploadShard)
+            .filter(BulkUploadShard.run_id == run_id, BulkUploadShard.status != "done")
+            .order_by(BulkUploadShard.shard_no)
+        ]
+
+    for shard_no in shard_nos:
+        with SessionLocal() as db:
+            process_shard(db, run_id, shard_no)
+
+
+# ---------------------------------------------------------
+# Planning
+# ---------------------------------------------------------
+def _shard_path(shard_dir: str, shard_no: int) -> str:
+    return os.path.join(shard_dir, f"shard-{shard_no:05d}.jsonl")
+
+
+class _PlanLeaseLost(Exception):
+    pass
+
+
+def _planning(run_id: int, lease: datetime):
+    """
+    The planner's lease: the run is "planning" and still carries the
+    updated_at this planner wrote (resume_run() re-queues a planner
+    that stops renewing it, and the next claim writes a new one).
+    """
+    return update(BulkUploadRun).where(
+        BulkUploadRun.id == run_id,
+        BulkUploadRun.status == "planning",
+        BulkUploadRun.updated_at == lease,
+    )
+
+
+def plan_run(db: Session, run_id: int, enqueue: bool = True):
+    """
+    Splits the run's file into shard files and shard rows, then queues
+    the shards. Only a queued run is claimed; the planner renews its
+    lease while reading and writes into a directory of its own, so a
+    planner that resume_run() gave up on never touches its successor's
+    shards.
+    """
+    from services.file_reader import iter_title_chunks
+
+    lease = datetime.utcnow()
+    claimed = _write(db, lambda session: session.execute(
+        update(BulkUploadRun)
+        .where(BulkUploadRun.id == run_id, BulkUploadRun.status == "queued")
+        .values(status="planning", updated_at=lease)
+    ).rowcount)
+    if not claimed:
+        return
+
+    run = db.get(BulkUploadRun, run_id)
+    shard_dir = os.path.join(BULK_UPLOAD_DIR, f"run-{run.id}-{lease:%Y%m%d%H%M%S%f}")
+    os.makedirs(shard_dir)
+
+    renewed = time.monotonic()
+
+    def renew():
+        nonlocal lease, renewed
+        now = datetime.utcnow()
+        held = _write(db, lambda session: session.execute(
+            _planning(run_id, lease).values(updated_at=now)
+        ).rowcount)
+        if not held:
+            raise _PlanLeaseLost()
+        lease, renewed = now, time.monotonic()
+
+    try:
+        total, shard_no, out = 0, 0, None
+        for df in iter_title_chunks(run.file_path, filename=run.filename):
+            if time.monotonic() - renewed > BULK_SHARD_STALE_SECONDS / 4:
+                renew()
+            for title in df["title"].dropna().astype(str):
+                if total % BULK_SHARD_ROWS == 0:
+                    if out is not None:
+                        out.close()
+                    out = open(_shard_path(shard_dir, shard_no), "w", encoding="utf-8")
+                    shard_no += 1
+                out.write(json.dumps(title) + "\n")
+                total += 1
+        if out is not None:
+            out.close()
+    except _PlanLeaseLost:
+        if out is not None:
+            out.close()
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        logger.warning("Bulk run %d: planning lease lost, leaving it to the new planner", run_id)
+        return
+    except Exception as e:
+        if out is not None:
+            out.close()
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        _write(db, lambda session: session.execute(
+            _planning(run_id, lease).values(
+                status="failed", error=f"planning: {e}", updated_at=datetime.utcnow(),
+            )
+        ))
+        raise
+
+    def create_shards(session):
+        if not session.execute(_planning(run_id, lease).values(updated_at=datetime.utcnow())).rowcount:
+            return False
+
+        session.query(BulkUploadShard).filter(BulkUploadShard.run_id == run_id).delete()
+        for n in range(shard_no):
+            start = n * BULK_SHARD_ROWS
+            session.add(BulkUploadShard(
+                run_id=run_id,
+                shard_no=n,
+                start_row=start,
+                end_row=min(start + BULK_SHARD_ROWS, total),
+                next_row=start,
+                status="pending",
+            ))
+
+        _touch_run(
+            session, run_id,
+            status="running",
+            shard_dir=shard_dir,
+            total_rows=total,
+            shard_rows=BULK_SHARD_ROWS,
+            shards_total=shard_no,
+            shards_done=0,
+            error=None,
+        )
+        return True
+
+    if not _write(db, create_shards):
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        logger.warning("Bulk run %d: planning lease lost, leaving it to the new planner", run_id)
+        return
+
+    # directories of planners that died or lost their lease
+    prefix = f"run-{run_id}-"
+    for name in os.listdir(BULK_UPLOAD_DIR):
+        path = os.path.join(BULK_UPLOAD_DIR, name)
+        if name.startswith(prefix) and path != shard_dir:
+            shutil.rmtree(path, ignore_errors=True)
+
+    logger.info("Bulk run %d planned: %d rows in %d shards", run_id, total, shard_no)
+
+    if not shard_no:
+        _finalize(db, run_id)
+    elif enqueue:
+        for n in range(shard_no):
+            _dispatch(db, run_id, "jobs.process_shard", run_id, n)
+
+
+# ---------------------------------------------------------
+# Shards
+# ---------------------------------------------------------
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claim_shard(db: Session, run_id: int, shard_no: int):
+    """
+    Atomically takes a pending / failed / stale shard; None when another
+    worker holds it or it is done.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=BULK_SHARD_STALE_SECONDS)
+
+    claimed = _write(db, lambda session: session.execute(
+        update(BulkUploadShard)
+        .where(
+            BulkUploadShard.run_id == run_id,
+            BulkUploadShard.shard_no == shard_no,
+            or_(
+                BulkUploadShard.status.in_(("pending", "failed")),
+                (BulkUploadShard.status == "running")
+                & or_(BulkUploadShard.heartbeat_at.is_(None), BulkUploadShard.heartbeat_at < stale),
+            ),
+        )
+        .values(
+            status="running",
+            worker=_worker_name(),
+            attempts=BulkUploadShard.attempts + 1,
+            heartbeat_at=now,
+            error=None,
+        )
+    ).rowcount)
+
+    if not claimed:
+        return None
+    return (
+        db.query(BulkUploadShard)
+        .filter(BulkUploadShard.run_id == run_id, BulkUploadShard.shard_no == shard_no)
+        .one()
+    )
+
+
+class _ShardLeaseLost(Exception):
+    pass
+
+
+def _owned(shard_id: int, worker: str, attempt: int):
+    """
+    The shard as this claim left it: still running under our worker
+    name and attempt (_claim_shard() bumps attempts on every takeover).
+    """
+    return update(BulkUploadShard).where(
+        BulkUploadShard.id == shard_id,
+        BulkUploadShard.status == "running",
+        BulkUploadShard.worker == worker,
+        BulkUploadShard.attempts == attempt,
+    )
+
+
+def _keep_alive(bind, shard_id: int, worker: str, attempt: int, stop: threading.Event):
+    """
+    Renews the heartbeat of a claimed shard every quarter of
+    BULK_SHARD_STALE_SECONDS until `stop` is set or the shard was taken
+    over, so slow chunks between checkpoints do not look dead.
+    """
+    session = Session(bind=bind)
+    try:
+        while not stop.wait(max(BULK_SHARD_STALE_SECONDS / 4, 1.0)):
+            held = write(session, lambda db: db.execute(
+                _owned(shard_id, worker, attempt).values(heartbeat_at=datetime.utcnow())
+            ).rowcount)
+            if not held:
+                return
+    except Exception:
+        logger.exception("Heartbeat of shard %d failed", shard_id)
+    finally:
+        session.close()
+
+
+def _shard_frames(path: str, skip: int, rows: int):
+    """
+    DataFrames of up to `rows` titles from a shard file, after `skip`.
+    """
+    import pandas as pd
+
+    batch = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            if n < skip:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= rows:
+                yield pd.DataFrame({"title": batch})
+                batch = []
+    if batch:
+        yield pd.DataFrame({"title": batch})
+
+
+def process_shard(db: Session, run_id: int, shard_no: int):
+    """
+    Ingests one shard from its checkpoint. Returns the shard summary,
+    or None when the shard was not claimable.
+    """
+    from services.title_service import process_bulk_chunks
+
+    run = db.get(BulkUploadRun, run_id)
+    if run is None or run.status != "running":
+        return None
+
+    shard = _claim_shard(db, run_id, shard_no)
+    if shard is None:
+        return None
+
+    shard_id, start, resume_at, end = shard.id, shard.start_row, shard.next_row, shard.end_row
+    worker, attempt = shard.worker, shard.attempts
+    path = _shard_path(run.shard_dir, shard_no)
+    timings = {}
+    last = {"processed": 0, "saved": 0, "duplicates": 0}
+    expected = {"next_row": resume_at}
+
+    def checkpoint(session, frames_done, summary):
+        # same transaction as the rows of these frames; a shard taken
+        # over meanwhile rolls the chunk back (its new owner writes it)
+        next_row = min(resume_at + frames_done * BULK_CHECKPOINT_ROWS, end)
+        delta = {k: summary[k] - last[k] for k in last}
+        held = session.execute(
+            _owned(shard_id, worker, attempt)
+            .where(BulkUploadShard.next_row == expected["next_row"])
+            .values(
+                next_row=next_row,
+                processed=BulkUploadShard.processed + delta["processed"],
+                saved=BulkUploadShard.saved + delta["saved"],
+                duplicates=BulkUploadShard.duplicates + delta["duplicates"],
+                heartbeat_at=datetime.utcnow(),
+            )
+        ).rowcount
+        if not held:
+            raise _ShardLeaseLost()
+
+        last.update({k: summary[k] for k in last})
+        expected["next_row"] = next_row
+        _touch_run(
+            session, run_id,
+            processed=BulkUploadRun.processed + delta["processed"],
+            saved=BulkUploadRun.saved + delta["saved"],
+            duplicates=BulkUploadRun.duplicates + delta["duplicates"],
+        )
+
+    def done(session):
+        held = session.execute(
+            _owned(shard_id, worker, attempt)
+            .where(BulkUploadShard.next_row == expected["next_row"])
+            .values(status="done", next_row=end, heartbeat_at=datetime.utcnow())
+        ).rowcount
+        if not held:
+            raise _ShardLeaseLost()
+        _touch_run(session, run_id, shards_done=BulkUploadRun.shards_done + 1)
+
+    stop = threading.Event()
+    threading.Thread(
+        target=_keep_alive,
+        args=(db.get_bind(), shard_id, worker, attempt, stop),
+        name=f"shard-{shard_id}-heartbeat",
+        daemon=True,
+    ).start()
+
+    t0 = time.perf_counter()
+    try:
+        summary = process_bulk_chunks(
+            db,
+            _shard_frames(path, resume_at - start, BULK_CHECKPOINT_ROWS),
+            timings=timings,
+            checkpoint=checkpoint,
+        )
+        _write(db, done)
+    except _ShardLeaseLost:
+        db.rollback()
+        logger.warning(
+            "Bulk run %d shard %d was taken over at row %d; leaving it to its new owner",
+            run_id, shard_no, expected["next_row"],
+        )
+        return None
+    except Exception as e:
+        db.rollback()
+        _fail_shard(db, run_id, shard_id, worker, attempt, e)
+        raise
+    finally:
+        stop.set()
+
+    logger.info(
+        "Bulk run %d shard %d done in %.1fs: %s (stages: %s)",
+        run_id, shard_no, time.perf_counter() - t0, summary,
+        ", ".join(f"{k} {v:.2f}" for k, v in timings.items()),
+    )
+
+    _finalize(db, run_id)
+    return summary
+
+
+def _fail_shard(db: Session, run_id: int, shard_id: int, worker: str, attempt: int, error: Exception):
+    """
+    Records a failed attempt; retries the shard (from its checkpoint)
+    until BULK_SHARD_MAX_ATTEMPTS, then fails the run. A shard another
+    worker took over meanwhile is left alone.
+    """
+    def fail(session):
+        shard = session.get(BulkUploadShard, shard_id)
+        if (shard.status, shard.worker, shard.attempts) != ("running", worker, attempt):
+            return None
+        shard.status = "failed"
+        shard.error = str(error)
+        retry = shard.attempts < BULK_SHARD_MAX_ATTEMPTS
+        if not retry:
+            _touch_run(session, run_id, status="failed", error=f"shard {shard.shard_no}: {error}")
+        return shard.shard_no, shard.attempts, retry
+
+    failed = _write(db, fail)
+    if failed is None:
+        return
+    shard_no, attempts, retry = failed
+
+    logger.error(
+        "Bulk run %d shard %d failed (attempt %d): %s",
+        run_id, shard_no, attempts, error,
+    )
+    if retry:
+        _dispatch(db, run_id, "jobs.process_shard", run_id, shard_no)
+
+
+# ---------------------------------------------------------
+# Completion / resume
+# ---------------------------------------------------------
+def _finalize(db: Session, run_id: int):
+    """
+    Completes the run once every shard is done (exactly one caller wins).
+    """
+    open_shards = (
+        db.query(func.count(BulkUploadShard.id))
+        .filter(BulkUploadShard.run_id == run_id, BulkUploadShard.status != "done")
+        .scalar()
+    )
+    if open_shards:
+        return
+
+    claimed = _write(db, lambda session: session.execute(
+        update(BulkUploadRun)
+        .where(BulkUploadRun.id == run_id, BulkUploadRun.status == "running")
+        .values(status="finalizing", updated_at=datetime.utcnow())
+    ).rowcount)
+    if not claimed:
+        return
+
+    run = db.get(BulkUploadRun, run_id)
+    repaired, flipped = repair_primaries(db, _run_keys(run))
+
+    _write(db, lambda session: _touch_run(
+        session, run_id, status="completed", finished_at=datetime.utcnow(),
+    ))
+    run = db.get(BulkUploadRun, run_id)
+
+    if run.shard_dir:
+        shutil.rmtree(run.shard_dir, ignore_errors=True)
+    if run.file_path and os.path.exists(run.file_path):
+        os.remove(run.file_path)
+
+    logger.info(
+        "Bulk run %d completed: %d processed, %d saved, %d duplicates "
+        "(%d clusters repaired, %d titles re-flagged)",
+        run_id, run.processed, run.saved, run.duplicates, repaired, flipped,
+    )
+
+
+def _run_keys(run: BulkUploadRun):
+    """
+    Yields the cleaned titles of the run's shards, shard by shard. A
+    title only opens a cluster under its own cleaned text, so these are
+    the only clusters the run can have given two primaries.
+    """
+    from utils.text_cleaner import clean_texts
+
+    if not run.shard_dir:
+        return
+    for shard_no in range(run.shards_total or 0):
+        path = _shard_path(run.shard_dir, shard_no)
+        for df in _shard_frames(path, 0, BULK_SHARD_ROWS):
+            yield set(clean_texts(df["title"].tolist()))
+
+
+def repair_primaries(db: Session, normalized_titles):
+    """
+    Re-applies the primary rule to the clusters of `normalized_titles`
+    (an iterable of title sets) that have more than one non-duplicate
+    member (two shards claiming the same new cluster at once). Returns
+    (clusters repaired, net titles flagged as duplicates).
+    """
+    from models.cluster import Cluster
+
+    cluster_ids = []
+    for titles in normalized_titles:
+        titles = list(titles)
+        for start in range(0, len(titles), 500):
+            chunk = titles[start:start + 500]
+            cluster_ids.extend(
+                cluster_id for (cluster_id,) in (
+                    db.query(Title.cluster_id)
+                    .join(Cluster, Cluster.id == Title.cluster_id)
+                    .filter(Cluster.normalized_title.in_(chunk), Title.is_duplicate == 0)
+                    .group_by(Title.cluster_id)
+                    .having(func.count(Title.id) > 1)
+                )
+            )
+        db.rollback()
+
+    if not cluster_ids:
+        return 0, 0
+    return len(cluster_ids), _write(db, lambda session: _repair_primaries(session, cluster_ids))
+
+
+def _repair_primaries(db: Session, cluster_ids):
+    from models.cluster import Cluster
+    from services.cluster_service import enforce_cluster_primary
+    from services.exact_index import exact_index
+
+    flipped = sum(
+        enforce_cluster_primary(db, db.get(Cluster, cluster_id))
+        for cluster_id in cluster_ids
+    )
+    after_commit(db, exact_index.reset)
+    return flipped
+
+
+def resume_run(db: Session, run_id: int) -> bool:
+    """
+    Re-queues whatever a run still needs: planning, or every shard that
+    is pending, failed or stale. Returns False for finished runs.
+    """
+    run = db.get(BulkUploadRun, run_id)
+    if run is None or run.status == "completed":
+        return False
+
+    if run.status == "failed":
+        status = "running" if run.shards_total or run.shard_dir else "queued"
+
+        def reopen(session):
+            session.query(BulkUploadShard).filter(
+                BulkUploadShard.run_id == run_id,
+                BulkUploadShard.status == "failed",
+            ).update({"attempts": 0}, synchronize_session=False)
+            session.execute(
+                update(BulkUploadRun)
+                .where(BulkUploadRun.id == run_id, BulkUploadRun.status == "failed")
+                .values(status=status, error=None)
+            )
+
+        _write(db, reopen)
+        run = db.get(BulkUploadRun, run_id)
+
+    stale = datetime.utcnow() - timedelta(seconds=BULK_SHARD_STALE_SECONDS)
+    abandoned = run.updated_at is None or run.updated_at < stale
+
+    if run.status in ("queued", "planning"):
+        if run.status == "planning":
+            if not abandoned:
+                return True
+            # the planner died (stopped renewing its lease); the next
+            # claim starts over in a fresh directory
+            _write(db, lambda session: session.execute(
+                update(BulkUploadRun)
+                .where(
+                    BulkUploadRun.id == run_id,
+                    BulkUploadRun.status == "planning",
+                    or_(BulkUploadRun.updated_at.is_(None), BulkUploadRun.updated_at < stale),
+                )
+                .values(status="queued", updated_at=datetime.utcnow())
+            ))
+        _dispatch(db, run_id, "jobs.plan_run", run_id)
+        return True
+
+    if run.status == "finalizing":
+        if not abandoned:
+            return True
+        _write(db, lambda session: _touch_run(session, run_id, status="running"))
+
+    shard_nos = [
+        s.shard_no for s in db.query(BulkUploadShard).filter(
+            BulkUploadShard.run_id == run_id,
+            or_(
+                BulkUploadShard.status.in_(("pending", "failed")),
+                (BulkUploadShard.status == "running")
+                & or_(BulkUploadShard.heartbeat_at.is_(None), BulkUploadShard.heartbeat_at < stale),
+            ),
+        )
+    ]
+
+    for shard_no in shard_nos:
+        _dispatch(db, run_id, "jobs.process_shard", run_id, shard_no)
+    if not shard_nos:
+        _finalize(db, run_id)
+
+    logger.info("Bulk run %d resumed: %d shards queued", run_id, len(shard_nos))
+    return True
+
+
+def resume_stale_runs(db: Session) -> int:
+    """
+    Resumes every unfinished run (worker.py calls this at startup; jobs
+    of shards still held by live workers are dropped by the claim).
+    """
+    run_ids = [
+        run_id for (run_id,) in db.query(BulkUploadRun.id)
+        .filter(BulkUploadRun.status.in_(ACTIVE_STATUSES + ("finalizing",)))
+    ]
+    for run_id in run_ids:
+        resume_run(db, run_id)
+    return len(run_ids)
+
+
+if __name__ == "__main__":
+    # python -m services.bulk_service resume [run_id]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk upload runs")
+    parser.add_argument("command", choices=["resume"])
+    parser.add_argument("run_id", type=int, nargs="?")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        if args.run_id is None:
+            print(f"Resumed {resume_stale_runs(session)} runs")
+        else:
+            print(resume_run(session, args.run_id))
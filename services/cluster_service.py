@@ -0,0 +1,265 @@
+# services/cluster_service.py
+
+import logging
+
+import numpy as np
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.writer import after_commit, write
+from models.cluster import Cluster
+from models.title import Title
+from services.metrics import STAGE_SECONDS
+from services.stats_service import rebuild_stats, record_duplicate_delta
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------
+# Lookup / creation
+# ---------------------------------------------------------
+def _insert_ignore(db: Session, rows):
+    """
+    INSERT ... ON CONFLICT DO NOTHING on clusters.normalized_title, so
+    concurrent writers creating the same cluster never collide.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    db.execute(
+        insert(Cluster).on_conflict_do_nothing(index_elements=["normalized_title"]),
+        rows,
+    )
+
+
+def get_or_create_clusters(db: Session, normalized_titles):
+    """
+    Returns {normalized_title: Cluster} for every requested title,
+    creating empty clusters (no primary yet) where missing.
+    """
+    wanted = list(dict.fromkeys(normalized_titles))
+    found = {}
+
+    for start in range(0, len(wanted), 500):
+        chunk = wanted[start:start + 500]
+        found.update(
+            (c.normalized_title, c)
+            for c in db.query(Cluster).filter(Cluster.normalized_title.in_(chunk))
+        )
+
+    missing = [n for n in wanted if n not in found]
+    if missing:
+        _insert_ignore(db, [{"normalized_title": n, "member_count": 0} for n in missing])
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            found.update(
+                (c.normalized_title, c)
+                for c in db.query(Cluster).filter(Cluster.normalized_title.in_(chunk))
+            )
+
+    return found
+
+
+def get_cluster(db: Session, normalized_title: str):
+    return (
+        db.query(Cluster)
+        .filter(Cluster.normalized_title == normalized_title)
+        .first()
+    )
+
+
+# ---------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------
+def add_members(db: Session, clusters, normalized, ids, unit_vecs):
+    """
+    Records freshly inserted titles on their clusters: bumps
+    member_count, folds the unit vectors into the running centroid and
+    claims the primary for clusters that had none (first member wins).
+    Does not commit.
+    """
+    groups = {}
+    for n, norm in enumerate(normalized):
+        groups.setdefault(norm, []).append(n)
+
+    for norm, rows in groups.items():
+        cluster = clusters[norm]
+        count = cluster.member_count or 0
+        batch = unit_vecs[rows].sum(axis=0)
+
+        old = None
+        if cluster.centroid:
+            old = np.frombuffer(cluster.centroid, dtype=np.float32)
+        if old is not None and old.shape == batch.shape:
+            centroid = (old * count + batch) / (count + len(rows))
+        else:
+            centroid = batch / len(rows)
+
+        cluster.centroid = centroid.astype(np.float32).tobytes()
+        cluster.member_count = Cluster.member_count + len(rows)
+        if cluster.primary_id is None:
+            cluster.primary_id = ids[rows[0]]
+
+    db.flush()
+
+
+def enforce_cluster_primary(db: Session, cluster: Cluster):
+    """
+    Repairs duplicate flags of one cluster: primary_id is unique,
+    every other member is a duplicate. Touches only rows that are wrong
+    and keeps the stats counters in step. Returns the net number of
+    titles flagged as duplicates.
+    """
+    if cluster.primary_id is None:
+        return 0
+
+    with STAGE_SECONDS.time("enforce_single_primary"):
+        unflagged = db.query(Title).filter(
+            Title.cluster_id == cluster.id,
+            Title.id == cluster.primary_id,
+            Title.is_duplicate != 0,
+        ).update({"is_duplicate": 0}, synchronize_session=False)
+
+        flagged = db.query(Title).filter(
+            Title.cluster_id == cluster.id,
+            Title.id != cluster.primary_id,
+            Title.is_duplicate != 1,
+        ).update({"is_duplicate": 1}, synchronize_session=False)
+
+    record_duplicate_delta(db, flagged - unflagged)
+    return flagged - unflagged
+
+
+# ---------------------------------------------------------
+# Full rebuild / migration
+# ---------------------------------------------------------
+def rebuild_clusters(db: Session, batch_size: int = 10000):
+    """
+    Re-derives every cluster from titles.normalized_title: membership,
+    counts, oldest primary, duplicate flags and centroids. Runs as one
+    job of the database writer.
+    """
+    write(db, lambda session: _rebuild_clusters(session, batch_size))
+    db.rollback()
+    logger.info("Clusters rebuilt: %d", db.query(Cluster).count())
+
+
+def _rebuild_clusters(db: Session, batch_size: int):
+    from services.exact_index import exact_index
+
+    db.execute(text("DELETE FROM clusters"))
+    db.execute(text(
+        "INSERT INTO clusters (normalized_title, member_count, created_at) "
+        "SELECT normalized_title, COUNT(*), MIN(created_at) "
+        "FROM titles GROUP BY normalized_title"
+    ))
+    db.execute(text(
+        "UPDATE titles SET cluster_id = ("
+        " SELECT c.id FROM clusters c"
+        " WHERE c.normalized_title = titles.normalized_title)"
+    ))
+    db.execute(text(
+        "UPDATE clusters SET primary_id = ("
+        " SELECT t.id FROM titles t WHERE t.cluster_id = clusters.id"
+        " ORDER BY t.created_at ASC, t.id ASC LIMIT 1)"
+    ))
+    db.execute(text(
+        "UPDATE titles SET is_duplicate = CASE WHEN id = ("
+        " SELECT c.primary_id FROM clusters c WHERE c.id = titles.cluster_id)"
+        " THEN 0 ELSE 1 END"
+    ))
+
+    # centroids: stream members cluster by cluster
+    from services.vector_index import load_vectors
+
+    rows = (
+        db.query(Title.cluster_id, Title.id)
+        .order_by(Title.cluster_id.asc(), Title.id.asc())
+        .yield_per(batch_size)
+    )
+
+    updates = []
+    centroids = {}
+
+    def flush_batch(batch):
+        # batch: [(cluster_id, title_id)] in cluster order
+        vecs = load_vectors(db, [title_id for _, title_id in batch])
+        for cluster_id, title_id in batch:
+            unit = vecs.get(title_id)
+            total, count = centroids.get(cluster_id, (None, 0))
+            if unit is None or (total is not None and unit.shape != total.shape):
+                continue
+            centroids[cluster_id] = (unit.copy() if total is None else total + unit, count + 1)
+
+        # every cluster but the last one in the batch is complete
+        last = batch[-1][0]
+        for cluster_id in [c for c in centroids if c != last]:
+            total, count = centroids.pop(cluster_id)
+            updates.append({
+                "id": cluster_id,
+                "centroid": (total / count).astype(np.float32).tobytes(),
+            })
+
+    batch = []
+    for cluster_id, title_id in rows:
+        batch.append((cluster_id, title_id))
+        if len(batch) >= batch_size:
+            flush_batch(batch)
+            batch = []
+
+        if len(updates) >= batch_size:
+            db.execute(
+                text("UPDATE clusters SET centroid = :centroid WHERE id = :id"),
+                updates,
+            )
+            updates = []
+
+    if batch:
+        flush_batch(batch)
+    for cluster_id, (total, count) in centroids.items():
+        updates.append({
+            "id": cluster_id,
+            "centroid": (total / count).astype(np.float32).tobytes(),
+        })
+    if updates:
+        db.execute(
+            text("UPDATE clusters SET centroid = :centroid WHERE id = :id"),
+            updates,
+        )
+
+    # cluster ids were reassigned
+    after_commit(db, exact_index.reset)
+
+    # duplicate flags were re-derived above (same transaction)
+    rebuild_stats(db)
+
+
+def ensure_cluster_schema(engine):
+    """
+    Adds titles.cluster_id to databases created before clusters existed
+    and backfills clusters for any unassigned titles.
+    """
+    columns = {c["name"] for c in inspect(engine).get_columns("titles")}
+    if "cluster_id" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE titles ADD COLUMN cluster_id INTEGER REFERENCES clusters(id)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_titles_cluster_id ON titles (cluster_id)"
+            ))
+
+    with Session(engine) as db:
+        if db.query(Title.id).filter(Title.cluster_id.is_(None)).first():
+            logger.info("Backfilling clusters for existing titles")
+            rebuild_clusters(db)
+
+
+if __name__ == "__main__":
+    # python -m services.cluster_service
+    with SessionLocal() as session:
+        rebuild_clusters(session)
@@ -0,0 +1,186 @@
+# services/embedding_cache.py
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model key, sha256 of cleaned text).
+
+    Tier 1: bounded in-process LRU.
+    Tier 2: SQLite table that survives restarts and is shared by every
+            process pointing at the same file.
+
+    Rows for models other than `valid_models` are purged when the store is
+    opened, so switching the model or USE_OPENAI never serves stale vectors.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int, valid_models: Iterable[str]):
+        self.path = path
+        self.max_entries = max_entries
+        self.valid_models = tuple(valid_models)
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._opened = False
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # -----------------------------
+    # SQLite tier
+    # -----------------------------
+    def _db(self):
+        if self._opened:
+            return self._conn
+
+        self._opened = True
+        if not self.path:
+            return None
+
+        try:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                " model TEXT NOT NULL,"
+                " text_sha TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_sha)"
+                ") WITHOUT ROWID"
+            )
+
+            placeholders = ",".join("?" * len(self.valid_models))
+            purged = conn.execute(
+                f"DELETE FROM embedding_cache WHERE model NOT IN ({placeholders})",
+                self.valid_models,
+            ).rowcount
+            conn.commit()
+
+            if purged:
+                logger.info("Embedding cache: purged %d stale vectors", purged)
+
+            self._conn = conn
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache disabled (SQLite error: %s)", e)
+
+        return self._conn
+
+    def _disk_get(self, model: str, shas: List[str]) -> Dict[str, np.ndarray]:
+        conn = self._db()
+        if conn is None or not shas:
+            return {}
+
+        found = {}
+        for start in range(0, len(shas), 500):
+            chunk = shas[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                "SELECT text_sha, vector FROM embedding_cache"
+                f" WHERE model = ? AND text_sha IN ({placeholders})",
+                [model, *chunk],
+            ).fetchall()
+            for sha, blob in rows:
+                found[sha] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _disk_put(self, model: str, items: Dict[str, np.ndarray]):
+        conn = self._db()
+        if conn is None or not items:
+            return
+
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model, text_sha, vector)"
+                " VALUES (?, ?, ?)",
+                [(model, sha, vec.tobytes()) for sha, vec in items.items()],
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache write failed: %s", e)
+
+    # -----------------------------
+    # LRU tier
+    # -----------------------------
+    def _lru_put(self, model: str, sha: str, vec: np.ndarray):
+        key = (model, sha)
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Cached vectors for `texts` (None where missing), in input order.
+        """
+        shas = [text_key(t) for t in texts]
+        out = [None] * len(texts)
+        missing = []
+
+        with self._lock:
+            for n, sha in enumerate(shas):
+                vec = self._lru.get((model, sha))
+                if vec is not None:
+                    self._lru.move_to_end((model, sha))
+                    out[n] = vec
+                    self.memory_hits += 1
+                else:
+                    missing.append(n)
+
+            if missing:
+                found = self._disk_get(model, list({shas[n] for n in missing}))
+                for n in missing:
+                    vec = found.get(shas[n])
+                    if vec is not None:
+                        out[n] = vec
+                        self._lru_put(model, shas[n], vec)
+                        self.disk_hits += 1
+                    else:
+                        self.misses += 1
+
+        return out
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], vecs):
+        items = {}
+        for text, vec in zip(texts, vecs):
+            items[text_key(text)] = np.asarray(vec, dtype=np.float32)
+
+        with self._lock:
+            for sha, vec in items.items():
+                self._lru_put(model, sha, vec)
+            self._disk_put(model, items)
+
+    def put(self, model: str, text: str, vec):
+        self.put_many(model, [text], [vec])
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,193 @@
+# services/embedding_pool.py
+"""
+Multi-process MiniLM encoding for bulk ingestion.
+
+EMBED_WORKERS processes each load the model once (torch / onnxruntime
+pinned to EMBED_WORKER_THREADS intra-op threads) and encode contiguous
+shards of a batch. Vectors come back through one shared-memory float32
+block the parent allocates per batch, so nothing is pickled but the
+input strings.
+"""
+
+import atexit
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 0 -> encode in-process (no pool)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+
+# intra-op threads per worker (0 -> cpu_count // EMBED_WORKERS)
+EMBED_WORKER_THREADS = int(os.getenv("EMBED_WORKER_THREADS", "0"))
+
+# batches smaller than this are not worth the IPC round trip
+EMBED_POOL_MIN_BATCH = int(os.getenv("EMBED_POOL_MIN_BATCH", "256"))
+
+
+# ---------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------
+_worker_model = None
+
+
+def _init_worker(threads: int):
+    global _worker_model
+
+    # must be set before torch / onnxruntime are imported
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "ONNX_THREADS"):
+        os.environ[var] = str(threads)
+
+    from services import embedding_service
+
+    _worker_model = embedding_service.get_minilm_model()
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _attach(name: str) -> SharedMemory:
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: spawned workers share the parent's resource
+        # tracker, so the extra registration is released by its unlink()
+        return SharedMemory(name=name)
+
+
+def _probe_dim() -> int:
+    return int(np.asarray(_worker_model.encode(["probe"], convert_to_numpy=True)).shape[-1])
+
+
+def _encode_shard(name: str, rows: int, dim: int, start: int, texts: List[str], batch_size: int):
+    emb = _worker_model.encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+
+    shm = _attach(name)
+    try:
+        out = np.ndarray((rows, dim), dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(texts)] = emb
+        del out
+    finally:
+        shm.close()
+
+    return len(texts)
+
+
+# ---------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------
+class EmbeddingPool:
+    """
+    Lazily started pool of encoder processes (spawned, so no torch state
+    is inherited through fork).
+    """
+
+    def __init__(self, workers: int, threads: int = 0):
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self._executor = None
+        self._dim = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.threads,),
+            )
+            # one probe per worker starts every process (the initializer
+            # loads the model) before the first real batch
+            dims = [executor.submit(_probe_dim) for _ in range(self.workers)]
+            self._dim = dims[0].result()
+            for f in dims[1:]:
+                f.result()
+
+            self._executor = executor
+            logger.info(
+                "Embedding pool started: %d workers x %d threads (dim %d)",
+                self.workers, self.threads, self._dim,
+            )
+
+    def encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """
+        Float32 (len(texts), dim) matrix in input order.
+        """
+        self._start()
+
+        rows, dim = len(texts), self._dim
+        if not rows:
+            return np.empty((0, dim), dtype=np.float32)
+
+        # length-sorted shards: every worker pads to similar lengths
+        order = sorted(range(rows), key=lambda i: len(texts[i]))
+        ordered = [texts[i] for i in order]
+        shard = max(batch_size, math.ceil(rows / self.workers))
+
+        shm = SharedMemory(create=True, size=rows * dim * 4)
+        try:
+            futures = [
+                self._executor.submit(
+                    _encode_shard, shm.name, rows, dim, start,
+                    ordered[start:start + shard], batch_size,
+                )
+                for start in range(0, rows, shard)
+            ]
+            for f in futures:
+                f.result()
+
+            encoded = np.ndarray((rows, dim), dtype=np.float32, buffer=shm.buf)
+            out = np.empty((rows, dim), dtype=np.float32)
+            out[order] = encoded
+            del encoded
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return out
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_embedding_pool():
+    """
+    The process-wide pool, or None when EMBED_WORKERS is 0.
+    """
+    global _pool
+
+    if EMBED_WORKERS <= 0:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = EmbeddingPool(EMBED_WORKERS, EMBED_WORKER_THREADS)
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -6,11 +6,14 @@ BASE_DIR = Path(__file__).resolve().parents[1]
 load_dotenv(BASE_DIR / ".env")
 
 import os
+import asyncio
 import logging
+import time
 from typing import List
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from services.embedding_cache import EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,34 @@ logger = logging.getLogger(__name__)
 USE_OPENAI = os.getenv("USE_OPENAI", "false").lower() == "true"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Texts per SentenceTransformer forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Inputs per OpenAI embeddings request (API limit is 2048)
+OPENAI_EMBED_CHUNK = int(os.getenv("OPENAI_EMBED_CHUNK", "512"))
+
+MINILM_MODEL_NAME = "all-MiniLM-L6-v2"
+OPENAI_MODEL_NAME = "text-embedding-3-small"
+
+# MiniLM runtime: torch (sentence-transformers), onnx or onnx-int8
+# (onnxruntime, exported on first use; see services/onnx_embedder.py)
+MINILM_BACKEND = os.getenv("MINILM_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", str(BASE_DIR / "onnx_models" / MINILM_MODEL_NAME))
+
+# Embedding cache (set EMBEDDING_CACHE_PATH="" to keep it memory-only)
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true").lower() == "true"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "50000"))
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", str(BASE_DIR / "embedding_cache.db")
+)
+
+# Request coalescing for the async API routes: concurrent single-title
+# requests are gathered for up to EMBED_COALESCE_WAIT_MS (or until
+# EMBED_COALESCE_MAX_BATCH texts) and encoded in one batch
+EMBED_COALESCE_MAX_BATCH = int(os.getenv("EMBED_COALESCE_MAX_BATCH", "32"))
+EMBED_COALESCE_WAIT_MS = float(os.getenv("EMBED_COALESCE_WAIT_MS", "5"))
+EMBED_COALESCE_QUEUE_DEPTH = int(os.getenv("EMBED_COALESCE_QUEUE_DEPTH", "1024"))
+
 # ==========================================================
 # MiniLM (default, CPU-only, deterministic)
 # ==========================================================
@@ -31,10 +62,21 @@ def get_minilm_model():
     global _minilm_model
 
     if _minilm_model is None:
-        _minilm_model = SentenceTransformer(
-            "all-MiniLM-L6-v2",
-            device="cpu"
-        )
+        if MINILM_BACKEND in ("onnx", "onnx-int8"):
+            from services.onnx_embedder import load_onnx_embedder
+
+            _minilm_model = load_onnx_embedder(
+                MINILM_MODEL_NAME,
+                ONNX_MODEL_DIR,
+                quantized=MINILM_BACKEND == "onnx-int8",
+            )
+        else:
+            from sentence_transformers import SentenceTransformer
+
+            _minilm_model = SentenceTransformer(
+                MINILM_MODEL_NAME,
+                device="cpu"
+            )
 
     return _minilm_model
 
@@ -51,6 +93,37 @@ def get_minilm_embedding(text: str) -> List[float]:
 
     return emb.tolist()
 
+
+def get_minilm_embeddings(texts: List[str]) -> np.ndarray:
+    # large (bulk) batches are sharded across the encoder processes
+    from services.embedding_pool import EMBED_POOL_MIN_BATCH, get_embedding_pool
+
+    pool = get_embedding_pool()
+    if pool is not None and len(texts) >= EMBED_POOL_MIN_BATCH:
+        return pool.encode(texts, EMBED_BATCH_SIZE)
+
+    model = get_minilm_model()
+
+    # Encode in length order so each batch pads to similar lengths
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    emb = model.encode(
+        [texts[i] for i in order],
+        batch_size=EMBED_BATCH_SIZE,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+
+    out = np.empty_like(emb, dtype=np.float32)
+    out[order] = emb
+    return out
+
+def warm_minilm_model():
+    """
+    Loads MiniLM and runs one throwaway encode so the first request does
+    not pay for model load / graph initialisation.
+    """
+    get_minilm_embeddings(["warmup"])
+
 # ==========================================================
 # OpenAI (optional, guarded)
 # ==========================================================
@@ -74,31 +147,292 @@ def get_openai_embedding(text: str) -> List[float]:
     client = get_openai_client()
 
     response = client.embeddings.create(
-        model="text-embedding-3-small",
+        model=OPENAI_MODEL_NAME,
         input=text
     )
 
     return response.data[0].embedding
 
+
+def get_openai_embeddings(texts: List[str]) -> np.ndarray:
+    client = get_openai_client()
+    rows = []
+
+    for start in range(0, len(texts), OPENAI_EMBED_CHUNK):
+        response = client.embeddings.create(
+            model=OPENAI_MODEL_NAME,
+            input=texts[start:start + OPENAI_EMBED_CHUNK]
+        )
+        # API returns items tagged with their input index
+        chunk = sorted(response.data, key=lambda d: d.index)
+        rows.extend(d.embedding for d in chunk)
+
+    return np.asarray(rows, dtype=np.float32)
+
+# ==========================================================
+# Cache
+# ==========================================================
+
+# ONNX vectors drift slightly from PyTorch ones, so each runtime gets
+# its own key and switching MINILM_BACKEND never mixes them
+MINILM_KEY = (
+    f"minilm:{MINILM_MODEL_NAME}" if MINILM_BACKEND == "torch"
+    else f"minilm-{MINILM_BACKEND}:{MINILM_MODEL_NAME}"
+)
+OPENAI_KEY = f"openai:{OPENAI_MODEL_NAME}"
+
+# Vectors are cached under the model that actually produced them, so an
+# OpenAI fallback to MiniLM never poisons the OpenAI entries.
+_cache = EmbeddingCache(
+    path=EMBEDDING_CACHE_PATH or None,
+    max_entries=EMBEDDING_CACHE_SIZE,
+    valid_models=(OPENAI_KEY, MINILM_KEY) if USE_OPENAI else (MINILM_KEY,),
+)
+
+
+def embedding_cache_stats() -> dict:
+    return _cache.stats()
+
 # ==========================================================
 # Unified public API
 # ==========================================================
 
+def _embed_uncached(text: str):
+    if USE_OPENAI:
+        try:
+            return OPENAI_KEY, get_openai_embedding(text)
+        except Exception as e:
+            logger.warning(
+                "OpenAI embedding failed, falling back to MiniLM: %s",
+                str(e)
+            )
+
+    return MINILM_KEY, get_minilm_embedding(text)
+
+
+def _embed_many_uncached(texts: List[str]):
+    if USE_OPENAI:
+        try:
+            return OPENAI_KEY, get_openai_embeddings(texts)
+        except Exception as e:
+            logger.warning(
+                "OpenAI batch embedding failed, falling back to MiniLM: %s",
+                str(e)
+            )
+
+    return MINILM_KEY, get_minilm_embeddings(texts)
+
+
 def get_embedding(text: str) -> List[float]:
     """
     Returns an embedding for the given text.
 
     Default: MiniLM
     Optional: OpenAI (only if USE_OPENAI=true)
+    Served from the embedding cache when the text was seen before.
     """
 
-    if USE_OPENAI:
-        try:
-            return get_openai_embedding(text)
-        except Exception as e:
-            logger.warning(
-                "OpenAI embedding failed, falling back to MiniLM: %s",
-                str(e)
+    if not EMBEDDING_CACHE:
+        return _embed_uncached(text)[1]
+
+    preferred = OPENAI_KEY if USE_OPENAI else MINILM_KEY
+    cached = _cache.get(preferred, text)
+    if cached is not None:
+        return cached.tolist()
+
+    model_key, emb = _embed_uncached(text)
+    _cache.put(model_key, text, emb)
+    return emb
+
+
+def get_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Batch version of get_embedding().
+    Returns a float32 matrix with one row per input text, in input order.
+    Only cache misses (deduplicated) reach the model.
+    """
+
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    if not EMBEDDING_CACHE:
+        return _embed_many_uncached(texts)[1]
+
+    preferred = OPENAI_KEY if USE_OPENAI else MINILM_KEY
+    rows = _cache.get_many(preferred, texts)
+
+    missing = list(dict.fromkeys(t for t, r in zip(texts, rows) if r is None))
+    if missing:
+        model_key, fresh = _embed_many_uncached(missing)
+        _cache.put_many(model_key, missing, fresh)
+        by_text = dict(zip(missing, fresh))
+
+        if model_key != preferred:
+            # OpenAI failed: the hits are OpenAI vectors (another
+            # dimension), so the whole batch comes from the fallback
+            # model, its own cache entries first
+            rows = _cache.get_many(model_key, texts)
+            rest = list(dict.fromkeys(
+                t for t, r in zip(texts, rows) if r is None and t not in by_text
+            ))
+            if rest:
+                extra = get_minilm_embeddings(rest)
+                _cache.put_many(model_key, rest, extra)
+                by_text.update(zip(rest, extra))
+
+        rows = [by_text[t] if t in by_text else r for t, r in zip(texts, rows)]
+
+    return np.vstack(rows).astype(np.float32, copy=False)
+
+
+# ==========================================================
+# Request coalescer (async callers)
+# ==========================================================
+
+class EmbeddingQueueFull(Exception):
+    """Raised when the coalescer already holds `max_queue` pending texts."""
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent embed requests.
+
+    Callers await embed(); a single worker task per event loop takes the
+    first queued text, keeps collecting for up to `max_wait_ms` or
+    `max_batch` texts, runs one get_embeddings() call in a worker thread
+    and resolves every caller's future. Requests arriving while a batch
+    is encoding form the next batch.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = EMBED_COALESCE_MAX_BATCH,
+        max_wait_ms: float = EMBED_COALESCE_WAIT_MS,
+        max_queue: int = EMBED_COALESCE_QUEUE_DEPTH,
+    ):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max_queue
+
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+        self.requests = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+        self.largest_batch = 0
+        self.queue_wait_total = 0.0
+        self.encode_time_total = 0.0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> np.ndarray:
+        self._ensure_worker()
+
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise EmbeddingQueueFull(
+                f"Embedding queue is full ({self.max_queue} pending)"
             )
 
-    return get_minilm_embedding(text)
+        future = self._loop.create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        self.requests += 1
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+
+            # drop callers that gave up while queued
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.queue_wait_total += sum(started - queued for _, _, queued in batch)
+
+            try:
+                vecs = await asyncio.to_thread(
+                    get_embeddings, [text for text, _, _ in batch]
+                )
+            except Exception as e:
+                self.errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.encode_time_total += time.perf_counter() - started
+
+            for (_, future, _), vec in zip(batch, vecs):
+                if not future.done():
+                    future.set_result(vec)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "requests": self.requests,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "largest_batch": self.largest_batch,
+            "avg_batch_size": (
+                round(self.requests / self.batches, 2) if self.batches else 0.0
+            ),
+            "avg_queue_wait_ms": (
+                round(self.queue_wait_total / self.requests * 1000.0, 3)
+                if self.requests else 0.0
+            ),
+            "avg_encode_ms": (
+                round(self.encode_time_total / self.batches * 1000.0, 3)
+                if self.batches else 0.0
+            ),
+        }
+
+
+_batcher = EmbeddingBatcher()
+
+
+async def embed_async(text: str) -> np.ndarray:
+    """
+    Coalesced embedding for async handlers (float32 vector).
+    Raises EmbeddingQueueFull when the queue is saturated.
+    """
+    return await _batcher.embed(text)
+
+
+def embedding_batcher_stats() -> dict:
+    return _batcher.stats()
@@ -0,0 +1,89 @@
+# services/exact_index.py
+
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+
+from models.cluster import Cluster
+
+logger = logging.getLogger(__name__)
+
+LOAD_BATCH_SIZE = 10000
+
+
+class ExactIndex:
+    """
+    Process-resident map of cluster key (normalized_title) -> primary
+    title id.
+
+    A submitted title that cleans to an existing key is, by construction,
+    the same text the cluster's primary was embedded from, so it can be
+    answered with score 1.0 without running the model.
+    Mirrors VectorIndex: full load once, then only clusters created since
+    the last seen id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._primary = {}
+        self._watermark = 0
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._primary)
+
+    def get(self, normalized: str):
+        return self._primary.get(normalized)
+
+    def add(self, normalized, ids, flags):
+        """
+        Records the primaries created by insert_titles() (flag 0 rows).
+        """
+        with self._lock:
+            for norm, row_id, flag in zip(normalized, ids, flags):
+                if flag == 0:
+                    self._primary.setdefault(norm, int(row_id))
+
+    def discard(self, normalized: str):
+        with self._lock:
+            self._primary.pop(normalized, None)
+
+    def reset(self):
+        """
+        Forgets everything; the next refresh() reloads from clusters
+        (needed after a cluster rebuild renumbers them).
+        """
+        with self._lock:
+            self._primary = {}
+            self._watermark = 0
+            self._loaded = False
+
+    def refresh(self, db: Session):
+        with self._lock:
+            query = (
+                db.query(Cluster.id, Cluster.normalized_title, Cluster.primary_id)
+                .filter(Cluster.id > self._watermark)
+                .order_by(Cluster.id.asc())
+            )
+
+            for cluster_id, norm, primary_id in query.yield_per(LOAD_BATCH_SIZE):
+                self._watermark = cluster_id
+                if primary_id is not None:
+                    self._primary[norm] = primary_id
+
+            if not self._loaded:
+                self._loaded = True
+                logger.info("Exact-match index built: %d keys", len(self._primary))
+
+
+# Shared per-process instance
+exact_index = ExactIndex()
+
+
+def get_exact_index(db: Session) -> ExactIndex:
+    """
+    Returns the process map, caught up with clusters created elsewhere.
+    """
+    exact_index.refresh(db)
+    return exact_index
@@ -1,23 +1,78 @@
 # services/excel_deduper.py
 
+import numpy as np
 import pandas as pd
-import re
-from utils.text_cleaner import clean_text
+from utils.normalization import IGNORE_NUMBERS, normalize_series
 
+# Tile edge for the blocked similarity matmul (BLOCK x BLOCK floats live)
+SEMANTIC_BLOCK_SIZE = 2048
 
-def _remove_numbers(text: str) -> str:
+
+def _hook_and_compress(parent: np.ndarray, a: np.ndarray, b: np.ndarray):
+    """
+    Vectorized union-find: links every edge (a, b) so both ends share the
+    smallest root, then flattens the forest. Roots are always the lowest
+    index, i.e. the first occurrence in the file.
     """
-    Removes standalone numbers from text.
-    Example:
-      'sample title number 123' -> 'sample title number'
+    while True:
+        ra, rb = parent[a], parent[b]
+        lo = np.minimum(ra, rb)
+        before = parent.copy()
+
+        np.minimum.at(parent, ra, lo)
+        np.minimum.at(parent, rb, lo)
+
+        # pointer jumping until every node points at its root
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent[:] = jumped
+
+        if np.array_equal(before, parent):
+            return parent
+
+
+def _semantic_groups(texts, threshold: float, block_size: int) -> np.ndarray:
     """
-    return re.sub(r"\b\d+\b", "", text).strip()
+    Returns, for each text, the index of the first text in its group of
+    semantic near-duplicates (cosine >= threshold).
+
+    Pairs are found with a blocked upper-triangular matmul so memory stays
+    at block_size^2 scores regardless of the row count.
+    """
+    from services.embedding_service import get_embeddings
+    from services.vector_store import normalize_rows
+
+    n = len(texts)
+    parent = np.arange(n)
+    if n < 2:
+        return parent
+
+    vecs = normalize_rows(get_embeddings(texts))
+
+    for i in range(0, n, block_size):
+        left = vecs[i:i + block_size]
+
+        for j in range(i, n, block_size):
+            sims = left @ vecs[j:j + block_size].T
+            if i == j:
+                sims = np.triu(sims, k=1)
+
+            a, b = np.nonzero(sims >= threshold)
+            if a.size:
+                _hook_and_compress(parent, a + i, b + j)
+
+    return parent
 
 
 def dedupe_excel(
     df: pd.DataFrame,
     column: str = "title",
     ignore_numbers: bool = True,
+    semantic: bool = False,
+    threshold: float = 0.85,
+    block_size: int = SEMANTIC_BLOCK_SIZE,
 ):
     """
     Deterministic Excel deduper.
@@ -28,6 +83,11 @@ def dedupe_excel(
     - ignore_numbers:
         True  -> 'Title 1', 'Title 2' are duplicates
         False -> treated as unique
+    - semantic:
+        True  -> also merge rows whose normalized titles have embedding
+                 cosine similarity >= threshold
+    - threshold: cosine cut-off for semantic mode
+    - block_size: tile size of the semantic similarity matmul
 
     Returns:
     - unique_df: DataFrame with only unique rows
@@ -44,18 +104,15 @@ def dedupe_excel(
     df[column] = df[column].astype(str)
 
     # -------------------------------------------------
-    # Step 1: normalize text (lowercase, punctuation)
-    # -------------------------------------------------
-    df["normalized"] = df[column].apply(clean_text)
-
-    # -------------------------------------------------
-    # Step 2: optionally strip numbers
+    # Step 1+2: normalize text (lowercase, punctuation) and
+    # optionally strip standalone numbers
+    # ('sample title number 123' -> 'sample title number')
     # -------------------------------------------------
-    if ignore_numbers:
-        df["normalized"] = df["normalized"].apply(_remove_numbers)
-
-    # Final cleanup (collapse spaces after number removal)
-    df["normalized"] = df["normalized"].str.replace(r"\s+", " ", regex=True).str.strip()
+    df["normalized"] = normalize_series(
+        df[column],
+        ignore_numbers=IGNORE_NUMBERS,
+        numeric_tokens=not ignore_numbers,
+    )
 
     # -------------------------------------------------
     # Step 3: build clusters (DO NOT DELETE INFO)
@@ -72,4 +129,19 @@ def dedupe_excel(
     # -------------------------------------------------
     unique_df = df.drop_duplicates(subset="normalized", keep="first")
 
+    # -------------------------------------------------
+    # Step 5 (optional): merge semantic near-duplicates
+    # First occurrence stays canonical for the merged group
+    # -------------------------------------------------
+    if semantic and len(unique_df) > 1:
+        norms = unique_df["normalized"].tolist()
+        roots = _semantic_groups(norms, threshold, block_size)
+
+        merged = {}
+        for norm, root in zip(norms, roots):
+            merged.setdefault(norms[root], []).extend(clusters[norm])
+
+        clusters = merged
+        unique_df = unique_df[roots == np.arange(len(norms))]
+
     return unique_df, clusters
@@ -1,21 +1,19 @@
-import pandas as pd
-from io import BytesIO
 from sqlalchemy.orm import Session
 
+from services.file_reader import iter_title_chunks
 from services.title_service import process_bulk_titles
 
 
-def process_excel(file_bytes: bytes, db: Session):
-    df = pd.read_excel(BytesIO(file_bytes))
+def process_excel(file_bytes: bytes, db: Session, filename: str = "upload.xlsx"):
+    summary = {
+        "processed": 0,
+        "duplicates": 0,
+        "saved": 0,
+    }
 
-    if "title" not in df.columns:
-        raise ValueError("Excel must contain a column named 'title'")
+    for chunk in iter_title_chunks(file_bytes, filename=filename):
+        result = process_bulk_titles(db, chunk)
+        for key in summary:
+            summary[key] += result[key]
 
-    titles = (
-        df["title"]
-        .dropna()
-        .astype(str)
-        .tolist()
-    )
-
-    return process_bulk_titles(titles, db)
+    return summary
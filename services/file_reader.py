@@ -0,0 +1,135 @@
+# services/file_reader.py
+
+import os
+from io import BytesIO
+from typing import TYPE_CHECKING, Iterator, Optional
+
+# pandas is imported where it is used: this module is loaded at API
+# startup (SUPPORTED_EXTENSIONS) and pandas is a large import
+if TYPE_CHECKING:
+    import pandas as pd
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv", ".parquet")
+
+# Rows per chunk handed to the bulk pipeline
+READ_CHUNK_SIZE = int(os.getenv("READ_CHUNK_SIZE", "10000"))
+
+
+def _missing_column(column: str):
+    return ValueError(f"File must contain a column named '{column}'")
+
+
+def _frame(values, column: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    return pd.DataFrame({column: values})
+
+
+# ---------------------------------------------------------
+# Per-format readers
+# ---------------------------------------------------------
+def _iter_xlsx(source, column: str, chunk_size: int):
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the sheet XML instead of building cells
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+
+        header = next(rows, None) or ()
+        names = [None if h is None else str(h).strip() for h in header]
+        if column not in names:
+            raise _missing_column(column)
+        idx = names.index(column)
+
+        values = []
+        for row in rows:
+            if not row or all(v is None for v in row):
+                continue
+
+            values.append(row[idx] if idx < len(row) else None)
+            if len(values) >= chunk_size:
+                yield _frame(values, column)
+                values = []
+
+        if values:
+            yield _frame(values, column)
+    finally:
+        wb.close()
+
+
+def _iter_xls(source, column: str, chunk_size: int):
+    import pandas as pd
+
+    # legacy .xls has no streaming reader; load once, hand out slices
+    df = pd.read_excel(source)
+    if column not in df.columns:
+        raise _missing_column(column)
+
+    for start in range(0, len(df), chunk_size):
+        yield df[[column]].iloc[start:start + chunk_size].reset_index(drop=True)
+
+
+def _iter_csv(source, column: str, chunk_size: int):
+    import pandas as pd
+
+    try:
+        reader = pd.read_csv(source, usecols=[column], chunksize=chunk_size)
+    except ValueError:
+        raise _missing_column(column)
+
+    with reader:
+        for chunk in reader:
+            yield chunk.reset_index(drop=True)
+
+
+def _iter_parquet(source, column: str, chunk_size: int):
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(source)
+    if column not in pf.schema_arrow.names:
+        raise _missing_column(column)
+
+    for batch in pf.iter_batches(batch_size=chunk_size, columns=[column]):
+        yield batch.to_pandas()
+
+
+_READERS = {
+    ".xlsx": _iter_xlsx,
+    ".xls": _iter_xls,
+    ".csv": _iter_csv,
+    ".parquet": _iter_parquet,
+}
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def iter_title_chunks(
+    source,
+    column: str = "title",
+    chunk_size: int = READ_CHUNK_SIZE,
+    filename: Optional[str] = None,
+) -> Iterator["pd.DataFrame"]:
+    """
+    Streams the `column` of a spreadsheet as DataFrames of at most
+    `chunk_size` rows, so only one chunk is in memory at a time.
+
+    - source: path, bytes or binary file object
+    - filename: used to pick the format when `source` is not a path
+      (defaults to .xlsx)
+    """
+    name = filename or (source if isinstance(source, str) else "")
+    ext = os.path.splitext(name)[1].lower() or ".xlsx"
+
+    reader = _READERS.get(ext)
+    if reader is None:
+        raise ValueError(
+            f"Unsupported file type '{ext}' "
+            f"(expected one of {', '.join(SUPPORTED_EXTENSIONS)})"
+        )
+
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+
+    yield from reader(source, column, chunk_size)
@@ -0,0 +1,127 @@
+# services/history_service.py
+
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from models.cluster import Cluster
+from models.title import Title
+from services.stats_service import get_stats
+
+STREAM_CHUNK_SIZE = 1000
+
+
+# ---------------------------------------------------------
+# Cursor helpers: "<created_at iso>,<id>" of the last row seen
+# ---------------------------------------------------------
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f"{created_at.isoformat()},{row_id}"
+
+
+def decode_cursor(cursor: str):
+    """
+    Raises ValueError for malformed cursors.
+    """
+    created_at, row_id = cursor.rsplit(",", 1)
+    return datetime.fromisoformat(created_at), int(row_id)
+
+
+def _history_query(db: Session, cursor: str | None):
+    # newest first; (created_at, id) keeps the order total and indexable
+    query = (
+        db.query(
+            Title.id,
+            Title.title,
+            Title.normalized_title,
+            Title.is_duplicate,
+            Title.created_at,
+        )
+        .order_by(Title.created_at.desc(), Title.id.desc())
+    )
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                Title.created_at < created_at,
+                and_(Title.created_at == created_at, Title.id < row_id),
+            )
+        )
+
+    return query
+
+
+def _row(r) -> dict:
+    return {
+        "id": r.id,
+        "title": r.title,
+        "normalized": r.normalized_title,
+        "status": "duplicate" if r.is_duplicate else "unique",
+        "cluster": r.normalized_title,
+        "created_at": r.created_at.isoformat(),
+    }
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def history_summary(db: Session) -> dict:
+    stats = get_stats(db)
+    clusters = (
+        db.query(func.count(Cluster.id))
+        .filter(Cluster.member_count > 0)
+        .scalar()
+    )
+
+    return {
+        "total": stats.total,
+        "unique": stats.total - stats.duplicates,
+        "duplicates": stats.duplicates,
+        "clusters": clusters,
+    }
+
+
+def history_page(db: Session, cursor: str | None = None, limit: int = 100) -> dict:
+    """
+    One keyset page of history plus summary counts.
+    `next_cursor` is None on the last page.
+    """
+    rows = _history_query(db, cursor).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        **history_summary(db),
+        "data": [_row(r) for r in rows],
+        "next_cursor": (
+            encode_cursor(rows[-1].created_at, rows[-1].id) if more else None
+        ),
+    }
+
+
+def iter_history_ndjson(cursor: str | None = None, limit: int | None = None):
+    """
+    Yields history rows as NDJSON lines from a server-side cursor,
+    STREAM_CHUNK_SIZE rows at a time. Owns its session because it runs
+    after the request's dependencies have been torn down.
+    """
+    db = SessionLocal()
+    try:
+        query = _history_query(db, cursor)
+        if limit:
+            query = query.limit(limit)
+
+        lines = []
+        for r in query.yield_per(STREAM_CHUNK_SIZE):
+            lines.append(json.dumps(_row(r)))
+            if len(lines) >= STREAM_CHUNK_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+
+        if lines:
+            yield "\n".join(lines) + "\n"
+    finally:
+        db.close()
@@ -0,0 +1,239 @@
+# services/metrics.py
+"""
+Process-local latency histograms and counters, rendered in the
+Prometheus text format for GET /admin/metrics (admin key required:
+scrape configs send it as an X-Admin-Key header).
+
+Recording is a lock, a bisect and two additions (nothing is formatted
+until a scrape). Gauges such as index size and queue depths are not
+tracked at all between scrapes: render() reads them from the owning
+services' stats when asked. With several uvicorn workers each process
+reports its own numbers.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; covers sub-millisecond cache hits up to multi-second commits
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED:
+            return
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in series:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {running}")
+        return lines
+
+
+# ==========================================================
+# Instruments
+# ==========================================================
+STAGE_SECONDS = Histogram(
+    "clearoid_stage_seconds",
+    "Time spent in one stage of the duplicate pipeline.",
+    ["stage"],
+)
+OPERATION_SECONDS = Histogram(
+    "clearoid_operation_seconds",
+    "Service call duration (embedding awaited by the route excluded).",
+    ["operation"],
+)
+BULK_CHUNK_SECONDS = Histogram(
+    "clearoid_bulk_chunk_seconds",
+    "Per-chunk time of each bulk ingestion stage.",
+    ["stage"],
+)
+TITLES_TOTAL = Counter(
+    "clearoid_titles_total",
+    "Titles stored, by path and outcome.",
+    ["path", "outcome"],
+)
+WRITER_BATCH_JOBS = Histogram(
+    "clearoid_db_writer_batch_jobs",
+    "Jobs per group commit.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+_INSTRUMENTS = [
+    STAGE_SECONDS,
+    OPERATION_SECONDS,
+    BULK_CHUNK_SECONDS,
+    WRITER_BATCH_JOBS,
+    TITLES_TOTAL,
+]
+
+
+# ==========================================================
+# Scrape-time values
+# ==========================================================
+def _sample(name: str, kind: str, help: str, values: Iterable[Tuple[Optional[str], object]]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for label, value in values:
+        lines.append(f"{name}{label or ''} {_number(value)}")
+    return lines
+
+
+def _runtime_lines(bind=None) -> List[str]:
+    # imported here: this module is imported by the services it reports on
+    from services.embedding_service import embedding_batcher_stats, embedding_cache_stats
+    from services.exact_index import exact_index
+    from services.vector_index import title_index
+
+    cache = embedding_cache_stats()
+    batcher = embedding_batcher_stats()
+
+    lines = []
+    lines += _sample(
+        "clearoid_embedding_cache_hits_total", "counter", "Embedding cache hits by tier.",
+        [('{tier="memory"}', cache["memory_hits"]), ('{tier="disk"}', cache["disk_hits"])],
+    )
+    lines += _sample(
+        "clearoid_embedding_cache_misses_total", "counter", "Embedding cache misses (model calls).",
+        [(None, cache["misses"])],
+    )
+    lines += _sample(
+        "clearoid_embedding_cache_entries", "gauge", "Vectors held in the in-process cache.",
+        [(None, cache["entries"])],
+    )
+    lines += _sample(
+        "clearoid_embedding_queue_depth", "gauge", "Texts waiting in the embedding coalescer.",
+        [(None, batcher["queue_depth"])],
+    )
+    lines += _sample(
+        "clearoid_embedding_batches_total", "counter", "Coalesced embedding batches encoded.",
+        [(None, batcher["batches"])],
+    )
+    lines += _sample(
+        "clearoid_embedding_rejected_total", "counter", "Embedding requests rejected (queue full).",
+        [(None, batcher["rejected"])],
+    )
+    lines += _sample(
+        "clearoid_vector_index_size", "gauge", "Titles with a vector in the index.",
+        [(None, len(title_index))],
+    )
+    lines += _sample(
+        "clearoid_exact_index_keys", "gauge", "Cluster keys in the exact-match index.",
+        [(None, len(exact_index))],
+    )
+
+    if bind is not None:
+        from database.writer import get_writer
+
+        writer = get_writer(bind).info()
+        lines += _sample(
+            "clearoid_db_writer_queue_depth", "gauge", "Write jobs waiting for the next group commit.",
+            [(None, writer["queued"])],
+        )
+        lines += _sample(
+            "clearoid_db_writer_jobs_total", "counter", "Write jobs committed.",
+            [(None, writer["jobs"])],
+        )
+
+    return lines
+
+
+def render(bind=None) -> str:
+    """
+    Prometheus text exposition of every instrument plus the scrape-time
+    values; `bind` adds the database writer of that engine.
+    """
+    lines = []
+    for instrument in _INSTRUMENTS:
+        lines += instrument.render()
+    lines += _runtime_lines(bind)
+    return "\n".join(lines) + "\n"
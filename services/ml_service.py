@@ -1,20 +1,17 @@
 # services/ml_service.py
 
-import re
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from services.embedding_service import get_embedding
+from utils.normalization import normalize_text
 
 
 # --------------------------
 # Text normalization
 # --------------------------
 def normalize(text: str) -> str:
-    text = text.lower()
-    text = re.sub(r"[^\w\s]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    # punctuation and case only: numbers are always kept here
+    return normalize_text(text, ignore_numbers=False)
 
 
 # --------------------------
@@ -25,39 +22,23 @@ def find_duplicates(new_title: str, threshold: float = 0.80):
     Finds the most similar existing title.
     Returns (duplicate_info | None, max_score)
     """
-    from database.database import get_db_session
+    from database.database import SessionLocal
     from models.title import Title
+    from services.vector_index import get_title_index
 
     clean_title = normalize(new_title)
     new_embedding = np.array(get_embedding(clean_title), dtype=np.float32)
 
-    with get_db_session() as session:
-        titles = session.query(Title).all()
+    with SessionLocal() as session:
+        best_id, max_score = get_title_index(session).best(
+            new_embedding, threshold=threshold
+        )
 
-        if not titles:
+        if best_id is None:
             return None, 0.0
 
-        embeddings = []
-        valid_titles = []
-
-        for t in titles:
-            if t.embedding:
-                emb = np.frombuffer(t.embedding, dtype=np.float32)
-                embeddings.append(emb)
-                valid_titles.append(t)
-
-        if not embeddings:
-            return None, 0.0
-
-        embeddings = np.vstack(embeddings)
-
-        similarities = cosine_similarity([new_embedding], embeddings)[0]
-
-        max_idx = int(np.argmax(similarities))
-        max_score = float(similarities[max_idx])
-
         if max_score >= threshold:
-            duplicate = valid_titles[max_idx]
+            duplicate = session.get(Title, best_id)
             return {
                 "id": duplicate.id,
                 "title": duplicate.title,
@@ -0,0 +1,196 @@
+# services/onnx_embedder.py
+"""
+ONNX Runtime backend for the MiniLM sentence encoder.
+
+The transformer is exported once from the sentence-transformers model
+(optionally with dynamic int8 weight quantization) and then served by
+onnxruntime with the same WordPiece tokenizer, mean pooling and output
+normalization, so PyTorch is only needed for the export itself.
+
+Usage:
+    python -m services.onnx_embedder            # export fp32 + int8
+    python -m services.onnx_embedder --no-int8  # fp32 only
+
+Parity against the PyTorch model: python -m benchmarks.onnx_parity
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+ONNX_CONFIG_FILE = "encoder.json"
+
+# onnxruntime intra-op threads (0 -> onnxruntime default: all cores)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+
+# ---------------------------------------------------------
+# Export (needs torch + sentence-transformers, run once)
+# ---------------------------------------------------------
+def export_onnx(model_name: str, out_dir, quantize: bool = True) -> Path:
+    """
+    Writes model.onnx (+ model.int8.onnx), tokenizer.json and the pooling
+    config of `model_name` into `out_dir`.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+
+    pooling = next((m for m in st if isinstance(m, Pooling)), None)
+    if pooling is not None and not pooling.get_config_dict().get("pooling_mode_mean_tokens"):
+        raise ValueError(f"{model_name}: only mean pooling is supported")
+
+    config = {
+        "model_name": model_name,
+        "max_seq_length": int(st.max_seq_length),
+        "normalize": any(isinstance(m, Normalize) for m in st),
+    }
+
+    sample = st.tokenizer(["export sample"], return_tensors="pt")
+    inputs = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic = {"batch": 0, "sequence": 1}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in inputs),
+            str(out_dir / ONNX_FP32_FILE),
+            input_names=inputs,
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                **{name: dynamic for name in inputs},
+                "last_hidden_state": dynamic,
+            },
+            opset_version=14,
+        )
+
+    st.tokenizer.save_pretrained(str(out_dir))
+    (out_dir / ONNX_CONFIG_FILE).write_text(json.dumps(config, indent=2))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            str(out_dir / ONNX_FP32_FILE),
+            str(out_dir / ONNX_INT8_FILE),
+            weight_type=QuantType.QInt8,
+        )
+
+    logger.info("Exported %s to %s (int8: %s)", model_name, out_dir, quantize)
+    return out_dir
+
+
+# ---------------------------------------------------------
+# Inference (onnxruntime + tokenizers only)
+# ---------------------------------------------------------
+class OnnxEmbedder:
+    """
+    Drop-in for SentenceTransformer.encode() on an exported model dir.
+    """
+
+    def __init__(self, model_dir, quantized: bool = False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        config = json.loads((model_dir / ONNX_CONFIG_FILE).read_text())
+        self.max_seq_length = config["max_seq_length"]
+        self.normalize = config["normalize"]
+        self.quantized = quantized
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        path = model_dir / (ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        self.session = ort.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer.encode_batch(texts)
+        feed = {
+            "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encoded], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encoded], dtype=np.int64),
+        }
+        feed = {k: v for k, v in feed.items() if k in self._inputs}
+
+        hidden = self.session.run(["last_hidden_state"], feed)[0]
+
+        # mean pooling over real tokens (same as sentence-transformers Pooling)
+        mask = feed["attention_mask"][:, :, None].astype(np.float32)
+        emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            norms = np.linalg.norm(emb, axis=1, keepdims=True)
+            emb = emb / np.clip(norms, 1e-12, None)
+
+        return emb.astype(np.float32)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        out = np.vstack([
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ])
+        return out[0] if single else out
+
+
+def load_onnx_embedder(model_name: str, model_dir, quantized: bool = False) -> OnnxEmbedder:
+    """
+    Loads the exported model, exporting it first if `model_dir` has none.
+    """
+    model_dir = Path(model_dir)
+    wanted = model_dir / (ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+
+    if not wanted.exists():
+        logger.info("No ONNX export in %s, exporting %s", model_dir, model_name)
+        export_onnx(model_name, model_dir, quantize=quantized)
+
+    return OnnxEmbedder(model_dir, quantized=quantized)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from services.embedding_service import MINILM_MODEL_NAME, ONNX_MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Export MiniLM to ONNX")
+    parser.add_argument("--model", default=MINILM_MODEL_NAME)
+    parser.add_argument("--out", default=ONNX_MODEL_DIR)
+    parser.add_argument("--no-int8", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_onnx(args.model, args.out, quantize=not args.no_int8)
@@ -0,0 +1,126 @@
+# services/pipeline.py
+
+import contextvars
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Items buffered between two stages (bounds memory to a few chunks)
+PIPELINE_DEPTH = 2
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def run_stages(
+    source: Iterable,
+    stages: List[Tuple[str, Callable]],
+    depth: int = PIPELINE_DEPTH,
+    timings: Optional[dict] = None,
+    on_stage: Optional[Callable[[float, str], None]] = None,
+) -> Iterator:
+    """
+    Overlaps the steps of a chunked job.
+
+    `source` is iterated in its own thread ("read"), each (name, fn) stage
+    runs in its own thread, and the results of the last stage are yielded
+    to the caller in order, so the caller's loop body (typically the DB
+    write) becomes the final stage. Queues between stages hold at most
+    `depth` items. An exception in any stage is re-raised in the caller
+    and stops the others.
+
+    `timings` (optional dict) accumulates busy seconds per stage name;
+    `on_stage(seconds, name)` is called for every single measurement.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=depth) for _ in range(len(stages) + 1)]
+    lock = threading.Lock()
+
+    def record(name, seconds):
+        if timings is not None:
+            with lock:
+                timings[name] = timings.get(name, 0.0) + seconds
+        if on_stage is not None:
+            on_stage(seconds, name)
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def feed():
+        try:
+            items = iter(source)
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                record("read", time.perf_counter() - t0)
+                if not put(queues[0], item):
+                    return
+            put(queues[0], _DONE)
+        except BaseException as e:
+            put(queues[0], _Failed(e))
+
+    def work(name, fn, inbox, outbox):
+        while True:
+            item = get(inbox)
+            if item is _DONE or isinstance(item, _Failed):
+                put(outbox, item)
+                return
+            try:
+                t0 = time.perf_counter()
+                result = fn(item)
+                record(name, time.perf_counter() - t0)
+            except BaseException as e:
+                put(outbox, _Failed(e))
+                return
+            if not put(outbox, result):
+                return
+
+    # stage threads inherit the caller's context (e.g. an active profile)
+    threads = [threading.Thread(
+        target=contextvars.copy_context().run, args=(feed,), name="pipeline-read", daemon=True,
+    )]
+    for n, (name, fn) in enumerate(stages):
+        threads.append(threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(work, name, fn, queues[n], queues[n + 1]),
+            name=f"pipeline-{name}",
+            daemon=True,
+        ))
+
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=5)
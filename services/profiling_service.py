@@ -0,0 +1,382 @@
+# services/profiling_service.py
+"""
+On-demand sampling profiles of single requests and background jobs.
+
+While a profile is active a daemon thread snapshots every thread's
+Python stack each PROFILE_INTERVAL_MS (sys._current_frames(), so the
+profiled code is never traced) and counts the stacks that run code of
+this project; idle waits are dropped. SQL statements executed in the
+profiled context (request threadpool work, database writer jobs, bulk
+pipeline threads) are timed from SQLAlchemy cursor events.
+
+Profiles are written as JSON under PROFILE_DIR, so the API can list
+the ones recorded by RQ workers too. Stacks are kept in the collapsed
+"frame;frame;frame count" format read by flamegraph.pl, speedscope and
+most flame-graph viewers.
+
+Triggers:
+- X-Profile: 1 header or ?profile=1, together with a valid X-Admin-Key
+- 1 in PROFILE_SAMPLE_RATE requests under PROFILE_PATHS
+- 1 in PROFILE_JOB_SAMPLE_RATE bulk jobs
+"""
+
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from services.admin_auth import ADMIN_KEY_HEADER, is_admin_key
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles")))
+
+# Stack sampling period
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Profile 1 in N matching requests / bulk jobs (0 -> only on demand)
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_JOB_SAMPLE_RATE = int(os.getenv("PROFILE_JOB_SAMPLE_RATE", "0"))
+
+# Path prefixes eligible for sampling / the X-Profile header
+PROFILE_PATHS = tuple(
+    p.strip() for p in os.getenv("PROFILE_PATHS", "/api/,/excel/,/bulk-uploads").split(",") if p.strip()
+)
+
+# Profiles kept on disk (oldest removed first)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+
+# Distinct SQL statements reported per profile
+PROFILE_SQL_TOP = 50
+
+_MAX_DEPTH = 128
+
+# Leaf frames of threads that are only waiting
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("threading.py", "_wait_for_tstate_lock"),
+}
+
+_active: ContextVar[Optional["Profile"]] = ContextVar("active_profile", default=None)
+
+
+# ---------------------------------------------------------
+# Stack sampling
+# ---------------------------------------------------------
+_labels = {}
+_own_file = __file__
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        try:
+            path = os.path.relpath(path, BASE_DIR) if path.startswith(str(BASE_DIR)) else os.path.basename(path)
+        except ValueError:
+            path = os.path.basename(path)
+        # ';' separates frames in the collapsed format
+        label = f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+        _labels[code] = label
+    return label
+
+
+def _is_project(filename: str) -> bool:
+    return (
+        filename.startswith(str(BASE_DIR))
+        and "site-packages" not in filename
+        and filename != _own_file
+    )
+
+
+def _stack(frame):
+    """Root-first labels of `frame`'s stack, or None if not worth a sample."""
+    leaf = frame.f_code
+    if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+        return None
+
+    codes = []
+    project = False
+    while frame is not None and len(codes) < _MAX_DEPTH:
+        codes.append(frame.f_code)
+        project = project or _is_project(frame.f_code.co_filename)
+        frame = frame.f_back
+
+    if not project:
+        return None
+    return tuple(_label(code) for code in reversed(codes))
+
+
+class Profile:
+    def __init__(self, kind: str, name: str, meta: dict = None, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.kind = kind
+        self.name = name
+        self.meta = dict(meta or {})
+        self.interval = max(0.5, interval_ms) / 1000
+
+        self.stacks = Counter()
+        self.samples = 0
+        self.sql = {}
+        self._sql_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self.started_at = None
+        self.duration = 0.0
+
+    def start(self):
+        self.started_at = datetime.utcnow()
+        self._t0 = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self._t0
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _stack(frame)
+                if stack is not None:
+                    self.stacks[(names.get(ident, str(ident)),) + stack] += 1
+            self.samples += 1
+
+    def record_sql(self, statement: str, seconds: float, rows: int):
+        statement = " ".join(statement.split())[:1000]
+        with self._sql_lock:
+            entry = self.sql.get(statement)
+            if entry is None:
+                entry = self.sql[statement] = [0, 0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += rows
+            entry[2] += seconds
+            entry[3] = max(entry[3], seconds)
+
+    def folded(self):
+        return [";".join(stack) + f" {count}" for stack, count in self.stacks.most_common()]
+
+    def to_dict(self) -> dict:
+        with self._sql_lock:
+            sql = sorted(self.sql.items(), key=lambda item: -item[1][2])
+
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "meta": self.meta,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "duration_ms": round(self.duration * 1000, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "sql": {
+                "statements": sum(e[0] for _, e in sql),
+                "total_ms": round(sum(e[2] for _, e in sql) * 1000, 3),
+                "top": [
+                    {
+                        "statement": statement,
+                        "count": count,
+                        "rows": rows,
+                        "total_ms": round(total * 1000, 3),
+                        "max_ms": round(worst * 1000, 3),
+                    }
+                    for statement, (count, rows, total, worst) in sql[:PROFILE_SQL_TOP]
+                ],
+            },
+            "folded": self.folded(),
+        }
+
+
+# ---------------------------------------------------------
+# SQL timings (a no-op unless the current context is profiled)
+# ---------------------------------------------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active.get()
+    started = conn.info.get("profile_started")
+    if profile is None or not started:
+        return
+    rows = len(parameters) if executemany and parameters else 1
+    profile.record_sql(statement, time.perf_counter() - started.pop(), rows)
+
+
+# ---------------------------------------------------------
+# Profiling scopes
+# ---------------------------------------------------------
+def current_profile() -> Optional[Profile]:
+    return _active.get()
+
+
+@contextmanager
+def profiling(kind: str, name: str, **meta):
+    """
+    Profiles the enclosed block (and work it hands to threads that copy
+    the context) and stores the result.
+    """
+    profile = Profile(kind, name, meta)
+    token = _active.set(profile)
+    profile.start()
+    try:
+        yield profile
+    except BaseException as e:
+        profile.meta["error"] = repr(e)
+        raise
+    finally:
+        _active.reset(token)
+        profile.stop()
+        try:
+            save_profile(profile)
+        except OSError:
+            logger.exception("Could not store profile %s", profile.id)
+
+
+_job_counter = itertools.count(1)
+
+
+def profile_job(name: str, **meta):
+    """
+    profiling() for 1 in PROFILE_JOB_SAMPLE_RATE background jobs, a
+    no-op context otherwise.
+    """
+    if PROFILE_JOB_SAMPLE_RATE > 0 and next(_job_counter) % PROFILE_JOB_SAMPLE_RATE == 0:
+        return profiling("job", name, **meta)
+    return nullcontext()
+
+
+# ---------------------------------------------------------
+# Storage
+# ---------------------------------------------------------
+def _path(profile_id: str) -> Path:
+    # ids are generated here; anything else cannot name a stored profile
+    if not profile_id or not all(c.isalnum() or c in "-T" for c in profile_id):
+        raise FileNotFoundError(profile_id)
+    return PROFILE_DIR / f"{profile_id}.json"
+
+
+def save_profile(profile: Profile):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _path(profile.id)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(profile.to_dict()))
+    os.replace(tmp, path)
+
+    logger.info(
+        "Profile %s stored: %s %s, %.1f ms, %d samples, %d SQL statements",
+        profile.id, profile.kind, profile.name, profile.duration * 1000,
+        profile.samples, sum(e[0] for e in profile.sql.values()),
+    )
+
+    stored = sorted(PROFILE_DIR.glob("*.json"))
+    for old in stored[:max(0, len(stored) - PROFILE_KEEP)]:
+        old.unlink(missing_ok=True)
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    try:
+        return json.loads(_path(profile_id).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def list_profiles(limit: int = 50, kind: str = None):
+    """Newest first, without the stacks."""
+    out = []
+    if not PROFILE_DIR.is_dir():
+        return out
+
+    for path in sorted(PROFILE_DIR.glob("*.json"), reverse=True):
+        data = load_profile(path.stem)
+        if data is None or (kind and data["kind"] != kind):
+            continue
+        out.append({
+            "id": data["id"],
+            "kind": data["kind"],
+            "name": data["name"],
+            "meta": data["meta"],
+            "started_at": data["started_at"],
+            "duration_ms": data["duration_ms"],
+            "samples": data["samples"],
+            "sql_statements": data["sql"]["statements"],
+            "sql_ms": data["sql"]["total_ms"],
+        })
+        if len(out) >= limit:
+            break
+    return out
+
+
+# ---------------------------------------------------------
+# ASGI middleware (requests)
+# ---------------------------------------------------------
+class ProfilingMiddleware:
+    """
+    Profiles a request when an admin asks for it (X-Profile: 1 header or
+    ?profile=1, plus X-Admin-Key) or when it is the Nth sampled one. The
+    profile id is returned in the X-Profile-Id response header.
+    """
+
+    def __init__(self, app, sample_rate: int = PROFILE_SAMPLE_RATE, paths=PROFILE_PATHS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.paths = paths
+        self._counter = itertools.count(1)
+
+    def _wanted(self, scope) -> bool:
+        if not scope["path"].startswith(self.paths):
+            return False
+
+        headers = dict(scope.get("headers") or [])
+        requested = headers.get(b"x-profile", b"").decode() in ("1", "true")
+        if not requested:
+            query = parse_qs(scope.get("query_string", b"").decode())
+            requested = query.get("profile", [""])[0] in ("1", "true")
+        if requested:
+            # silently ignored without the admin key
+            return is_admin_key(headers.get(ADMIN_KEY_HEADER.encode(), b"").decode() or None)
+
+        return self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        with profiling("request", f"{scope['method']} {scope['path']}") as profile:
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    profile.meta["status"] = message["status"]
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-profile-id", profile.id.encode())
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_id)
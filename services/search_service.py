@@ -0,0 +1,190 @@
+# services/search_service.py
+
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from models.title import Title
+from services.stats_service import get_stats
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "titles_fts"
+
+# The trigram tokenizer only indexes substrings of 3+ characters
+MIN_FTS_QUERY = 3
+
+# External-content FTS5 table over titles(title, normalized_title);
+# triggers keep it in step with every write path (ORM, Core, raw SQL)
+_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    " title, normalized_title,"
+    " content='titles', content_rowid='id', tokenize='trigram')",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON titles BEGIN"
+    f" INSERT INTO {FTS_TABLE} (rowid, title, normalized_title)"
+    " VALUES (new.id, new.title, new.normalized_title);"
+    " END",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON titles BEGIN"
+    f" INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, normalized_title)"
+    " VALUES ('delete', old.id, old.title, old.normalized_title);"
+    " END",
+
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, normalized_title ON titles BEGIN"
+    f" INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, normalized_title)"
+    " VALUES ('delete', old.id, old.title, old.normalized_title);"
+    f" INSERT INTO {FTS_TABLE} (rowid, title, normalized_title)"
+    " VALUES (new.id, new.title, new.normalized_title);"
+    " END",
+]
+
+# engine url -> whether titles_fts exists
+_fts_available = {}
+
+
+# ---------------------------------------------------------
+# Schema
+# ---------------------------------------------------------
+def ensure_search_index(engine):
+    """
+    Creates the FTS5 trigram index and its triggers (SQLite only) and
+    populates it from existing titles the first time.
+    """
+    if engine.dialect.name != "sqlite":
+        _fts_available[str(engine.url)] = False
+        return
+
+    existed = inspect(engine).has_table(FTS_TABLE)
+    try:
+        with engine.begin() as conn:
+            for ddl in _FTS_DDL:
+                conn.execute(text(ddl))
+            if not existed:
+                conn.execute(text(
+                    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+                ))
+                logger.info("Search index built")
+    except Exception as e:
+        # e.g. SQLite built without FTS5 / trigram support
+        logger.warning("Search index disabled (%s); using LIKE scans", e)
+        _fts_available[str(engine.url)] = False
+        return
+
+    _fts_available[str(engine.url)] = True
+
+
+def _has_fts(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _fts_available:
+        _fts_available[key] = (
+            bind.dialect.name == "sqlite" and inspect(bind).has_table(FTS_TABLE)
+        )
+    return _fts_available[key]
+
+
+def _phrase(search: str) -> str:
+    # one quoted phrase: substring match, no FTS operator parsing
+    return '"' + search.replace('"', '""') + '"'
+
+
+# ---------------------------------------------------------
+# Queries
+# ---------------------------------------------------------
+def _columns(db: Session):
+    return db.query(
+        Title.id,
+        Title.title,
+        Title.normalized_title,
+        Title.is_duplicate,
+        Title.created_at,
+    )
+
+
+def _fts_search(db: Session, search: str, duplicates, offset: int, limit: int):
+    where = f"{FTS_TABLE} MATCH :q"
+    params = {"q": _phrase(search)}
+    join = ""
+    if duplicates is not None:
+        join = f" JOIN titles t ON t.id = {FTS_TABLE}.rowid"
+        where += " AND t.is_duplicate = :dup"
+        params["dup"] = 1 if duplicates else 0
+
+    total = db.execute(
+        text(f"SELECT COUNT(*) FROM {FTS_TABLE}{join} WHERE {where}"),
+        params,
+    ).scalar()
+
+    ids = db.execute(
+        text(
+            f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE}{join} WHERE {where}"
+            f" ORDER BY {FTS_TABLE}.rank, {FTS_TABLE}.rowid DESC"
+            " LIMIT :limit OFFSET :offset"
+        ),
+        {**params, "limit": limit, "offset": offset},
+    ).scalars().all()
+
+    by_id = {r.id: r for r in _columns(db).filter(Title.id.in_(ids))}
+    return total, [by_id[i] for i in ids if i in by_id]
+
+
+def _like_search(db: Session, search, duplicates, offset: int, limit: int):
+    query = _columns(db)
+
+    if search:
+        query = query.filter(
+            (Title.title.ilike(f"%{search}%")) |
+            (Title.normalized_title.ilike(f"%{search}%"))
+        )
+
+    if duplicates is not None:
+        query = query.filter(Title.is_duplicate == (1 if duplicates else 0))
+
+    if search:
+        total = query.count()
+    else:
+        # unfiltered / flag-only totals come from the stats counters
+        stats = get_stats(db)
+        if duplicates is None:
+            total = stats.total
+        elif duplicates:
+            total = stats.duplicates
+        else:
+            total = stats.total - stats.duplicates
+
+    rows = query.order_by(Title.id.asc()).offset(offset).limit(limit).all()
+    return total, rows
+
+
+def search_titles(
+    db: Session,
+    search: str | None = None,
+    duplicates: bool | None = None,
+    page: int = 1,
+    limit: int = 20,
+):
+    """
+    Returns (total, rows) for the titles table view.
+
+    Searches of 3+ characters go through the FTS5 trigram index
+    (case-insensitive substring match, ranked by bm25); shorter ones and
+    non-SQLite databases fall back to LIKE scans.
+    """
+    search = (search or "").strip() or None
+    offset = (page - 1) * limit
+
+    if search and len(search) >= MIN_FTS_QUERY and _has_fts(db):
+        return _fts_search(db, search, duplicates, offset, limit)
+
+    return _like_search(db, search, duplicates, offset, limit)
+
+
+if __name__ == "__main__":
+    # python -m services.search_service  (rebuilds the FTS index)
+    from database.database import engine
+
+    ensure_search_index(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
@@ -0,0 +1,140 @@
+# services/startup_service.py
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Load + warm MiniLM at startup (even with USE_OPENAI it is the fallback)
+WARMUP_MODEL = os.getenv("WARMUP_MODEL", "true").lower() == "true"
+
+
+class Readiness:
+    """
+    Startup progress of the API process, reported by GET /ready.
+
+    Each component is recorded as pending -> ready | failed with its
+    duration; the process is ready once every component has finished
+    without failing.
+    """
+
+    def __init__(self, started: float = None):
+        self.started = started or time.perf_counter()
+        self.import_seconds = None
+        self.ready_seconds = None
+        self._lock = threading.Lock()
+        self._components = {}
+
+    def run(self, name: str, fn):
+        with self._lock:
+            self._components[name] = {"status": "pending", "seconds": None}
+
+        t0 = time.perf_counter()
+        try:
+            fn()
+            status, error = "ready", None
+        except Exception as e:
+            logger.exception("Startup step '%s' failed", name)
+            status, error = "failed", str(e)
+
+        with self._lock:
+            self._components[name] = {
+                "status": status,
+                "seconds": round(time.perf_counter() - t0, 3),
+                **({"error": error} if error else {}),
+            }
+
+    def expect(self, *names):
+        with self._lock:
+            for name in names:
+                self._components.setdefault(name, {"status": "pending", "seconds": None})
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return bool(self._components) and all(
+                c["status"] == "ready" for c in self._components.values()
+            )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            components = {k: dict(v) for k, v in self._components.items()}
+
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.perf_counter() - self.started, 3),
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds,
+            "components": components,
+        }
+
+
+# ---------------------------------------------------------
+# Startup steps
+# ---------------------------------------------------------
+def prepare_database():
+    """
+    Creates tables and applies the in-place migrations.
+    """
+    from database.database import Base, engine, ensure_indexes
+    from services.bulk_service import ensure_bulk_schema
+    from services.cluster_service import ensure_cluster_schema
+    from services.search_service import ensure_search_index
+    from services.stats_service import ensure_stats
+
+    Base.metadata.create_all(bind=engine)
+    ensure_cluster_schema(engine)
+    ensure_bulk_schema(engine)
+    ensure_indexes(engine)
+    ensure_search_index(engine)
+    ensure_stats(engine)
+
+
+def build_indexes():
+    """
+    Loads the vector and exact-match indexes (updated on insert afterwards).
+    """
+    from database.database import SessionLocal
+    from services.exact_index import exact_index
+    from services.vector_index import title_index
+
+    with SessionLocal() as db:
+        title_index.refresh(db)
+        exact_index.refresh(db)
+
+
+def warm_model():
+    from services.embedding_service import warm_minilm_model
+
+    warm_minilm_model()
+
+
+async def warm_up(readiness: Readiness):
+    """
+    Model load/warmup and index build, concurrently and off the event
+    loop; the API keeps serving (and /ready reports progress) meanwhile.
+    """
+    steps = {"index": build_indexes}
+    if WARMUP_MODEL:
+        steps["model"] = warm_model
+
+    readiness.expect(*steps)
+    await asyncio.gather(*(
+        asyncio.to_thread(readiness.run, name, fn) for name, fn in steps.items()
+    ))
+
+    readiness.ready_seconds = round(time.perf_counter() - readiness.started, 3)
+    snapshot = readiness.snapshot()
+    logger.info(
+        "Startup %s in %.2fs (imports %.2fs; %s)",
+        "complete" if snapshot["ready"] else "FAILED",
+        readiness.ready_seconds,
+        readiness.import_seconds or 0.0,
+        ", ".join(
+            f"{name} {c['status']} {c['seconds']}s"
+            for name, c in snapshot["components"].items()
+        ),
+    )
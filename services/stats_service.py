@@ -0,0 +1,123 @@
+# services/stats_service.py
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.writer import write
+from models.cluster import Cluster
+from models.title import Title
+from models.title_stats import TitleStats
+
+logger = logging.getLogger(__name__)
+
+STATS_ROW_ID = 1
+
+
+# ---------------------------------------------------------
+# Incremental maintenance (same transaction as the write)
+# ---------------------------------------------------------
+def record_inserts(db: Session, total: int, duplicates: int, length_sum: int):
+    """
+    Adds freshly inserted titles to the counters. Does not commit.
+    """
+    db.execute(
+        update(TitleStats)
+        .where(TitleStats.id == STATS_ROW_ID)
+        .values(
+            total=TitleStats.total + total,
+            duplicates=TitleStats.duplicates + duplicates,
+            title_length_sum=TitleStats.title_length_sum + length_sum,
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+def record_duplicate_delta(db: Session, delta: int):
+    """
+    Applies flag flips (unique <-> duplicate) to the counters.
+    Does not commit.
+    """
+    if not delta:
+        return
+
+    db.execute(
+        update(TitleStats)
+        .where(TitleStats.id == STATS_ROW_ID)
+        .values(
+            duplicates=TitleStats.duplicates + delta,
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+# ---------------------------------------------------------
+# Reads
+# ---------------------------------------------------------
+def get_stats(db: Session) -> TitleStats:
+    stats = db.get(TitleStats, STATS_ROW_ID)
+    if stats is None:
+        stats = rebuild_stats(db)
+    return stats
+
+
+def top_clusters(db: Session, limit: int = 10):
+    """
+    Largest clusters, read through the clusters.member_count index.
+    """
+    return (
+        db.query(Cluster.normalized_title, Cluster.member_count)
+        .order_by(Cluster.member_count.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+# ---------------------------------------------------------
+# Full rebuild
+# ---------------------------------------------------------
+def rebuild_stats(db: Session) -> TitleStats:
+    """
+    Recomputes every counter with one aggregate pass over titles, as a
+    job of the database writer (runs inline inside another writer job).
+    """
+    stats = write(db, _rebuild_stats)
+    logger.info("Stats rebuilt: %d titles, %d duplicates", stats.total, stats.duplicates)
+    return stats
+
+
+def _rebuild_stats(db: Session) -> TitleStats:
+    total, duplicates, length_sum = db.query(
+        func.count(Title.id),
+        func.coalesce(func.sum(Title.is_duplicate), 0),
+        func.coalesce(func.sum(func.length(Title.title)), 0),
+    ).one()
+
+    stats = db.get(TitleStats, STATS_ROW_ID)
+    if stats is None:
+        stats = TitleStats(id=STATS_ROW_ID)
+        db.add(stats)
+
+    stats.total = total
+    stats.duplicates = duplicates
+    stats.title_length_sum = length_sum
+    stats.updated_at = datetime.utcnow()
+    return stats
+
+
+def ensure_stats(engine):
+    """
+    Creates the counters row from existing titles on first start.
+    """
+    with Session(engine) as db:
+        if db.get(TitleStats, STATS_ROW_ID) is None:
+            rebuild_stats(db)
+
+
+if __name__ == "__main__":
+    # python -m services.stats_service
+    with SessionLocal() as session:
+        rebuild_stats(session)
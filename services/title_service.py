@@ -1,115 +1,233 @@
+import time
+from typing import TYPE_CHECKING
+
 from sqlalchemy.orm import Session
-from sklearn.metrics.pairwise import cosine_similarity
+from sqlalchemy import insert
 import numpy as np
-import pandas as pd
 
-from utils.text_cleaner import clean_text
-from services.embedding_service import get_embedding
+if TYPE_CHECKING:
+    import pandas as pd
+
+from database.writer import after_commit, write
+from utils.text_cleaner import clean_text, clean_texts
+from services.embedding_service import embed_async, get_embedding, get_embeddings
+from services.vector_index import (
+    get_title_index,
+    load_vectors,
+    normalize_rows,
+    title_index,
+)
+from services.vector_store import store_blobs
+from services.exact_index import exact_index, get_exact_index
+from services.cluster_service import (
+    add_members,
+    get_or_create_clusters,
+)
+from services.stats_service import get_stats, record_inserts
+from services.metrics import (
+    BULK_CHUNK_SECONDS,
+    OPERATION_SECONDS,
+    STAGE_SECONDS,
+    TITLES_TOTAL,
+)
+from services.pipeline import run_stages
 from models.title import Title
 
 SIMILARITY_THRESHOLD = 0.85
 
+# Titles embedded per batch during bulk ingestion
+BULK_EMBED_CHUNK = 1000
+
 
 # ---------------------------------------------------------
 # Internal helper: find best semantic match
 # ---------------------------------------------------------
 def _find_best_match(db: Session, vec: np.ndarray):
-    best_score = 0.0
-    best_row = None
+    with STAGE_SECONDS.time("similarity_scan"):
+        best_id, best_score = get_title_index(db).best(
+            vec, threshold=SIMILARITY_THRESHOLD
+        )
 
-    rows = db.query(Title).all()
+    if best_id is None:
+        return None, 0.0
 
-    for row in rows:
-        if not row.embedding:
-            continue
+    return db.get(Title, best_id), best_score
 
-        try:
-            stored = np.frombuffer(row.embedding, dtype=np.float32)
-            score = float(cosine_similarity([vec], [stored])[0][0])
-        except Exception:
-            continue
 
-        if score > best_score:
-            best_score = score
-            best_row = row
+# ---------------------------------------------------------
+# Internal helper: exact cluster-key hit (no model call)
+# ---------------------------------------------------------
+def _exact_match(db: Session, cleaned: str):
+    """
+    (primary Title, its stored embedding) when `cleaned` is already a
+    cluster key, else (None, None). Same text -> same embedding, so the
+    primary's vector stands in for running the model.
+    """
+    with STAGE_SECONDS.time("exact_match"):
+        primary_id = get_exact_index(db).get(cleaned)
+        if primary_id is None:
+            return None, None
+
+        row = db.get(Title, primary_id)
+        vec = load_vectors(db, [primary_id]).get(primary_id) if row is not None else None
+    if row is None or row.normalized_title != cleaned or vec is None:
+        # stale map (clusters rebuilt / rows removed elsewhere)
+        exact_index.reset()
+        return None, None
 
-    return best_row, best_score
+    return row, vec
 
 
 # ---------------------------------------------------------
-# 🔒 HARD RULE: exactly ONE unique per normalized_title
+# Embedding for single-title requests
 # ---------------------------------------------------------
-def enforce_single_primary(db: Session, normalized_title: str):
+def _vector(cleaned: str, vec=None) -> np.ndarray:
+    if vec is None:
+        with STAGE_SECONDS.time("embed"):
+            vec = get_embedding(cleaned)
+    return np.asarray(vec, dtype=np.float32)
+
+
+def _clean(raw: str) -> str:
+    with STAGE_SECONDS.time("clean_text"):
+        return clean_text(raw)
+
+
+async def embed_title(item):
     """
-    Ensures exactly ONE unique row per cluster.
-    Oldest row (by created_at) is canonical primary.
-    All others are forced to duplicate.
+    Embeds an API request's title through the request coalescer.
+    Returns None for known cluster keys: the exact-match path in the
+    sync service functions needs no model call.
     """
-    rows = (
-        db.query(Title)
-        .filter(Title.normalized_title == normalized_title)
-        .order_by(Title.created_at.asc())
-        .all()
-    )
+    cleaned = _clean(item.title)
+    if exact_index.get(cleaned) is not None:
+        return None
+    with STAGE_SECONDS.time("embed"):
+        return await embed_async(cleaned)
 
-    if not rows:
-        return
 
-    primary = rows[0]
-    primary.is_duplicate = 0
+# ---------------------------------------------------------
+# Shared insert path (clusters maintained incrementally)
+# ---------------------------------------------------------
+def insert_titles(db: Session, raws, normalized, vecs):
+    """
+    Inserts titles into their clusters (created on demand) and returns
+    (ids, is_duplicate flags). The first row of a brand-new cluster
+    becomes its primary; every other row is a duplicate, because an
+    existing cluster's primary is always older.
+    Does not commit.
+    """
+    vecs = np.asarray(vecs, dtype=np.float32)
+    clusters = get_or_create_clusters(db, normalized)
+
+    flags = []
+    claimed = set()
+    for norm in normalized:
+        if clusters[norm].primary_id is None and norm not in claimed:
+            claimed.add(norm)
+            flags.append(0)
+        else:
+            flags.append(1)
 
-    for r in rows[1:]:
-        r.is_duplicate = 1
+    # blob-less rows keep their vector in the title index's store only
+    keep_blobs = store_blobs(title_index.store)
 
-    db.commit()
+    ids = db.execute(
+        insert(Title).returning(Title.id, sort_by_parameter_order=True),
+        [
+            {
+                "title": raw,
+                "normalized_title": norm,
+                "cluster_id": clusters[norm].id,
+                "embedding": vec.tobytes() if keep_blobs else b"",
+                "is_duplicate": flag,
+            }
+            for raw, norm, vec, flag in zip(raws, normalized, vecs, flags)
+        ],
+    ).scalars().all()
+
+    add_members(db, clusters, normalized, ids, normalize_rows(vecs))
+    title_index.stage(db, ids, vecs)
+    record_inserts(db, len(ids), sum(flags), sum(len(raw) for raw in raws))
+
+    return ids, flags
 
 
 # ---------------------------------------------------------
 # Save a single title (OPTION A + CLUSTER LOCK)
 # ---------------------------------------------------------
-def save_title(db: Session, item):
-    raw = item.title
-    cleaned = clean_text(raw)
+@OPERATION_SECONDS.time("save_title")
+def save_title(db: Session, item, vec=None):
+    """
+    `vec`: embedding already computed by the caller (see embed_title()).
 
-    vec = np.array(get_embedding(cleaned), dtype=np.float32)
-    vec_bytes = vec.tobytes()
+    The model runs here, on the request's thread; the duplicate decision
+    and the insert run as one job of the database writer, so they see
+    every title committed (or queued ahead in the same group commit)
+    before them.
+    """
+    cleaned = _clean(item.title)
+    if exact_index.get(cleaned) is None:
+        vec = _vector(cleaned, vec)
 
-    best_row, best_score = _find_best_match(db, vec)
+    return write(db, lambda session: _save_title_tx(session, item.title, cleaned, vec))
 
-    if best_row and best_score >= SIMILARITY_THRESHOLD:
-        # semantic duplicate → inherit canonical cluster
-        normalized = best_row.normalized_title
-        is_duplicate = 1
-    else:
-        # new semantic cluster
+
+def _save_title_tx(db: Session, raw: str, cleaned: str, vec):
+    exact_row, exact_vec = _exact_match(db, cleaned)
+
+    if exact_row is not None:
+        # exact resubmission → its cluster, no model call
+        vec = exact_vec
         normalized = cleaned
-        is_duplicate = 0
+    else:
+        vec = _vector(cleaned, vec)
+        best_row, best_score = _find_best_match(db, vec)
+
+        if best_row and best_score >= SIMILARITY_THRESHOLD:
+            # semantic duplicate → inherit canonical cluster
+            normalized = best_row.normalized_title
+        else:
+            # new semantic cluster (joins it if the key already exists)
+            normalized = cleaned
+
+    # 🔒 canonical truth decided by the cluster's primary
+    with STAGE_SECONDS.time("insert"):
+        ids, flags = insert_titles(db, [raw], [normalized], vec[None, :])
 
-    obj = Title(
-        title=raw,
-        normalized_title=normalized,
-        embedding=vec_bytes,
-        is_duplicate=is_duplicate,
-    )
+    after_commit(db, lambda: _index_inserted(ids, [normalized], flags, "submit"))
 
-    db.add(obj)
-    db.commit()
-    db.refresh(obj)
+    return db.get(Title, ids[0])
 
-    # 🔒 enforce canonical truth AFTER insert
-    enforce_single_primary(db, normalized)
 
-    return obj
+def _index_inserted(ids, normalized, flags, path):
+    exact_index.add(normalized, ids, flags)
+
+    duplicates = sum(flags)
+    TITLES_TOTAL.inc(len(flags) - duplicates, path, "saved")
+    TITLES_TOTAL.inc(duplicates, path, "duplicate")
 
 
 # ---------------------------------------------------------
 # Check duplicate (READ ONLY)
 # ---------------------------------------------------------
-def check_duplicate(db: Session, item, threshold: float = SIMILARITY_THRESHOLD):
+@OPERATION_SECONDS.time("check_duplicate")
+def check_duplicate(
+    db: Session, item, threshold: float = SIMILARITY_THRESHOLD, vec=None
+):
     raw = item.title
-    cleaned = clean_text(raw)
-
-    vec = np.array(get_embedding(cleaned), dtype=np.float32)
+    cleaned = _clean(raw)
+
+    exact_row, _ = _exact_match(db, cleaned)
+    if exact_row is not None:
+        return {
+            "duplicate": True,
+            "score": 1.0,
+            "match_id": exact_row.id,
+            "canonical": exact_row.normalized_title,
+        }
+
+    vec = _vector(cleaned, vec)
     best_row, best_score = _find_best_match(db, vec)
 
     return {
@@ -123,80 +241,230 @@ def check_duplicate(db: Session, item, threshold: float = SIMILARITY_THRESHOLD):
 # ---------------------------------------------------------
 # Find similar titles (unchanged semantics)
 # ---------------------------------------------------------
-def find_similar_titles(db: Session, item, threshold: float = 0.75):
+@OPERATION_SECONDS.time("find_similar_titles")
+def find_similar_titles(db: Session, item, threshold: float = 0.75, vec=None):
     raw = item.title
-    cleaned = clean_text(raw)
-
-    vec = np.array(get_embedding(cleaned), dtype=np.float32)
-    results = []
-
-    for row in db.query(Title).all():
-        try:
-            stored = np.frombuffer(row.embedding, dtype=np.float32)
-            score = float(cosine_similarity([vec], [stored])[0][0])
-        except Exception:
-            continue
-
-        if score >= threshold:
-            results.append({
-                "id": row.id,
-                "title": row.title,
-                "score": round(score, 3),
-            })
+    cleaned = _clean(raw)
+
+    _, exact_vec = _exact_match(db, cleaned)
+    vec = exact_vec if exact_vec is not None else _vector(cleaned, vec)
+    with STAGE_SECONDS.time("similarity_scan"):
+        hits = get_title_index(db).above(vec, threshold)
+
+    if not hits:
+        return []
+
+    titles = {}
+    ids = [i for i, _ in hits]
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        titles.update(
+            db.query(Title.id, Title.title).filter(Title.id.in_(chunk)).all()
+        )
 
-    return sorted(results, key=lambda x: x["score"], reverse=True)
+    return [
+        {
+            "id": row_id,
+            "title": titles[row_id],
+            "score": round(score, 3),
+        }
+        for row_id, score in hits
+        if row_id in titles
+    ]
 
 
 # ---------------------------------------------------------
 # Bulk upload (EXACT SAME RULES + LOCK)
 # ---------------------------------------------------------
-def process_bulk_titles(db: Session, df: pd.DataFrame):
+def _bulk_decide(db: Session, cleaned, vecs):
+    """
+    Duplicate decision for every row of a chunk, identical to running
+    save_title() row by row: each row is compared with all stored titles
+    and with the earlier rows of the same chunk.
+    Returns (normalized titles, is_duplicate flags).
+    """
+    index = get_title_index(db)
+    stored_ids, stored_scores = index.best_many(vecs, threshold=SIMILARITY_THRESHOLD)
+
+    # earlier-rows-only similarity inside the chunk
+    unit = normalize_rows(vecs)
+    local = np.tril(unit @ unit.T, k=-1)
+
+    canon = {}
+    needed = {int(i) for i in stored_ids if i >= 0}
+    for start in range(0, len(needed), 500):
+        ids = list(needed)[start:start + 500]
+        canon.update(
+            db.query(Title.id, Title.normalized_title).filter(Title.id.in_(ids)).all()
+        )
+
+    normalized, flags = [], []
+    for n, text in enumerate(cleaned):
+        best_score = float(stored_scores[n])
+        source = int(stored_ids[n]) if stored_ids[n] >= 0 else None
+        norm = canon.get(source)
+
+        if n:
+            j = int(np.argmax(local[n, :n]))
+            # strictly better only: on ties the older (stored) row wins
+            if local[n, j] > best_score:
+                best_score = float(local[n, j])
+                norm = normalized[j]
+
+        if norm is not None and best_score >= SIMILARITY_THRESHOLD:
+            normalized.append(norm)
+            flags.append(1)
+        else:
+            normalized.append(text)
+            flags.append(0)
+
+    return normalized, flags
+
+
+def _bulk_embed(db: Session, cleaned):
+    """
+    Embeddings for a chunk; titles that are existing cluster keys reuse
+    their primary's stored vector and only the rest go to the model.
+    """
+    index = get_exact_index(db)
+    hits = {}
+    for n, text in enumerate(cleaned):
+        primary_id = index.get(text)
+        if primary_id is not None:
+            hits[n] = primary_id
+
+    stored = load_vectors(db, hits.values())
+    hits = {n: stored[p] for n, p in hits.items() if stored.get(p) is not None}
+
+    rest = [n for n in range(len(cleaned)) if n not in hits]
+    if not hits:
+        return get_embeddings(cleaned)
+
+    dim = len(next(iter(hits.values())))
+    vecs = np.empty((len(cleaned), dim), dtype=np.float32)
+    for n, vec in hits.items():
+        vecs[n] = vec
+    if rest:
+        embedded = get_embeddings([cleaned[n] for n in rest])
+        if embedded.shape[1] != dim:
+            # stored vectors come from another model; embed everything
+            return get_embeddings(cleaned)
+        vecs[rest] = embedded
+
+    return vecs
+
+
+def _bulk_title_chunks(frames):
+    """
+    (titles, frames_done) per embedding chunk; frames_done is set on the
+    last chunk of each frame (an empty one for frames without titles).
+    """
+    for n, df in enumerate(frames, start=1):
+        titles = df["title"].dropna().astype(str).tolist()
+        starts = range(0, len(titles), BULK_EMBED_CHUNK) or [0]
+        for start in starts:
+            end = start + BULK_EMBED_CHUNK
+            yield titles[start:end], (n if end >= len(titles) else None)
+
+
+def process_bulk_chunks(db: Session, frames, timings: dict = None, checkpoint=None):
+    """
+    Bulk insert with the same duplicate rules as save_title().
+
+    `frames` is any iterable of DataFrames with a "title" column (e.g.
+    iter_title_chunks()). Reading, cleaning and encoding run as pipeline
+    stages in background threads, so chunk N+1 is read and embedded
+    while chunk N is decided and written. Each chunk is one job of the
+    database writer (see database/writer.py): a single multi-row INSERT
+    plus one update per touched cluster, committed with whatever else
+    is queued.
+
+    `checkpoint(db, frames_done, summary)` runs inside the transaction
+    that writes the last rows of each frame, so progress recorded there
+    commits atomically with those rows (see services/bulk_service.py).
+    """
     summary = {
         "processed": 0,
         "duplicates": 0,
         "saved": 0,
     }
 
-    titles = df["title"].dropna().astype(str).tolist()
+    # the encode stage reads stored vectors on its own session
+    encode_db = Session(bind=db.get_bind())
 
-    for raw in titles:
-        summary["processed"] += 1
-        cleaned = clean_text(raw)
+    def clean(item):
+        chunk, frames_done = item
+        return chunk, frames_done, clean_texts(chunk)
 
-        vec = np.array(get_embedding(cleaned), dtype=np.float32)
-        best_row, best_score = _find_best_match(db, vec)
-
-        if best_row and best_score >= SIMILARITY_THRESHOLD:
-            normalized = best_row.normalized_title
-            is_duplicate = 1
-            summary["duplicates"] += 1
-        else:
-            normalized = cleaned
-            is_duplicate = 0
-            summary["saved"] += 1
-
-        obj = Title(
-            title=raw,
-            normalized_title=normalized,
-            embedding=vec.tobytes(),
-            is_duplicate=is_duplicate,
-        )
+    def encode(item):
+        chunk, frames_done, cleaned_chunk = item
+        if not chunk:
+            return chunk, frames_done, cleaned_chunk, None
+        try:
+            return chunk, frames_done, cleaned_chunk, _bulk_embed(encode_db, cleaned_chunk)
+        finally:
+            # never hold a read transaction across the writer's commits
+            encode_db.rollback()
+
+    def write_chunk(session, chunk, frames_done, cleaned_chunk, vecs):
+        if not chunk:
+            if checkpoint is not None and frames_done is not None:
+                checkpoint(session, frames_done, dict(summary))
+            return
+
+        normalized, flags = _bulk_decide(session, cleaned_chunk, vecs)
+
+        # 🔒 primaries come from the clusters table, no re-scan needed
+        ids, new_flags = insert_titles(session, chunk, normalized, vecs)
+
+        counts = {
+            "processed": summary["processed"] + len(chunk),
+            "duplicates": summary["duplicates"] + sum(flags),
+            "saved": summary["saved"] + len(flags) - sum(flags),
+        }
+        if checkpoint is not None and frames_done is not None:
+            checkpoint(session, frames_done, counts)
+
+        after_commit(session, lambda: _index_inserted(ids, normalized, new_flags, "bulk"))
+        return counts
+
+    try:
+        stages = [("clean", clean), ("encode", encode)]
+        for chunk, frames_done, cleaned_chunk, vecs in run_stages(
+            _bulk_title_chunks(frames), stages, timings=timings,
+            on_stage=BULK_CHUNK_SECONDS.observe,
+        ):
+            t0 = time.perf_counter()
+
+            # one writer job per chunk: decide + insert + checkpoint
+            # commit together
+            counts = write(
+                db,
+                lambda session: write_chunk(session, chunk, frames_done, cleaned_chunk, vecs),
+            )
+            if counts is not None:
+                summary.update(counts)
+
+            if chunk:
+                elapsed = time.perf_counter() - t0
+                BULK_CHUNK_SECONDS.observe(elapsed, "write")
+                if timings is not None:
+                    timings["write"] = timings.get("write", 0.0) + elapsed
+    finally:
+        encode_db.close()
 
-        db.add(obj)
-        db.commit()
+    return summary
 
-        # 🔒 enforce after EVERY insert
-        enforce_single_primary(db, normalized)
 
-    return summary
+def process_bulk_titles(db: Session, df: "pd.DataFrame"):
+    """
+    process_bulk_chunks() for a single DataFrame.
+    """
+    return process_bulk_chunks(db, [df])
 
 
 # ---------------------------------------------------------
 # Count duplicates
 # ---------------------------------------------------------
 def count_duplicates(db: Session):
-    return (
-        db.query(Title)
-        .filter(Title.is_duplicate == 1)
-        .count()
-    )
+    return get_stats(db).duplicates
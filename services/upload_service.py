@@ -0,0 +1,166 @@
+# services/upload_service.py
+"""
+Single-pass streaming of multipart file uploads.
+
+The request body is fed straight into python-multipart's parser: the
+file part is written to a uniquely named temp file and hashed (SHA-256)
+chunk by chunk as it arrives, so memory stays flat whatever the upload
+size and the file is never read back just to hash it.
+"""
+
+import hashlib
+import os
+import uuid
+from typing import Iterable, Optional
+
+import anyio
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+
+class UploadError(ValueError):
+    """Malformed upload or unsupported file (reported as HTTP 400)."""
+
+
+class StreamedUpload:
+    def __init__(self, path: str, filename: str, sha256: str, size: int):
+        self.path = path
+        self.filename = filename
+        self.sha256 = sha256
+        self.size = size
+
+
+class _FilePartWriter:
+    """
+    Multipart callbacks: keeps the first file part named `field`, drops
+    every other part. Data is queued here and written by the caller off
+    the event loop.
+    """
+
+    def __init__(self, field: str, directory: str, extensions: Optional[Iterable[str]]):
+        self.field = field
+        self.directory = directory
+        self.extensions = tuple(extensions) if extensions else None
+
+        self.filename = None
+        self.path = None
+        self.file = None
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.pending = []
+
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._capturing = False
+
+    # -----------------------------
+    # Parser callbacks
+    # -----------------------------
+    def on_part_begin(self):
+        self._disposition = b""
+        self._capturing = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if name != self.field or b"filename" not in options or self.file is not None:
+            return
+
+        filename = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+        ext = os.path.splitext(filename)[1].lower()
+        if self.extensions is not None and ext not in self.extensions:
+            # rejected before a single byte of the file is stored
+            raise UploadError(f"Unsupported file type '{ext or filename}'")
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.filename = filename
+        self.path = os.path.join(self.directory, f"upload-{uuid.uuid4().hex}{ext}")
+        self.file = open(self.path, "wb")
+        self._capturing = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._capturing:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self):
+        self._capturing = False
+
+    # -----------------------------
+    # Blocking I/O (threadpool)
+    # -----------------------------
+    def flush(self):
+        chunks, self.pending = self.pending, []
+        for chunk in chunks:
+            self.sha256.update(chunk)
+            self.file.write(chunk)
+            self.size += len(chunk)
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def stream_upload(
+    request: Request,
+    directory: str,
+    field: str = "file",
+    extensions: Optional[Iterable[str]] = None,
+) -> StreamedUpload:
+    """
+    Streams the `field` file of a multipart/form-data request into a
+    unique file under `directory`, hashing it on the way.
+
+    Raises UploadError for non-multipart bodies, a missing file part or
+    an extension outside `extensions`; no file is left behind then.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data upload")
+
+    writer = _FilePartWriter(field, directory, extensions)
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": writer.on_part_begin,
+        "on_part_data": writer.on_part_data,
+        "on_part_end": writer.on_part_end,
+        "on_header_field": writer.on_header_field,
+        "on_header_value": writer.on_header_value,
+        "on_header_end": writer.on_header_end,
+        "on_headers_finished": writer.on_headers_finished,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if writer.pending:
+                await anyio.to_thread.run_sync(writer.flush)
+        parser.finalize()
+        if writer.pending:
+            await anyio.to_thread.run_sync(writer.flush)
+
+        if writer.file is None:
+            raise UploadError(f"No file uploaded in form field '{field}'")
+        writer.file.close()
+    except MultipartParseError as e:
+        writer.discard()
+        raise UploadError(f"Malformed multipart body: {e}")
+    except BaseException:
+        writer.discard()
+        raise
+
+    return StreamedUpload(writer.path, writer.filename, writer.sha256.hexdigest(), writer.size)
@@ -0,0 +1,619 @@
+# services/vector_index.py
+
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from database.writer import after_commit, after_rollback
+from models.title import Title
+from services.ann_index import IVFIndex
+from services.vector_store import VectorStore, normalize_rows, open_title_store
+
+logger = logging.getLogger(__name__)
+
+LOAD_BATCH_SIZE = 10000
+
+# ==========================================================
+# Search mode
+# ==========================================================
+# exact -> brute-force dot product over every row (default)
+# ivf   -> inverted-file ANN once the index holds ANN_MIN_SIZE rows
+VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "exact").lower()
+ANN_MIN_SIZE = int(os.getenv("ANN_MIN_SIZE", "50000"))
+
+# Recall / latency knobs (IVF_NLIST=0 -> 2 * sqrt(rows))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+
+# Retrain once rows appended since the last build exceed this fraction
+ANN_REBUILD_RATIO = float(os.getenv("ANN_REBUILD_RATIO", "0.2"))
+
+# An approximate best score this close below the caller's threshold is
+# re-checked with an exact scan, so the duplicate decision never flips
+ANN_EXACT_MARGIN = float(os.getenv("ANN_EXACT_MARGIN", "0.05"))
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+def decode_embedding(raw):
+    """
+    Decodes a stored `titles.embedding` value.
+    Blobs are raw float32 bytes; older rows may hold JSON lists.
+    Returns None for empty / unreadable values (e.g. blobs dropped after
+    moving vectors into the vector store).
+    """
+    if raw is None or len(raw) == 0:
+        return None
+
+    try:
+        if isinstance(raw, str):
+            return np.asarray(json.loads(raw), dtype=np.float32)
+        return np.frombuffer(raw, dtype=np.float32)
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------
+# Resident index
+# ---------------------------------------------------------
+class VectorIndex:
+    """
+    Similarity index over every title embedding.
+
+    Vectors live in a VectorStore: unit-normalized rows aligned to title
+    ids (float32, float16 or int8), memory-mapped from disk for the shared
+    title index or held in RAM for ad-hoc indexes. A lookup is a blocked
+    dot product over the stored rows; readers never block writers.
+
+    With several uvicorn workers every process maps the same segment
+    files, so the vectors sit once in the page cache. Each worker writes
+    the titles it inserts and picks up the others' through the store's
+    generation number.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore = None,
+        mode: str = VECTOR_INDEX_MODE,
+        ann_min_size: int = ANN_MIN_SIZE,
+        nlist: int = IVF_NLIST,
+        nprobe: int = IVF_NPROBE,
+    ):
+        self._lock = threading.RLock()
+        self._store = store if store is not None else VectorStore()
+
+        # highest title id known to be in the store (or vector-less)
+        self._loaded = False
+        self._watermark = 0
+
+        # ivf mode serves queries once this many vectors are stored
+        # (0 -> always, e.g. for recall measurements on small corpora)
+        self.mode = mode
+        self.ann_min_size = ann_min_size
+        self._ann = IVFIndex(nlist=nlist, nprobe=nprobe)
+        self._ann_building = False
+
+        # (store generation, size) -> stored vectors
+        self._counted = (None, 0)
+
+    def __len__(self):
+        key = (self._store.generation, self._store.size)
+        if self._counted[0] != key:
+            # count() scans the presence flags; only redo it after writes
+            self._counted = (key, self._store.count())
+        return self._counted[1]
+
+    @property
+    def dim(self):
+        return self._store.dim
+
+    @property
+    def store(self) -> VectorStore:
+        return self._store
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def add(self, ids, vecs):
+        """
+        Adds freshly inserted titles (ids must already be committed).
+        Rewriting a row that is already stored is harmless.
+        """
+        ids = [int(i) for i in ids]
+        if ids:
+            self._store.put(ids, vecs)
+
+    def stage(self, db: Session, ids, vecs):
+        """
+        Adds titles inserted by the current writer job once its
+        transaction commits (nothing reaches the store if it rolls back).
+        Until then get_title_index(db) shows them to the later jobs of
+        the same transaction.
+        """
+        if not len(ids):
+            return
+
+        vecs = np.asarray(vecs, dtype=np.float32)
+        block = (np.asarray(ids, dtype=np.int64), normalize_rows(vecs))
+        blocks = db.info.setdefault("staged_vectors", [])
+        blocks.append(block)
+
+        after_commit(db, lambda: self.add(block[0], vecs))
+        after_rollback(db, lambda: blocks.__setitem__(
+            slice(None), [b for b in blocks if b is not block]
+        ))
+
+    @staticmethod
+    def staged(db: Session):
+        """
+        (ids, unit vectors) staged by the writer transaction of `db`, in
+        insertion (= id) order, or None.
+        """
+        blocks = db.info.get("staged_vectors")
+        if not blocks:
+            return None
+        return (
+            np.concatenate([ids for ids, _ in blocks]),
+            np.vstack([unit for _, unit in blocks]),
+        )
+
+    def _check_store(self, db: Session):
+        """
+        Drops a persisted store that does not belong to this database
+        (e.g. titles.db was replaced): its synced watermark is beyond the
+        last title, or its vector for that title differs from the blob.
+        """
+        synced = self._store.synced
+        if not synced:
+            return
+
+        row = db.query(Title.id, Title.embedding).filter(Title.id == synced).first()
+        stale = row is None
+        if not stale:
+            blob = decode_embedding(row.embedding)
+            if blob is not None and blob.shape[0] == self._store.dim:
+                stored = self._store.rows([synced])[0]
+                stale = float(stored @ normalize_rows(blob)[0]) < 0.99
+
+        if stale:
+            logger.warning("Vector store does not match the titles table; rebuilding")
+            self._store.reset()
+
+    def refresh(self, db: Session):
+        """
+        Catches up with titles committed since the last call.
+
+        Rows written to the shared store by other processes are picked up
+        from the store itself; only ids the store still lacks (first run,
+        titles written by processes without a store, crashed writers) are
+        read back from titles.embedding, by one process at a time.
+
+        Called inside the writer transaction, rows it staged are not
+        committed yet: they are neither loaded nor passed by the
+        watermark (stage() publishes them after the commit).
+        """
+        staged = self.staged(db)
+        first_staged = int(staged[0].min()) if staged is not None else None
+
+        with self._lock:
+            self._store.reload()
+
+            if not self._loaded:
+                self._check_store(db)
+                self._watermark = self._store.synced
+            elif self._store.synced < self._watermark:
+                # another process reset the store
+                logger.warning("Vector store was reset; reloading from the database")
+                self._watermark = 0
+
+            ids = [
+                row_id for (row_id,) in db.query(Title.id)
+                .filter(Title.id > self._watermark)
+                .order_by(Title.id.asc())
+            ]
+            if first_staged is not None:
+                ids = [i for i in ids if i < first_staged]
+
+            loaded = 0
+            if ids and self._missing(ids):
+                with self._store.exclusive():
+                    # a concurrent refresh may have loaded them meanwhile
+                    self._store.reload()
+                    missing = self._missing(ids)
+                    if missing:
+                        loaded = self._load(db, missing)
+
+            if ids:
+                self._watermark = ids[-1]
+                self._store.synced = self._watermark
+
+            if not self._loaded:
+                self._loaded = True
+                logger.info(
+                    "Vector index ready: %d titles (%s store, %d loaded from the database)",
+                    len(self), self._store.dtype, loaded,
+                )
+
+            return loaded
+
+    def _missing(self, ids):
+        """Ids whose store row is empty."""
+        ids = np.asarray(ids, dtype=np.int64)
+        return ids[~self._store.has(ids)].tolist()
+
+    def _load(self, db: Session, missing):
+        """Copies titles.embedding of `missing` (ascending ids) into the store."""
+        wanted = set(missing)
+        query = (
+            db.query(Title.id, Title.embedding)
+            .filter(Title.id >= missing[0], Title.id <= missing[-1])
+            .order_by(Title.id.asc())
+        )
+
+        ids, vecs = [], []
+        loaded = 0
+        for row_id, raw in query.yield_per(LOAD_BATCH_SIZE):
+            if row_id not in wanted:
+                continue
+
+            vec = decode_embedding(raw)
+            if vec is None:
+                continue
+
+            ids.append(row_id)
+            vecs.append(vec)
+
+            if len(ids) >= LOAD_BATCH_SIZE:
+                self._put_batch(ids, vecs)
+                loaded += len(ids)
+                ids, vecs = [], []
+
+        if ids:
+            self._put_batch(ids, vecs)
+            loaded += len(ids)
+
+        return loaded
+
+    def _put_batch(self, ids, vecs):
+        # Rows from a different embedding model can never match
+        dim = self._store.dim or len(vecs[0])
+        keep = [n for n, v in enumerate(vecs) if len(v) == dim]
+        if keep:
+            self._store.put([ids[n] for n in keep], np.vstack([vecs[n] for n in keep]))
+
+    def vectors(self, ids):
+        """
+        {id: float32 unit vector} for the given titles that are indexed.
+        """
+        ids = [int(i) for i in ids]
+        size = self._store.size
+        inside = [i for i in ids if 0 <= i < size]
+        if not inside:
+            return {}
+
+        rows = self._store.rows(inside)
+        present = np.any(rows != 0, axis=1)
+        return {i: rows[n] for n, i in enumerate(inside) if present[n]}
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def _snapshot(self):
+        """
+        (float32 matrix view over ids [0, size), size); rows of ids
+        without a vector are zero.
+        """
+        size = self._store.size
+        if not size or self._store.dim is None:
+            return None, 0
+        return self._store.matrix(size), size
+
+    # -----------------------------
+    # ANN
+    # -----------------------------
+    @property
+    def nprobe(self) -> int:
+        return self._ann.nprobe
+
+    @nprobe.setter
+    def nprobe(self, value: int):
+        self._ann.nprobe = value
+
+    def ann_eligible(self) -> bool:
+        """Whether lookups go through IVF once it is built."""
+        return self.mode == "ivf" and len(self) >= self.ann_min_size
+
+    def ann_info(self) -> dict:
+        return {
+            "mode": self.mode,
+            "eligible": self.ann_eligible(),
+            "ready": self._ann.ready,
+            "nlist": self._ann.cells,
+            "nprobe": self._ann.nprobe,
+            "trained_size": self._ann.trained_size,
+        }
+
+    def build_ann(self) -> float:
+        """
+        Trains the IVF index now, in the calling thread (lookups otherwise
+        schedule it in the background). Returns the build time in seconds.
+        """
+        matrix, _ = self._snapshot()
+        if matrix is None:
+            raise ValueError("Cannot build an IVF index over an empty store")
+
+        started = time.perf_counter()
+        self._ann.build(matrix)
+        return time.perf_counter() - started
+
+    def _active_ann(self, size: int):
+        """
+        Returns the IVF index when it should serve queries, scheduling a
+        background (re)build when it is missing or stale.
+        """
+        if not self.ann_eligible():
+            return None
+
+        ann = self._ann
+        stale = size - ann.trained_size > ANN_REBUILD_RATIO * ann.trained_size
+        if (not ann.ready or stale) and not self._ann_building:
+            self._ann_building = True
+            threading.Thread(target=self._build_ann, daemon=True).start()
+
+        return ann if ann.ready else None
+
+    def _build_ann(self):
+        try:
+            matrix, _ = self._snapshot()
+            if matrix is not None:
+                self._ann.build(matrix)
+        except Exception:
+            logger.exception("IVF index build failed")
+        finally:
+            self._ann_building = False
+
+    # -----------------------------
+    # Scoring
+    # -----------------------------
+    def _score(self, vec: np.ndarray, exact: bool = False):
+        """
+        (scores, ids, approximate). Exact scans score every id in
+        [0, size), so `ids` is None (score index == title id).
+        """
+        size = self._store.size
+        vec = np.asarray(vec, dtype=np.float32).ravel()
+        if not size or vec.shape[0] != self._store.dim:
+            return None, None, False
+
+        query = normalize_rows(vec)[0]
+        ann = None if exact else self._active_ann(size)
+        if ann is None:
+            return self._store.scores(query, size), None, False
+
+        positions = ann.candidates(query, size)
+        return self._store.rows(positions) @ query, positions, True
+
+    def scores(self, vec: np.ndarray, exact: bool = False):
+        """
+        Cosine similarity of `vec` against indexed titles (every title in
+        exact mode, probed candidates in ivf mode).
+        Returns (scores, ids) or (None, None) when nothing is comparable;
+        ids without a vector score 0.
+        """
+        sims, ids, _ = self._score(vec, exact)
+        if sims is not None and ids is None:
+            ids = np.arange(sims.shape[0], dtype=np.int64)
+        return sims, ids
+
+    def best(self, vec: np.ndarray, threshold: float = None, exact: bool = False):
+        """
+        Returns (title_id | None, score) of the closest title.
+        Non-positive scores are treated as no match.
+
+        With `threshold`, an approximate result that lands just below it is
+        confirmed by an exact scan.
+        """
+        sims, ids, approximate = self._score(vec, exact)
+        if sims is None or not sims.shape[0]:
+            return None, 0.0
+
+        idx = int(np.argmax(sims))
+        score = float(sims[idx])
+
+        if (
+            approximate
+            and threshold is not None
+            and threshold - ANN_EXACT_MARGIN <= score < threshold
+        ):
+            return self.best(vec, exact=True)
+
+        if score <= 0:
+            return None, 0.0
+
+        return (idx if ids is None else int(ids[idx])), score
+
+    def best_many(self, vecs: np.ndarray, threshold: float = None, block: int = 32):
+        """
+        best() for many queries at once: (ids, scores) arrays, id -1 where
+        nothing matched. Exact mode scores `block` queries per pass over
+        the store instead of one matrix-vector product each.
+        """
+        vecs = np.asarray(vecs, dtype=np.float32)
+        ids = np.full(len(vecs), -1, dtype=np.int64)
+        scores = np.zeros(len(vecs), dtype=np.float32)
+
+        size = self._store.size
+        if not size or not len(vecs) or vecs.shape[1] != self._store.dim:
+            return ids, scores
+
+        if self._active_ann(size) is not None:
+            for n, vec in enumerate(vecs):
+                best_id, score = self.best(vec, threshold=threshold)
+                ids[n] = -1 if best_id is None else best_id
+                scores[n] = score
+            return ids, scores
+
+        queries = normalize_rows(vecs)
+        for start in range(0, len(queries), block):
+            batch = queries[start:start + block]
+            top_scores = np.full(len(batch), -np.inf, dtype=np.float32)
+            top_ids = np.zeros(len(batch), dtype=np.int64)
+
+            for row_start, sims in self._store.score_blocks(batch, size):
+                arg = np.argmax(sims, axis=0)
+                vals = sims[arg, np.arange(sims.shape[1])]
+                # strictly greater: the lowest id wins ties, like argmax
+                better = vals > top_scores
+                top_scores[better] = vals[better]
+                top_ids[better] = row_start + arg[better]
+
+            hit = top_scores > 0
+            end = start + len(batch)
+            ids[start:end] = np.where(hit, top_ids, -1)
+            scores[start:end] = np.where(hit, top_scores, 0.0)
+
+        return ids, scores
+
+    def search(self, vec: np.ndarray, k: int = 10, exact: bool = False):
+        """
+        Top-k (title_id, score) pairs, best first.
+        """
+        sims, ids = self.scores(vec, exact)
+        if sims is None or not sims.shape[0]:
+            return []
+
+        # ids without a stored vector are not candidates
+        present = self._store.present()
+        keep = np.flatnonzero(present[ids])
+        if not keep.shape[0]:
+            return []
+        sims, ids = sims[keep], ids[keep]
+
+        k = min(k, sims.shape[0])
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(int(ids[i]), float(sims[i])) for i in top]
+
+    def above(self, vec: np.ndarray, threshold: float, exact: bool = False):
+        """
+        All (title_id, score) pairs with score >= threshold, best first.
+        """
+        sims, ids = self.scores(vec, exact)
+        if sims is None:
+            return []
+
+        hits = np.flatnonzero(sims >= threshold)
+        hits = hits[np.argsort(-sims[hits], kind="stable")]
+        return [(int(ids[i]), float(sims[i])) for i in hits]
+
+
+class _StagedIndex:
+    """
+    The title index plus the rows staged by the current writer
+    transaction (VectorIndex.stage()), scanned exactly. Staged ids are
+    newer than every stored one, so stored rows win ties.
+    """
+
+    def __init__(self, index: VectorIndex, ids: np.ndarray, unit: np.ndarray):
+        self._index = index
+        self._ids = ids
+        self._unit = unit
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+    def _sims(self, vecs: np.ndarray):
+        """(queries, staged rows) cosine matrix, or None on a dim mismatch."""
+        if vecs.shape[1] != self._unit.shape[1]:
+            return None
+        return normalize_rows(vecs) @ self._unit.T
+
+    def best(self, vec: np.ndarray, threshold: float = None, exact: bool = False):
+        best_id, score = self._index.best(vec, threshold=threshold, exact=exact)
+
+        sims = self._sims(np.asarray(vec, dtype=np.float32).reshape(1, -1))
+        if sims is not None:
+            idx = int(np.argmax(sims[0]))
+            if sims[0, idx] > max(score, 0.0):
+                return int(self._ids[idx]), float(sims[0, idx])
+
+        return best_id, score
+
+    def best_many(self, vecs: np.ndarray, threshold: float = None, block: int = 32):
+        ids, scores = self._index.best_many(vecs, threshold=threshold, block=block)
+
+        vecs = np.asarray(vecs, dtype=np.float32)
+        sims = self._sims(vecs) if len(vecs) else None
+        if sims is not None:
+            arg = np.argmax(sims, axis=1)
+            vals = sims[np.arange(len(vecs)), arg]
+            better = vals > np.maximum(scores, 0.0)
+            ids[better] = self._ids[arg[better]]
+            scores[better] = vals[better]
+
+        return ids, scores
+
+    def above(self, vec: np.ndarray, threshold: float, exact: bool = False):
+        hits = self._index.above(vec, threshold, exact)
+
+        sims = self._sims(np.asarray(vec, dtype=np.float32).reshape(1, -1))
+        if sims is not None:
+            keep = np.flatnonzero(sims[0] >= threshold)
+            hits += [(int(self._ids[i]), float(sims[0, i])) for i in keep]
+            hits.sort(key=lambda hit: -hit[1])
+
+        return hits
+
+
+# Shared per-process instance (see services/vector_store.py for storage)
+title_index = VectorIndex(store=open_title_store())
+
+
+def get_title_index(db: Session) -> VectorIndex:
+    """
+    Returns the process index, caught up with rows committed elsewhere
+    (plus, inside the writer, the rows its transaction staged).
+    """
+    title_index.refresh(db)
+    staged = title_index.staged(db)
+    if staged is None:
+        return title_index
+    return _StagedIndex(title_index, *staged)
+
+
+def load_vectors(db: Session, ids):
+    """
+    {id: float32 unit vector} for stored titles: from the vector store,
+    falling back to titles.embedding blobs.
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    found = title_index.vectors(ids)
+
+    staged = title_index.staged(db)
+    if staged is not None:
+        wanted = set(ids)
+        for row_id, unit in zip(staged[0].tolist(), staged[1]):
+            if row_id in wanted:
+                found.setdefault(row_id, unit)
+
+    missing = [i for i in ids if i not in found]
+    for start in range(0, len(missing), 500):
+        chunk = missing[start:start + 500]
+        for row_id, raw in db.query(Title.id, Title.embedding).filter(Title.id.in_(chunk)):
+            vec = decode_embedding(raw)
+            if vec is not None:
+                found[row_id] = normalize_rows(vec)[0]
+
+    missing = [i for i in ids if i not in found]
+    if missing:
+        # written by another process since the last refresh
+        title_index.refresh(db)
+        found.update(title_index.vectors(missing))
+
+    return found
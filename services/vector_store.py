@@ -0,0 +1,637 @@
+# services/vector_store.py
+"""
+Column-oriented, id-aligned embedding storage.
+
+Row `i` of the store holds the unit-normalized vector of title id `i`;
+ids that were never written are all-zero rows with scale 0. Rows live in
+fixed-size segments of VECTOR_SEGMENT_ROWS, each a pair of memory-mapped
+.npy files:
+
+    seg-00000.codes.npy    (rows, dim)  float32 | float16 | int8
+    seg-00000.scales.npy   (rows,)      float32
+
+float32 / float16 rows hold the unit vector itself (scale 1.0); int8 rows
+hold round(v / s) with s = max|v| / 127 per row. Scoring is a blocked
+dot product over the mapped codes times the row scale: float32 is read
+zero-copy, the compact formats are widened one block at a time.
+
+Usage:
+    python -m services.vector_store migrate                 # copy blobs in
+    python -m services.vector_store migrate --drop-blobs    # ...then empty them
+    python -m services.vector_store info
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+# "" keeps the title index in RAM only (rebuilt from titles.embedding)
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", str(BASE_DIR / "vector_store"))
+
+# float32 (exact), float16 (2x smaller) or int8 (4x smaller, per-row scale)
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32").lower()
+
+VECTOR_SEGMENT_ROWS = int(os.getenv("VECTOR_SEGMENT_ROWS", "131072"))
+
+# Also keep the float32 blob in titles.embedding (the store can be rebuilt
+# from it). Only honoured with an on-disk store.
+STORE_EMBEDDING_BLOBS = os.getenv("STORE_EMBEDDING_BLOBS", "true").lower() == "true"
+
+# Rows widened / scored per step
+SCORE_BLOCK = 16384
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# header.npy slots
+_GENERATION, _SIZE, _SYNCED, _DIM = range(4)
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+def normalize_rows(vecs: np.ndarray) -> np.ndarray:
+    """
+    L2-normalizes each row. Zero vectors stay zero (cosine 0),
+    matching sklearn's cosine_similarity behaviour.
+    """
+    vecs = np.asarray(vecs, dtype=np.float32)
+    if vecs.ndim == 1:
+        vecs = vecs[None, :]
+
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vecs / norms, dtype=np.float32)
+
+
+def quantize(unit: np.ndarray, dtype: str):
+    """
+    (codes, scales) for unit rows in the given storage format.
+    """
+    if dtype == "int8":
+        scales = (np.abs(unit).max(axis=1) / 127.0).astype(np.float32)
+        safe = np.where(scales > 0, scales, 1.0)
+        codes = np.rint(unit / safe[:, None]).astype(np.int8)
+        return codes, scales
+
+    return unit.astype(DTYPES[dtype]), np.ones(unit.shape[0], dtype=np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "float32":
+        return np.asarray(codes)
+    rows = codes.astype(np.float32)
+    if dtype == "int8":
+        rows *= scales[:, None]
+    return rows
+
+
+class StoreMatrix:
+    """
+    Read-only (size, dim) float32 view of a store, for code written
+    against a plain matrix (IVF training / assignment).
+    """
+
+    def __init__(self, store, size: int):
+        self._store = store
+        self.shape = (size, store.dim)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.shape[0])
+            if step == 1:
+                return self._store.range(start, stop)
+            key = np.arange(start, stop, step)
+        return self._store.rows(np.asarray(key, dtype=np.int64))
+
+
+# ---------------------------------------------------------
+# Store
+# ---------------------------------------------------------
+class VectorStore:
+    """
+    Segmented id-aligned vector file set (or its in-RAM equivalent when
+    `directory` is None).
+
+    Writes from several processes (uvicorn workers, RQ jobs) are
+    serialized with an exclusive lock on `store.lock`, so there is one
+    writer at a time. Each write bumps the generation in header.npy;
+    `size` is this process's view and advances on its own writes and on
+    reload(), which maps only what other writers added.
+    """
+
+    def __init__(self, directory=None, dtype: str = "float32", segment_rows: int = VECTOR_SEGMENT_ROWS):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector store dtype '{dtype}'")
+
+        self.directory = Path(directory) / dtype if directory else None
+        self.dtype = dtype
+        self.segment_rows = segment_rows
+        self.dim = None
+
+        self._lock = threading.RLock()
+        self._segments = []
+        self._header = np.zeros(4, dtype=np.int64)
+        self._generation = 0
+        self._size = 0
+        self._lock_depth = 0
+
+        if self.directory is not None and (self.directory / "meta.json").exists():
+            self._open()
+
+    @property
+    def persistent(self) -> bool:
+        return self.directory is not None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def generation(self) -> int:
+        """Writes published so far (as seen by this process)."""
+        return self._generation
+
+    @property
+    def synced(self) -> int:
+        """Highest titles.id known to be copied from the database."""
+        return int(self._header[_SYNCED])
+
+    @synced.setter
+    def synced(self, value: int):
+        with self._locked():
+            self.reload()
+            self._header[_SYNCED] = max(int(self._header[_SYNCED]), int(value))
+            self._flush_header()
+
+    # -----------------------------
+    # Files
+    # -----------------------------
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    @contextmanager
+    def _locked(self):
+        # re-entrant: a second flock() on a new descriptor would wait on
+        # the one this thread already holds
+        with self._lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth > 1 or not self.persistent or fcntl is None:
+                    yield
+                    return
+
+                self.directory.mkdir(parents=True, exist_ok=True)
+                with open(self._path("store.lock"), "a") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            finally:
+                self._lock_depth -= 1
+
+    def exclusive(self):
+        """
+        Context manager making the caller the store's only writer (across
+        processes) until it exits; put() calls inside it do not re-lock.
+        """
+        return self._locked()
+
+    def _flush_header(self):
+        if isinstance(self._header, np.memmap):
+            self._header.flush()
+
+    def _open(self):
+        meta = json.loads(self._path("meta.json").read_text())
+        if meta["segment_rows"] != self.segment_rows:
+            self.segment_rows = meta["segment_rows"]
+
+        self.dim = meta["dim"]
+        self._header = np.load(self._path("header.npy"), mmap_mode="r+")
+        self._generation = int(self._header[_GENERATION])
+        self._segments = []
+        self._map_segments()
+        self._size = int(self._header[_SIZE])
+
+    def _create(self, dim: int):
+        self.dim = dim
+        if not self.persistent:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if (self._path("meta.json")).exists():
+            # created meanwhile by another process
+            self._open()
+            return
+
+        header = np.lib.format.open_memmap(
+            self._path("header.npy"), mode="w+", dtype=np.int64, shape=(4,)
+        )
+        header[_DIM] = dim
+        header.flush()
+        self._header = header
+
+        # meta.json last: its presence marks a complete store
+        self._path("meta.json").write_text(json.dumps({
+            "dtype": self.dtype,
+            "dim": dim,
+            "segment_rows": self.segment_rows,
+        }))
+
+    def _segment_files(self, k: int):
+        return (
+            self._path(f"seg-{k:05d}.codes.npy"),
+            self._path(f"seg-{k:05d}.scales.npy"),
+        )
+
+    def _map_segments(self):
+        while True:
+            codes_path, scales_path = self._segment_files(len(self._segments))
+            if not (codes_path.exists() and scales_path.exists()):
+                return
+            self._segments.append((
+                np.load(codes_path, mmap_mode="r+"),
+                np.load(scales_path, mmap_mode="r+"),
+            ))
+
+    def _segment(self, k: int):
+        """Segment k, creating it (and any before it) if needed."""
+        while len(self._segments) <= k:
+            n = len(self._segments)
+            shape = (self.segment_rows, self.dim)
+
+            if not self.persistent:
+                self._segments.append((
+                    np.zeros(shape, dtype=DTYPES[self.dtype]),
+                    np.zeros(self.segment_rows, dtype=np.float32),
+                ))
+                continue
+
+            codes_path, scales_path = self._segment_files(n)
+            if not scales_path.exists():
+                # sparse files: untouched rows take no disk space. Written
+                # under a temp name and renamed, codes first, so readers
+                # only ever map complete segments.
+                for path, dtype, seg_shape in (
+                    (codes_path, DTYPES[self.dtype], shape),
+                    (scales_path, np.float32, (self.segment_rows,)),
+                ):
+                    tmp = path.with_suffix(".tmp")
+                    np.lib.format.open_memmap(
+                        tmp, mode="w+", dtype=dtype, shape=seg_shape
+                    ).flush()
+                    os.replace(tmp, path)
+            self._map_segments()
+
+        return self._segments[k]
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def put(self, ids, vecs):
+        """
+        Stores the unit-normalized `vecs` at rows `ids` (overwriting).
+        Rows whose dimension differs from the store's are skipped.
+        """
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        vecs = np.asarray(vecs, dtype=np.float32)
+        if vecs.ndim == 1:
+            vecs = vecs[None, :]
+        if not len(ids):
+            return
+
+        with self._locked():
+            self.reload()
+            if self.dim is None:
+                self._create(vecs.shape[1])
+            if vecs.shape[1] != self.dim:
+                logger.debug("Skipping %d vectors of dim %d", len(ids), vecs.shape[1])
+                return
+
+            codes, scales = quantize(normalize_rows(vecs), self.dtype)
+
+            segments = ids // self.segment_rows
+            offsets = ids % self.segment_rows
+            for k in np.unique(segments):
+                mask = segments == k
+                seg_codes, seg_scales = self._segment(int(k))
+                seg_codes[offsets[mask]] = codes[mask]
+                seg_scales[offsets[mask]] = scales[mask]
+                if self.persistent:
+                    seg_codes.flush()
+                    seg_scales.flush()
+
+            # publish after the rows are in place
+            self._size = max(self._size, int(ids.max()) + 1)
+            self._header[_SIZE] = max(int(self._header[_SIZE]), self._size)
+            self._header[_GENERATION] += 1
+            self._generation = int(self._header[_GENERATION])
+            self._flush_header()
+
+    def reset(self):
+        """
+        Drops every stored vector (e.g. the database was replaced).
+        """
+        with self._locked():
+            self.reload()
+            if isinstance(self._header, np.memmap):
+                # tombstone for processes still mapping these files
+                self._header[_GENERATION] = -1
+                self._header.flush()
+
+            self._segments = []
+            self._size = 0
+            self.dim = None
+            self._header = np.zeros(4, dtype=np.int64)
+            self._generation = 0
+            if self.persistent and self.directory.exists():
+                for path in self.directory.iterdir():
+                    if path.name != "store.lock":
+                        path.unlink()
+
+    # -----------------------------
+    # Readers
+    # -----------------------------
+    def _replaced(self) -> bool:
+        """The mapped files were dropped by reset() in another process."""
+        return int(self._header[_GENERATION]) < 0
+
+    def reload(self) -> bool:
+        """
+        Picks up rows published by other processes: maps segments created
+        since the last look and advances `size` to the published one.
+        Mapped segments are never re-read; their new rows are already
+        visible through the shared mapping. Returns True when anything
+        changed.
+        """
+        if not self.persistent:
+            return False
+
+        with self._lock:
+            if self._replaced():
+                self._segments = []
+                self._size = 0
+                self.dim = None
+                self._header = np.zeros(4, dtype=np.int64)
+                self._generation = 0
+                if (self.directory / "meta.json").exists():
+                    self._open()
+                return True
+
+            if self.dim is None:
+                if not (self.directory / "meta.json").exists():
+                    return False
+                self._open()
+                return True
+
+            generation = int(self._header[_GENERATION])
+            if generation == self._generation:
+                return False
+
+            self._map_segments()
+            self._size = max(self._size, int(self._header[_SIZE]))
+            self._generation = generation
+            return True
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def _views(self, size: int):
+        """(start_id, codes, scales) per segment, clipped to `size`."""
+        segments = list(self._segments)
+        for k, (codes, scales) in enumerate(segments):
+            start = k * self.segment_rows
+            if start >= size:
+                break
+            end = min(self.segment_rows, size - start)
+            yield start, codes[:end], scales[:end]
+
+    def blocks(self, size: int = None, block: int = SCORE_BLOCK):
+        """
+        Yields (start_id, codes, scales) in blocks of at most `block`
+        rows; codes are zero-copy views of the mapped segments.
+        """
+        size = self._size if size is None else size
+        for start, codes, scales in self._views(size):
+            for b in range(0, codes.shape[0], block):
+                yield start + b, codes[b:b + block], scales[b:b + block]
+
+    def scores(self, query: np.ndarray, size: int = None) -> np.ndarray:
+        """
+        Dot product of a unit query with rows [0, size); 0 for empty rows.
+        """
+        size = self._size if size is None else size
+        out = np.zeros(size, dtype=np.float32)
+        for start, codes, scales in self.blocks(size):
+            sims = (codes if self.dtype == "float32" else codes.astype(np.float32)) @ query
+            if self.dtype == "int8":
+                sims *= scales
+            out[start:start + sims.shape[0]] = sims
+        return out
+
+    def score_blocks(self, queries: np.ndarray, size: int = None):
+        """
+        Yields (start_id, sims) with sims = rows @ queries.T per block.
+        """
+        queries_t = np.ascontiguousarray(queries.T)
+        for start, codes, scales in self.blocks(size):
+            sims = (codes if self.dtype == "float32" else codes.astype(np.float32)) @ queries_t
+            if self.dtype == "int8":
+                sims *= scales[:, None]
+            yield start, sims
+
+    def rows(self, ids) -> np.ndarray:
+        """
+        float32 unit rows for `ids` (zeros for ids never written).
+        """
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        out = np.zeros((len(ids), self.dim or 0), dtype=np.float32)
+        if not len(ids) or self.dim is None:
+            return out
+
+        segments = ids // self.segment_rows
+        offsets = ids % self.segment_rows
+        available = list(self._segments)
+        for k in np.unique(segments):
+            if k >= len(available):
+                continue
+            mask = segments == k
+            codes, scales = available[k]
+            out[mask] = dequantize(codes[offsets[mask]], scales[offsets[mask]], self.dtype)
+        return out
+
+    def range(self, start: int, stop: int) -> np.ndarray:
+        return self.rows(np.arange(start, stop, dtype=np.int64))
+
+    def present(self, size: int = None) -> np.ndarray:
+        """Boolean mask over [0, size): row holds a vector."""
+        size = self._size if size is None else size
+        out = np.zeros(size, dtype=bool)
+        for start, _, scales in self._views(size):
+            out[start:start + scales.shape[0]] = scales > 0
+        return out
+
+    def has(self, ids) -> np.ndarray:
+        """Boolean per id: its row holds a vector."""
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        out = np.zeros(len(ids), dtype=bool)
+        segments = ids // self.segment_rows
+        offsets = ids % self.segment_rows
+        available = list(self._segments)
+        for k in np.unique(segments):
+            if k < len(available):
+                mask = segments == k
+                out[mask] = available[k][1][offsets[mask]] > 0
+        return out
+
+    def count(self) -> int:
+        return int(self.present().sum())
+
+    def matrix(self, size: int = None) -> StoreMatrix:
+        return StoreMatrix(self, self._size if size is None else size)
+
+    def nbytes(self) -> int:
+        """Bytes of mapped codes + scales (file size, not disk usage)."""
+        return sum(c.nbytes + s.nbytes for c, s in self._segments)
+
+    def info(self) -> dict:
+        return {
+            "dtype": self.dtype,
+            "dim": self.dim,
+            "persistent": self.persistent,
+            "size": self.size,
+            "vectors": self.count(),
+            "synced": self.synced,
+            "generation": self.generation,
+            "bytes": self.nbytes(),
+            "disk_bytes": self.disk_bytes(),
+        }
+
+    def disk_bytes(self) -> int:
+        """Bytes actually allocated on disk (segments are sparse)."""
+        if not self.persistent or not self.directory.exists():
+            return 0
+        return sum(p.stat().st_blocks * 512 for p in self.directory.glob("seg-*.npy"))
+
+
+def open_title_store() -> VectorStore:
+    """
+    The store behind the shared title index, per VECTOR_STORE_* env.
+    """
+    return VectorStore(VECTOR_STORE_DIR or None, VECTOR_STORE_DTYPE)
+
+
+def store_blobs(store: VectorStore) -> bool:
+    """
+    Whether new titles also keep their float32 blob in titles.embedding.
+    Always true for an in-RAM store (the blob is the only durable copy).
+    """
+    return STORE_EMBEDDING_BLOBS or not store.persistent
+
+
+# ---------------------------------------------------------
+# Migration
+# ---------------------------------------------------------
+def migrate(db, store: VectorStore, drop_blobs: bool = False, batch_size: int = 10000):
+    """
+    Copies every titles.embedding blob into `store`; with `drop_blobs`,
+    then empties the blobs of titles whose vector is in the store.
+    Returns a summary dict.
+    """
+    from sqlalchemy import text
+    from models.title import Title
+    from services.vector_index import decode_embedding
+
+    copied = blob_bytes = last = 0
+    ids, vecs = [], []
+
+    query = db.query(Title.id, Title.embedding).order_by(Title.id.asc())
+    for row_id, raw in query.yield_per(batch_size):
+        last = row_id
+        vec = decode_embedding(raw)
+        if vec is None:
+            continue
+        blob_bytes += len(raw)
+        ids.append(row_id)
+        vecs.append(vec)
+        if len(ids) >= batch_size:
+            store.put(ids, np.vstack(vecs))
+            copied += len(ids)
+            ids, vecs = [], []
+
+    if ids:
+        store.put(ids, np.vstack(vecs))
+        copied += len(ids)
+    store.synced = last
+
+    summary = {
+        "dtype": store.dtype,
+        "copied": copied,
+        "blob_bytes": blob_bytes,
+        "store_bytes": store.disk_bytes() or store.nbytes(),
+        "dropped_blobs": 0,
+    }
+
+    if drop_blobs:
+        if not store.persistent:
+            raise ValueError("Refusing to drop blobs without an on-disk store")
+
+        present = store.present()
+        keep = np.flatnonzero(present)
+        for start in range(0, len(keep), 500):
+            chunk = [int(i) for i in keep[start:start + 500]]
+            db.query(Title).filter(Title.id.in_(chunk)).update(
+                {"embedding": b""}, synchronize_session=False
+            )
+            summary["dropped_blobs"] += len(chunk)
+        db.commit()
+
+        if db.get_bind().dialect.name == "sqlite":
+            db.execute(text("VACUUM"))
+
+    return summary
+
+
+if __name__ == "__main__":
+    # python -m services.vector_store migrate [--dtype int8] [--drop-blobs]
+    import argparse
+
+    from database.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Title vector store")
+    parser.add_argument("command", choices=["migrate", "info", "reset"])
+    parser.add_argument("--dtype", default=VECTOR_STORE_DTYPE, choices=list(DTYPES))
+    parser.add_argument("--dir", default=VECTOR_STORE_DIR)
+    parser.add_argument("--drop-blobs", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = VectorStore(args.dir or None, args.dtype)
+
+    if args.command == "migrate":
+        with SessionLocal() as session:
+            print(json.dumps(migrate(session, store, drop_blobs=args.drop_blobs), indent=2))
+    elif args.command == "reset":
+        store.reset()
+        if store.directory is not None and store.directory.exists():
+            shutil.rmtree(store.directory)
+    else:
+        print(json.dumps(store.info(), indent=2))
@@ -0,0 +1,257 @@
+# tests/test_bulk_service.py
+"""
+Sharded bulk ingestion end to end through the RQ queue: submit -> plan
+-> shards -> finalize, a shard whose worker died mid-way being resumed
+from its checkpoint, and a shard taken over under a slow worker.
+
+Runs on a throwaway SQLite database, fakeredis (jobs run by an in-process
+SimpleWorker) and the hashing embedder from benchmarks/fake_embedder.py
+(no model download, no Redis server).
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# configuration is read at import time
+_TMP = tempfile.mkdtemp(prefix="bulk-test-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_TMP}/titles.db",
+    BULK_UPLOAD_DIR=_TMP,
+    BULK_SHARD_ROWS="40",
+    BULK_CHECKPOINT_ROWS="10",
+    BULK_SHARD_STALE_SECONDS="600",
+    EMBEDDING_CACHE_PATH="",
+    VECTOR_STORE_DIR="",
+)
+
+import database.database  # noqa: E402,F401  (engine first)
+
+import fakeredis  # noqa: E402
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+from rq import SimpleWorker  # noqa: E402
+from sqlalchemy import func, update  # noqa: E402
+
+from benchmarks import fake_embedder  # noqa: E402
+from database.database import SessionLocal  # noqa: E402
+from database.writer import write  # noqa: E402
+from models.bulk_upload_run import BulkUploadRun  # noqa: E402
+from models.bulk_upload_shard import BulkUploadShard  # noqa: E402
+from models.title import Title  # noqa: E402
+from services import bulk_service  # noqa: E402
+from services.startup_service import prepare_database  # noqa: E402
+from utils.text_cleaner import clean_texts  # noqa: E402
+
+ROWS = 100  # 3 shards of 40 / 40 / 20 rows, checkpoints every 10
+
+
+class _WorkerKilled(BaseException):
+    """Stands in for SIGKILL: escapes every error handler of the job."""
+
+
+@pytest.fixture(scope="module")
+def redis():
+    connection = fakeredis.FakeRedis()
+    bulk_service.set_redis(connection)
+    return connection
+
+
+@pytest.fixture(scope="module", autouse=True)
+def model(redis):
+    prepare_database()
+    yield fake_embedder.install()
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def encode_hook(model, monkeypatch):
+    """
+    Calls `hook(call_no, texts)` before every embedding batch (one per
+    checkpoint-sized chunk) and returns the texts seen.
+    """
+    seen = []
+    encode = model.encode
+
+    def install(hook=None):
+        def hooked(texts, *args, **kwargs):
+            seen.append(list(texts))
+            if hook is not None:
+                hook(len(seen), texts)
+            return encode(texts, *args, **kwargs)
+
+        monkeypatch.setattr(model, "encode", hooked)
+        seen.clear()
+        return seen
+
+    return install
+
+
+def _work(redis):
+    SimpleWorker([bulk_service.get_queue()], connection=redis).work(burst=True)
+
+
+def _word(n: int) -> str:
+    # digits are stripped by normalization, so words are spelled out
+    letters = ""
+    while True:
+        n, r = divmod(n, 26)
+        letters += chr(97 + r)
+        if not n:
+            return letters
+
+
+def _submit(db, name: str):
+    titles = [f"{name} {_word(n)} study of {_word(n * 7 + 1000)} systems" for n in range(ROWS)]
+    path = os.path.join(_TMP, f"{name}.csv")
+    pd.DataFrame({"title": titles}).to_csv(path, index=False)
+
+    run, created = bulk_service.submit_file(db, path, f"{name}.csv", f"hash-{name}")
+    assert created
+    return run.id, titles
+
+
+def _run(db, run_id: int) -> BulkUploadRun:
+    db.rollback()
+    return db.get(BulkUploadRun, run_id)
+
+
+def _shards(db, run_id: int):
+    db.rollback()
+    return (
+        db.query(BulkUploadShard)
+        .filter(BulkUploadShard.run_id == run_id)
+        .order_by(BulkUploadShard.shard_no)
+        .all()
+    )
+
+
+def _stored(db, titles):
+    """{title: rows stored} for the given titles."""
+    db.rollback()
+    counts = dict(
+        db.query(Title.title, func.count(Title.id))
+        .filter(Title.title.in_(titles))
+        .group_by(Title.title)
+    )
+    return {title: counts.get(title, 0) for title in titles}
+
+
+def _abandon(db, shard_id: int):
+    """Ages the heartbeat past BULK_SHARD_STALE_SECONDS."""
+    stale = datetime.utcnow() - timedelta(seconds=bulk_service.BULK_SHARD_STALE_SECONDS + 1)
+    write(db, lambda session: session.execute(
+        update(BulkUploadShard)
+        .where(BulkUploadShard.id == shard_id)
+        .values(heartbeat_at=stale)
+    ))
+
+
+def _assert_completed(db, run_id: int, titles):
+    assert set(_stored(db, titles).values()) == {1}
+
+    run = _run(db, run_id)
+    assert run.status == "completed"
+    assert (run.total_rows, run.shards_total, run.shards_done) == (ROWS, 3, 3)
+    assert run.processed == ROWS
+    assert run.saved + run.duplicates == ROWS
+    assert not os.path.exists(run.shard_dir)
+
+    shards = _shards(db, run_id)
+    assert [s.status for s in shards] == ["done"] * 3
+    assert [s.next_row for s in shards] == [s.end_row for s in shards]
+    assert [s.processed for s in shards] == [40, 40, 20]
+    assert sum(s.saved for s in shards) == run.saved
+    assert sum(s.duplicates for s in shards) == run.duplicates
+
+
+def test_run_through_the_queue(db, redis):
+    run_id, titles = _submit(db, "complete")
+    assert _run(db, run_id).status == "queued"
+
+    _work(redis)
+
+    _assert_completed(db, run_id, titles)
+    assert [s.attempts for s in _shards(db, run_id)] == [1, 1, 1]
+
+
+def test_killed_shard_resumes_from_its_checkpoint(db, redis, encode_hook):
+    run_id, titles = _submit(db, "killed")
+
+    # the worker dies while embedding shard 0's third chunk, after two
+    # checkpoints; the other shards are processed normally
+    def kill(call_no, texts):
+        if call_no == 3:
+            raise _WorkerKilled()
+
+    encode_hook(kill)
+    _work(redis)
+
+    shard = _shards(db, run_id)[0]
+    assert (shard.status, shard.next_row, shard.processed) == ("running", 20, 20)
+    assert _run(db, run_id).status == "running"
+    assert _run(db, run_id).processed == ROWS - 20
+    stored = _stored(db, titles)
+    assert [stored[t] for t in titles[:40]] == [1] * 20 + [0] * 20
+
+    # a live heartbeat is left to its worker
+    assert bulk_service.resume_run(db, run_id)
+    assert bulk_service.get_queue().count == 0
+
+    _abandon(db, shard.id)
+    assert bulk_service.resume_run(db, run_id)
+    assert [job.args for job in bulk_service.get_queue().jobs] == [(run_id, 0)]
+
+    seen = encode_hook()
+    _work(redis)
+
+    # only the rows after the checkpoint were embedded again
+    assert sum(seen, []) == clean_texts(titles[20:40])
+    _assert_completed(db, run_id, titles)
+    assert [s.attempts for s in _shards(db, run_id)] == [2, 1, 1]
+
+
+def test_taken_over_shard_stops_without_writing(db, redis, encode_hook):
+    run_id, titles = _submit(db, "taken-over")
+
+    # while shard 0 embeds its third chunk (once the second one is
+    # checkpointed; embedding runs ahead of the writes) another worker
+    # reclaims it, as _claim_shard() does with a shard that looks stale
+    def take_over(call_no, texts):
+        if call_no == 3:
+            with SessionLocal() as session:
+                deadline = time.monotonic() + 10
+                while _shards(session, run_id)[0].next_row < 20 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            write(db, lambda session: session.execute(
+                update(BulkUploadShard)
+                .where(BulkUploadShard.run_id == run_id, BulkUploadShard.shard_no == 0)
+                .values(worker="other-host:1", attempts=BulkUploadShard.attempts + 1)
+            ))
+
+    encode_hook(take_over)
+    _work(redis)
+
+    # the slow worker rolled back its chunk instead of double-counting it
+    shard = _shards(db, run_id)[0]
+    assert (shard.status, shard.worker, shard.next_row, shard.processed) == (
+        "running", "other-host:1", 20, 20,
+    )
+    assert _run(db, run_id).processed == ROWS - 20
+    assert sum(_stored(db, titles[:40]).values()) == 20
+
+    # the new owner dies too; resuming finishes the shard exactly once
+    _abandon(db, shard.id)
+    assert bulk_service.resume_run(db, run_id)
+    encode_hook()
+    _work(redis)
+
+    _assert_completed(db, run_id, titles)
@@ -0,0 +1,47 @@
+# tests/test_embedding_service.py
+"""
+get_embeddings() with USE_OPENAI on and the OpenAI request failing: the
+whole batch comes from MiniLM, never OpenAI cache hits mixed with MiniLM
+vectors (no model download, no network).
+"""
+
+import numpy as np
+
+from services import embedding_service
+from services.embedding_cache import EmbeddingCache
+
+
+def test_openai_failure_serves_the_whole_batch_from_minilm(monkeypatch):
+    cache = EmbeddingCache(
+        path=None,
+        max_entries=100,
+        valid_models=(embedding_service.OPENAI_KEY, embedding_service.MINILM_KEY),
+    )
+    cache.put(embedding_service.OPENAI_KEY, "cached in openai", np.ones(1536, dtype=np.float32))
+    cache.put(embedding_service.MINILM_KEY, "cached in minilm", np.zeros(384, dtype=np.float32))
+
+    def openai_down(texts):
+        raise RuntimeError("503 Service Unavailable")
+
+    encoded = []
+
+    def minilm(texts):
+        encoded.append(list(texts))
+        return np.full((len(texts), 384), 0.5, dtype=np.float32)
+
+    monkeypatch.setattr(embedding_service, "_cache", cache)
+    monkeypatch.setattr(embedding_service, "EMBEDDING_CACHE", True)
+    monkeypatch.setattr(embedding_service, "USE_OPENAI", True)
+    monkeypatch.setattr(embedding_service, "get_openai_embeddings", openai_down)
+    monkeypatch.setattr(embedding_service, "get_minilm_embeddings", minilm)
+
+    texts = ["cached in openai", "new", "cached in minilm", "new"]
+    rows = embedding_service.get_embeddings(texts)
+
+    # the misses fell back to MiniLM, then the OpenAI hit was redone
+    assert encoded == [["new", "cached in minilm"], ["cached in openai"]]
+    assert rows.shape == (4, 384)
+
+    # every vector is cached under the model that produced it
+    assert cache.get(embedding_service.OPENAI_KEY, "new") is None
+    assert cache.get(embedding_service.MINILM_KEY, "cached in openai").shape == (384,)
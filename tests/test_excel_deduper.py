@@ -0,0 +1,69 @@
+# tests/test_excel_deduper.py
+"""
+dedupe_excel(): exact normalized keys, and semantic near-duplicates
+merged into the first occurrence's cluster (hashing embedder from
+benchmarks/fake_embedder.py, no model download).
+"""
+
+import os
+
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
+import database.database  # noqa: E402,F401  (engine first)
+
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from benchmarks import fake_embedder  # noqa: E402
+from routes.excel_routes import router as excel_router  # noqa: E402
+from services.excel_deduper import dedupe_excel  # noqa: E402
+
+SHEET = [
+    "Deep learning for medical image segmentation",
+    "Graph neural networks for traffic forecasting",
+    "Deep Learning for Medical Image Segmentation!",
+    "Deep learning for medical image segmentation methods",
+    "A survey of quantum error correction",
+]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def embedder():
+    fake_embedder.install()
+
+
+def test_exact_mode_keeps_near_duplicates_apart():
+    unique_df, clusters = dedupe_excel(pd.DataFrame({"title": SHEET}))
+
+    assert len(unique_df) == 4
+    assert clusters["deep learning for medical image segmentation"] == [SHEET[0], SHEET[2]]
+    assert clusters["deep learning for medical image segmentation methods"] == [SHEET[3]]
+
+
+def test_semantic_mode_collapses_near_duplicates_into_one_cluster():
+    unique_df, clusters = dedupe_excel(pd.DataFrame({"title": SHEET}), semantic=True)
+
+    # the first occurrence stays canonical
+    assert unique_df["title"].tolist() == [SHEET[0], SHEET[1], SHEET[4]]
+    assert clusters["deep learning for medical image segmentation"] == [SHEET[0], SHEET[2], SHEET[3]]
+    assert len(clusters) == 3
+
+
+def test_dedupe_route_semantic_option():
+    app = FastAPI()
+    app.include_router(excel_router)
+    client = TestClient(app)
+    csv = pd.DataFrame({"title": SHEET}).to_csv(index=False).encode()
+
+    exact = client.post("/excel/dedupe", files={"file": ("sheet.csv", csv)}).json()
+    semantic = client.post(
+        "/excel/dedupe", params={"semantic": "true"}, files={"file": ("sheet.csv", csv)}
+    ).json()
+
+    assert (exact["rows"], exact["unique"]) == (5, 4)
+    assert (semantic["rows"], semantic["unique"]) == (5, 3)
+    assert semantic["groups"] == {
+        "deep learning for medical image segmentation": [SHEET[0], SHEET[2], SHEET[3]],
+    }
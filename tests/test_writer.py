@@ -0,0 +1,65 @@
+# tests/test_writer.py
+"""
+The group-commit writer keeps serving after a batch fails outside a
+job's savepoint, and callers never wait forever on a dead writer.
+"""
+
+import database.database  # noqa: F401  (engine first)
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database import writer as writer_module
+from database.writer import _STOP, Writer
+
+
+class _Boom(BaseException):
+    """Not an Exception: escapes the per-job handling in _commit()."""
+
+
+@pytest.fixture
+def writer():
+    w = Writer(create_engine("sqlite://"))
+    yield w
+    w.stop()
+
+
+def _select_one(session):
+    return session.execute(text("SELECT 1")).scalar()
+
+
+def test_job_escaping_its_savepoint_fails_only_its_batch(writer):
+    def boom(session):
+        raise _Boom()
+
+    with pytest.raises(_Boom):
+        writer.submit(boom)
+
+    assert writer.submit(_select_one) == 1
+
+
+def test_failed_commit_and_rollback_keep_the_writer_alive(writer, monkeypatch):
+    session = writer._session
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(session, "commit", fail)
+    monkeypatch.setattr(session, "rollback", fail)
+
+    with pytest.raises(RuntimeError, match="disk I/O error"):
+        writer.submit(_select_one)
+
+    # a fresh session serves the next batch
+    assert writer._session is not session
+    assert writer.submit(_select_one) == 1
+
+
+def test_waiting_on_a_stopped_writer_raises(writer, monkeypatch):
+    monkeypatch.setattr(writer_module, "DB_WRITER_ALIVE_CHECK_SECONDS", 0.05)
+
+    # the writer exits without ever taking the job queued behind the stop
+    writer._queue.put(_STOP)
+
+    with pytest.raises(RuntimeError, match="stopped"):
+        writer.submit(_select_one)
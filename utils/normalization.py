@@ -0,0 +1,155 @@
+# utils/normalization.py
+"""
+Title normalization, one string or a whole batch at a time.
+
+    lowercase
+    -> drop digit runs              (ignore_numbers, env IGNORE_NUMBERS)
+    -> non-word characters to " "   (word = str.isalnum() or "_")
+    -> collapse whitespace, strip
+    -> drop all-digit tokens        (numeric_tokens=False; dedupe_excel)
+
+normalize_text() applies the steps with precompiled patterns.
+normalize_batch() gives identical results for a list of strings: ASCII
+strings (the vast majority of titles) are joined into one byte buffer
+and transformed with a single bytes.translate() plus NumPy masks, so the
+per-string Python cost is a join and a split; the rest (non-ASCII
+text, embedded NULs) goes through normalize_text().
+"""
+
+import os
+import re
+from typing import Iterable, List
+
+import numpy as np
+
+IGNORE_NUMBERS = os.getenv("IGNORE_NUMBERS", "true").lower() == "true"
+
+_DIGITS = re.compile(r"\d+")
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+_NUMERIC_TOKEN = re.compile(r"\b\d+\b")
+
+# Batch path: records are NUL-separated (NUL is not a word character,
+# so inputs containing one take the per-string path)
+_SEP = 0
+_SPACE = 32
+_ASCII_DIGITS = b"0123456789"
+
+
+def _ascii_table() -> bytes:
+    """lowercase, whitespace and non-word bytes -> space, NUL kept."""
+    table = bytearray(range(256))
+    for i in range(1, 128):
+        c = chr(i)
+        if c.isupper():
+            table[i] = ord(c.lower())
+        elif c.isspace() or not (c.isalnum() or c == "_"):
+            table[i] = _SPACE
+    return bytes(table)
+
+
+_ASCII_TABLE = _ascii_table()
+
+
+# ---------------------------------------------------------
+# Single string
+# ---------------------------------------------------------
+def normalize_text(text: str, ignore_numbers: bool = IGNORE_NUMBERS, numeric_tokens: bool = True) -> str:
+    text = text.lower()
+
+    if ignore_numbers:
+        text = _DIGITS.sub("", text)
+
+    text = _NON_WORD.sub(" ", text)
+    text = _SPACES.sub(" ", text).strip()
+
+    if not numeric_tokens:
+        text = _SPACES.sub(" ", _NUMERIC_TOKEN.sub("", text)).strip()
+
+    return text
+
+
+# ---------------------------------------------------------
+# Batch (NumPy over one byte buffer)
+# ---------------------------------------------------------
+def _squeeze_spaces(buf: np.ndarray) -> np.ndarray:
+    """Collapses space runs and strips them around every record."""
+    if not len(buf):
+        return buf
+
+    # spaces following a space, a separator or the buffer start
+    edge = (buf == _SPACE) | (buf == _SEP)
+    after_edge = np.empty_like(edge)
+    after_edge[0] = True
+    after_edge[1:] = edge[:-1]
+    buf = buf[~((buf == _SPACE) & after_edge)]
+    if not len(buf):
+        return buf
+
+    # one space left before a separator or the buffer end
+    before_sep = np.empty(len(buf), dtype=bool)
+    before_sep[-1] = True
+    before_sep[:-1] = buf[1:] == _SEP
+    return buf[~((buf == _SPACE) & before_sep)]
+
+
+def _drop_numeric_tokens(buf: np.ndarray) -> np.ndarray:
+    word = (buf != _SPACE) & (buf != _SEP)
+    starts = word.copy()
+    starts[1:] &= ~word[:-1]
+    token = np.cumsum(starts)
+
+    # tokens with at least one non-digit byte survive
+    keep = np.zeros(int(token[-1]) + 1, dtype=bool)
+    keep[token[word & ((buf < 48) | (buf > 57))]] = True
+
+    return _squeeze_spaces(buf[~(word & ~keep[token])])
+
+
+def _normalize_ascii(texts: List[str], ignore_numbers: bool, numeric_tokens: bool) -> List[str]:
+    raw = "\x00".join(texts).encode("ascii")
+    raw = raw.translate(_ASCII_TABLE, _ASCII_DIGITS if ignore_numbers else b"")
+
+    buf = _squeeze_spaces(np.frombuffer(raw, dtype=np.uint8))
+    if not numeric_tokens and len(buf):
+        buf = _drop_numeric_tokens(buf)
+
+    return buf.tobytes().decode("ascii").split("\x00")
+
+
+def normalize_batch(
+    texts: Iterable[str],
+    ignore_numbers: bool = IGNORE_NUMBERS,
+    numeric_tokens: bool = True,
+) -> List[str]:
+    """
+    normalize_text() of every string, in input order.
+    """
+    texts = list(texts)
+    fast = [n for n, t in enumerate(texts) if t.isascii() and "\x00" not in t]
+
+    if len(fast) == len(texts):
+        if not texts:
+            return []
+        return _normalize_ascii(texts, ignore_numbers, numeric_tokens)
+
+    out = [None] * len(texts)
+    if fast:
+        for n, text in zip(fast, _normalize_ascii([texts[n] for n in fast], ignore_numbers, numeric_tokens)):
+            out[n] = text
+    for n, text in enumerate(texts):
+        if out[n] is None:
+            out[n] = normalize_text(text, ignore_numbers, numeric_tokens)
+    return out
+
+
+def normalize_series(series, ignore_numbers: bool = IGNORE_NUMBERS, numeric_tokens: bool = True):
+    """
+    normalize_batch() of a pandas Series of strings (index kept).
+    """
+    import pandas as pd
+
+    return pd.Series(
+        normalize_batch(series.tolist(), ignore_numbers, numeric_tokens),
+        index=series.index,
+    )
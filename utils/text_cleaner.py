@@ -1,15 +1,9 @@
-import re
-import os
-
-IGNORE_NUMBERS = os.getenv("IGNORE_NUMBERS", "true").lower() == "true"
+from utils.normalization import IGNORE_NUMBERS, normalize_batch, normalize_text
 
 def clean_text(text: str) -> str:
-    text = text.lower()
-
-    if IGNORE_NUMBERS:
-        text = re.sub(r"\d+", "", text)
+    return normalize_text(text, IGNORE_NUMBERS)
 
-    text = re.sub(r"[^\w\s]", " ", text)
-    text = re.sub(r"\s+", " ", text)
 
-    return text.strip()
+def clean_texts(texts) -> list:
+    """clean_text() of a batch of strings (see utils/normalization.py)."""
+    return normalize_batch(texts, IGNORE_NUMBERS)
@@ -1,10 +1,27 @@
 # worker.py
+from dotenv import load_dotenv
+
+# .env (DATABASE_URL, REDIS_URL, ...) before any module reads its config,
+# so the worker writes to the same database the API reads
+load_dotenv()
+
 from rq import Worker, Queue
-from redis import Redis
 
-redis_conn = Redis(host='localhost', port=6379, db=0)
+# models must be registered before any job touches the database
+import database.database
+from database.database import SessionLocal
+from services.bulk_service import BULK_QUEUE, get_redis, resume_stale_runs
+from services.startup_service import prepare_database
+
+redis_conn = get_redis()
 
 if __name__ == '__main__':
-    queues = [Queue('default', connection=redis_conn)]
+    prepare_database()
+
+    # pick up runs whose worker died (shards continue from their checkpoint)
+    with SessionLocal() as db:
+        resume_stale_runs(db)
+
+    queues = [Queue(BULK_QUEUE, connection=redis_conn)]
     worker = Worker(queues, connection=redis_conn)
-    worker.work()
\ No newline at end of file
+    worker.work()